@@ -0,0 +1,24 @@
+"""workflow petri net
+
+Revision ID: 5a1e7c3b9d42
+Revises: b3c6f1d2a7e4
+Create Date: 2026-10-18 14:41:09.317720
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5a1e7c3b9d42'
+down_revision = 'b3c6f1d2a7e4'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('workflow', sa.Column('petri_net', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('workflow', 'petri_net')
@@ -0,0 +1,35 @@
+"""outbox
+
+Revision ID: 660f20bb84c0
+Revises: 89b1fb28bb6c
+Create Date: 2026-10-18 09:12:41.201377
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '660f20bb84c0'
+down_revision = '89b1fb28bb6c'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table('outbox_message',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('method', sa.String(), nullable=False),
+            sa.Column('url', sa.Text(), nullable=False),
+            sa.Column('data', postgresql.JSON(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('id', name=op.f('pk_outbox_message'))
+            )
+    op.create_index(op.f('ix_outbox_message_available_at'), 'outbox_message', ['available_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_outbox_message_available_at'), table_name='outbox_message')
+    op.drop_table('outbox_message')
@@ -0,0 +1,33 @@
+"""result element
+
+Revision ID: 7d3f90e6b1c8
+Revises: e41b7a9c2d65
+Create Date: 2026-10-18 16:52:10.664190
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d3f90e6b1c8'
+down_revision = 'e41b7a9c2d65'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.add_column('result', sa.Column('element_count', sa.Integer(), nullable=True))
+    op.create_table('result_element',
+            sa.Column('result_id', sa.Integer(), nullable=False),
+            sa.Column('element_index', sa.Integer(), nullable=False),
+            sa.Column('data', postgresql.JSON(), nullable=True),
+            sa.ForeignKeyConstraint(['result_id'], ['result.id'], name=op.f('fk_result_element_result_id_result'), ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('result_id', 'element_index', name=op.f('pk_result_element'))
+            )
+
+
+def downgrade():
+    op.drop_table('result_element')
+    op.drop_column('result', 'element_count')
@@ -0,0 +1,26 @@
+"""result blob key
+
+Revision ID: a93e6c0d4b18
+Revises: f2b8d5a61c37
+Create Date: 2026-10-18 19:03:45.128731
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a93e6c0d4b18'
+down_revision = 'f2b8d5a61c37'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('result', sa.Column('blob_key', sa.Text(), nullable=True))
+    op.create_index(op.f('ix_result_blob_key'), 'result', ['blob_key'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_result_blob_key'), table_name='result')
+    op.drop_column('result', 'blob_key')
@@ -0,0 +1,24 @@
+"""workflow structure hash
+
+Revision ID: b3c6f1d2a7e4
+Revises: 660f20bb84c0
+Create Date: 2026-10-18 11:02:17.538204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b3c6f1d2a7e4'
+down_revision = '660f20bb84c0'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('workflow', sa.Column('structure_hash', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('workflow', 'structure_hash')
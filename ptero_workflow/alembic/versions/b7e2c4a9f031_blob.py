@@ -0,0 +1,33 @@
+"""blob
+
+Revision ID: b7e2c4a9f031
+Revises: e8a4f1c92b57
+Create Date: 2026-10-18 23:12:07.415820
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c4a9f031'
+down_revision = 'e8a4f1c92b57'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('key', name=op.f('pk_blob'))
+    )
+    op.execute("""
+        INSERT INTO blob (key)
+        SELECT DISTINCT blob_key FROM result WHERE blob_key IS NOT NULL
+    """)
+    op.create_foreign_key(op.f('fk_result_blob_key_blob'), 'result', 'blob', ['blob_key'], ['key'])
+
+
+def downgrade():
+    op.drop_constraint(op.f('fk_result_blob_key_blob'), 'result', type_='foreignkey')
+    op.drop_table('blob')
@@ -0,0 +1,25 @@
+"""blob_element_offsets
+
+Revision ID: c3f9a2d17e64
+Revises: b7e2c4a9f031
+Create Date: 2026-10-18 09:41:52.803214
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a2d17e64'
+down_revision = 'b7e2c4a9f031'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.add_column('blob', sa.Column('element_offsets', postgresql.ARRAY(sa.BigInteger()), nullable=True))
+
+
+def downgrade():
+    op.drop_column('blob', 'element_offsets')
@@ -0,0 +1,31 @@
+"""result alias
+
+Revision ID: c5d27f8e3a90
+Revises: a93e6c0d4b18
+Create Date: 2026-10-18 20:12:08.574316
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5d27f8e3a90'
+down_revision = 'a93e6c0d4b18'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.add_column('result', sa.Column('alias_id', sa.Integer(), nullable=True))
+    op.add_column('result', sa.Column('alias_path', postgresql.ARRAY(sa.Integer()), nullable=True))
+    op.create_index(op.f('ix_result_alias_id'), 'result', ['alias_id'], unique=False)
+    op.create_foreign_key(op.f('fk_result_alias_id_result'), 'result', 'result', ['alias_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint(op.f('fk_result_alias_id_result'), 'result', type_='foreignkey')
+    op.drop_index(op.f('ix_result_alias_id'), table_name='result')
+    op.drop_column('result', 'alias_path')
+    op.drop_column('result', 'alias_id')
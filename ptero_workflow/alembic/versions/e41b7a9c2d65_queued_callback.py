@@ -0,0 +1,40 @@
+"""queued callback
+
+Revision ID: e41b7a9c2d65
+Revises: 5a1e7c3b9d42
+Create Date: 2026-10-18 16:03:27.518204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e41b7a9c2d65'
+down_revision = '5a1e7c3b9d42'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    op.create_table('queued_callback',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('target', sa.String(), nullable=False),
+            sa.Column('target_id', sa.Integer(), nullable=False),
+            sa.Column('callback_type', sa.Text(), nullable=False),
+            sa.Column('body', postgresql.JSON(), nullable=True),
+            sa.Column('query', postgresql.JSON(), nullable=False),
+            sa.Column('ordering_key', sa.Text(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('id', name=op.f('pk_queued_callback'))
+            )
+    op.create_index(op.f('ix_queued_callback_ordering_key'), 'queued_callback', ['ordering_key'], unique=False)
+    op.create_index(op.f('ix_queued_callback_available_at'), 'queued_callback', ['available_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_queued_callback_available_at'), table_name='queued_callback')
+    op.drop_index(op.f('ix_queued_callback_ordering_key'), table_name='queued_callback')
+    op.drop_table('queued_callback')
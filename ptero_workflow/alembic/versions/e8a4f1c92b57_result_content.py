@@ -0,0 +1,94 @@
+"""result content
+
+Revision ID: e8a4f1c92b57
+Revises: c5d27f8e3a90
+Create Date: 2026-10-18 21:26:51.903472
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e8a4f1c92b57'
+down_revision = 'c5d27f8e3a90'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+import hashlib
+import json
+import os
+
+
+# These must match Result in ptero_workflow.implementation.models.result
+MIN_BYTES = int(os.environ.get('PTERO_WORKFLOW_RESULT_CONTENT_MIN_BYTES',
+    256))
+CHUNK_SIZE = 1000
+
+
+def upgrade():
+    op.create_table('result_content',
+    sa.Column('hash', sa.Text(), nullable=False),
+    sa.Column('data', postgresql.JSONB(), nullable=False),
+    sa.PrimaryKeyConstraint('hash', name=op.f('pk_result_content'))
+    )
+    op.add_column('result', sa.Column('content_hash', sa.Text(), nullable=True))
+    op.create_index(op.f('ix_result_content_hash'), 'result', ['content_hash'], unique=False)
+    op.create_foreign_key(op.f('fk_result_content_hash_result_content'), 'result', 'result_content', ['content_hash'], ['hash'])
+
+    backfill_content()
+
+
+def backfill_content():
+    """
+    Moves the data of existing results that are large enough into
+    result_content, CHUNK_SIZE results at a time.
+    """
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text("""
+            SELECT id, CAST(data AS text) FROM result
+            WHERE id > :last_id AND data IS NOT NULL
+                AND octet_length(CAST(data AS text)) >= :min_bytes
+            ORDER BY id LIMIT :limit
+        """), last_id=last_id, min_bytes=MIN_BYTES,
+            limit=CHUNK_SIZE).fetchall()
+        if not rows:
+            return
+
+        contents = {}
+        hashes = []
+        for id, text in rows:
+            canonical = json.dumps(json.loads(text), sort_keys=True,
+                    separators=(',', ':'))
+            content_hash = hashlib.sha256(canonical).hexdigest()
+            contents[content_hash] = canonical
+            hashes.append({'id': id, 'hash': content_hash})
+
+        connection.execute(sa.text("""
+            INSERT INTO result_content (hash, data)
+            SELECT content.key, CAST(content.value AS jsonb)
+            FROM json_each_text(CAST(:contents AS json)) AS content
+            ON CONFLICT DO NOTHING
+        """), contents=json.dumps(contents))
+        connection.execute(sa.text("""
+            UPDATE result SET content_hash = chunk.hash, data = NULL
+            FROM json_to_recordset(CAST(:hashes AS json))
+                AS chunk(id integer, hash text)
+            WHERE result.id = chunk.id
+        """), hashes=json.dumps(hashes))
+
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    op.execute("""
+        UPDATE result SET data = result_content.data, content_hash = NULL
+        FROM result_content
+        WHERE result.content_hash = result_content.hash
+    """)
+    op.drop_constraint(op.f('fk_result_content_hash_result_content'), 'result', type_='foreignkey')
+    op.drop_index(op.f('ix_result_content_hash'), table_name='result')
+    op.drop_column('result', 'content_hash')
+    op.drop_table('result_content')
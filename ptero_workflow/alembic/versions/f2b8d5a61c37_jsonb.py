@@ -0,0 +1,56 @@
+"""jsonb
+
+Revision ID: f2b8d5a61c37
+Revises: 7d3f90e6b1c8
+Create Date: 2026-10-18 17:41:27.318054
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d5a61c37'
+down_revision = '7d3f90e6b1c8'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+JSON_COLUMNS = [
+    ('block', 'parameters'),
+    ('converge', 'parameters'),
+    ('execution', 'begins'),
+    ('execution', 'colors'),
+    ('execution', 'data'),
+    ('input_source', 'parallel_depths'),
+    ('job', 'parameters'),
+    ('job', 'service_data_to_save'),
+    ('outbox_message', 'data'),
+    ('queued_callback', 'body'),
+    ('queued_callback', 'query'),
+    ('result', 'data'),
+    ('result_element', 'data'),
+]
+
+
+def upgrade():
+    for table, column in JSON_COLUMNS:
+        op.execute('ALTER TABLE %s ALTER COLUMN %s TYPE jsonb USING %s::jsonb'
+                % (table, column, column))
+
+    op.create_index('ix_execution_workflow_id_timestamp', 'execution',
+            ['workflow_id', 'timestamp'], unique=False)
+    op.create_index('ix_execution_status_history_workflow_id_timestamp',
+            'execution_status_history', ['workflow_id', 'timestamp'],
+            unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_execution_status_history_workflow_id_timestamp',
+            table_name='execution_status_history')
+    op.drop_index('ix_execution_workflow_id_timestamp',
+            table_name='execution')
+
+    for table, column in JSON_COLUMNS:
+        op.execute('ALTER TABLE %s ALTER COLUMN %s TYPE json USING %s::json'
+                % (table, column, column))
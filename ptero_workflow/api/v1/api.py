@@ -13,6 +13,7 @@ RESOURCES = {
         'execution-detail': views.ExecutionDetailView,
         'task-callback': views.TaskCallback,
         'method-callback': views.MethodCallback,
+        'method-callback-batch': views.MethodCallbackBatch,
         'report': views.ReportDetailView,
         'server-info': views.ServerInfo,
 }
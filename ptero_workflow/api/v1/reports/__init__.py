@@ -4,6 +4,7 @@ from . import spawned_workflows
 from . import workflow_details
 from . import workflow_executions
 from . import workflow_outputs
+from . import workflow_petri_net
 from . import workflow_skeleton
 from . import workflow_status
 from . import workflow_summary
@@ -17,6 +18,7 @@ _REPORTS = {
     'workflow-details': workflow_details.report,
     'workflow-executions': workflow_executions.report,
     'workflow-outputs': workflow_outputs.report,
+    'workflow-petri-net': workflow_petri_net.report,
     'workflow-skeleton': workflow_skeleton.report,
     'workflow-status': workflow_status.report,
     'workflow-summary': workflow_summary.report,
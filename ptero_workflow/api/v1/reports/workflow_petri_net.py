@@ -0,0 +1,5 @@
+from flask import g
+
+
+def report(workflow_id):
+    return g.backend.get_workflow_petri_net(workflow_id)
@@ -7,6 +7,7 @@ from flask_restful import Resource
 from jsonschema import ValidationError
 from ...implementation.exceptions import ValidationError as PteroValidationError
 from ...implementation.exceptions import InvalidExecutionUrlError
+import os
 import uuid
 
 from ptero_common import nicer_logging
@@ -18,6 +19,12 @@ import urllib
 LOG = nicer_logging.getLogger(__name__)
 
 
+# When set, callbacks are only queued here (see callback_processor), so
+# that petri gets its response without waiting on the database.
+_QUEUE_CALLBACKS = bool(int(os.environ.get('PTERO_WORKFLOW_QUEUE_CALLBACKS',
+    0)))
+
+
 class WorkflowListView(Resource):
     @logged_response(logger=LOG)
     @handles_no_such_entity_error
@@ -205,9 +212,19 @@ class TaskCallback(Resource):
     @handles_no_such_entity_error
     def post(self, task_id, callback_type):
         body_data = request.get_json()
-        query_string_data = request.args
-        g.backend.handle_task_callback(task_id, callback_type, body_data,
-                query_string_data)
+        try:
+            if _QUEUE_CALLBACKS:
+                g.backend.queue_task_callback(task_id, callback_type,
+                        body_data, request.args.to_dict(flat=True))
+                return {"message": "Queued task callback"}, 202
+
+            query_string_data = request.args
+            g.backend.handle_task_callback(task_id, callback_type, body_data,
+                    query_string_data)
+        except PteroValidationError as e:
+            LOG.info('Rejected "%s" callback for task (%s): %s',
+                    callback_type, task_id, e.message)
+            return {'error': e.message}, 400
         return {"message": "Completed task callback"}, 200
 
 
@@ -216,12 +233,42 @@ class MethodCallback(Resource):
     @handles_no_such_entity_error
     def post(self, method_id, callback_type):
         body_data = request.get_json()
-        query_string_data = request.args
-        g.backend.handle_method_callback(method_id, callback_type,
-                body_data, query_string_data)
+        try:
+            if _QUEUE_CALLBACKS:
+                g.backend.queue_method_callback(method_id, callback_type,
+                        body_data, request.args.to_dict(flat=True))
+                return {"message": "Queued method callback"}, 202
+
+            query_string_data = request.args
+            g.backend.handle_method_callback(method_id, callback_type,
+                    body_data, query_string_data)
+        except PteroValidationError as e:
+            LOG.info('Rejected "%s" callback for method (%s): %s',
+                    callback_type, method_id, e.message)
+            return {'error': e.message}, 400
         return {"message": "Completed method callback"}, 200
 
 
+class MethodCallbackBatch(Resource):
+    @logged_response(logger=LOG)
+    @handles_no_such_entity_error
+    def post(self, method_id, callback_type):
+        body_data_list = request.get_json()
+        if not isinstance(body_data_list, list):
+            return {'error': 'Expected a list of callback bodies'}, 400
+
+        query_string_data = request.args
+        try:
+            g.backend.handle_method_callbacks(method_id, callback_type,
+                    body_data_list, query_string_data)
+        except PteroValidationError as e:
+            LOG.info('Rejected "%s" callbacks for method (%s): %s',
+                    callback_type, method_id, e.message)
+            return {'error': e.message}, 400
+        return {"message": "Completed %s method callbacks"
+                % len(body_data_list)}, 200
+
+
 class ReportDetailView(Resource):
     @logged_response(logger=LOG)
     @handles_no_such_entity_error
@@ -1,21 +1,35 @@
 from . import models
+from .models import callback_queue, outbox
 from .models.execution.execution_base import Execution
+from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm import joinedload, contains_eager
-from ptero_workflow.implementation import exceptions
+from ptero_workflow.implementation import (blob_store, exceptions,
+        step_chains, workflow_template)
+from ptero_workflow.implementation.bulk_persistence import bulk_save
+from ptero_workflow.implementation.job_submission import submit_job
 from ptero_workflow.implementation.model_builder import ModelBuilder
+from ptero_workflow.implementation.result_cache import evict_task_results
+from ptero_workflow.implementation.petri_submission import (compact_net,
+        decode_net, encode_net, put_net)
+from ptero_workflow.implementation.workflow_graph import (evict_workflow_graph,
+        get_workflow_graph)
 from ptero_common import nicer_logging
 from ptero_common.server_info import get_server_info
 from ptero_workflow.urls import petri_url_for
 import re
-from ptero_common.statuses import (scheduled, errored)
+from ptero_common.statuses import (scheduled, errored, failed)
 from ptero_common.exceptions import NoSuchEntityError
+import os
 import uuid
 
 LOG = nicer_logging.getLogger(__name__)
 
 
+_BULK_SAVE = bool(int(os.environ.get('PTERO_WORKFLOW_BULK_SAVE', 1)))
+
+
 _TASK_BASE = 'ptero_workflow.implementation.celery_tasks.'
 
 
@@ -29,14 +43,6 @@ class Backend(object):
     def submit_net_task(self):
         return self.celery_app.tasks[_TASK_BASE + 'submit_net.SubmitNet']
 
-    @property
-    def http_with_result_task(self):
-        return self.celery_app.tasks['ptero_common.celery.http.HTTPWithResult']
-
-    @property
-    def http_task(self):
-        return self.celery_app.tasks['ptero_common.celery.http.HTTP']
-
     def create_spawned_workflow(self, workflow_data, parent_execution_id):
         workflow = self._create_workflow(workflow_data)
         parent_execution = self._get_execution(parent_execution_id)
@@ -70,25 +76,67 @@ class Backend(object):
         return workflow
 
     def submit_net(self, workflow_name):
-        workflow = self._get_workflow_by_name(workflow_name)
-        petri_data = workflow.build_petri_net()
+        row = self.session.execute("""
+            SELECT id, net_key, petri_net FROM workflow WHERE name = :name
+        """, {'name': workflow_name}).first()
+        if row is None:
+            raise NoSuchEntityError(
+                    "Workflow with name %s was not found." % workflow_name)
+
+        workflow_id, net_key, petri_net = row
+        if petri_net is None:
+            # created before nets were stored
+            petri_net = self._build_petri_net(
+                    self._get_workflow_eagerly(workflow_id))
 
+        # The net is PUT from here rather than handed to an HTTP task, so it
+        # never has to pass through the celery broker.
         LOG.info('Submitting petri net <%s> for'
-                ' workflow "%s"', workflow.net_key, workflow.name,
-                extra={'workflowName':workflow.name})
-        self.http_task.delay('PUT', self._petri_submit_url(workflow.net_key), **petri_data)
+                ' workflow "%s"', net_key, workflow_name,
+                extra={'workflowName':workflow_name})
+        put_net(self._petri_submit_url(net_key), str(petri_net))
+
+    def _build_petri_net(self, workflow):
+        return encode_net(compact_net(workflow.build_petri_net()))
+
+    def get_workflow_petri_net(self, workflow_id):
+        workflow = self._get_workflow(workflow_id)
+        if workflow.petri_net is None:
+            return workflow.build_petri_net()
+        else:
+            return decode_net(str(workflow.petri_net))
 
     def _petri_submit_url(self, net_key):
         return petri_url_for('net-detail', net_key=net_key)
 
     def _save_workflow(self, workflow_data):
-        builder = ModelBuilder(workflow_data)
+        structure_hash = workflow_template.structure_hash(workflow_data)
+        template = workflow_template.get_template(structure_hash)
+        builder = ModelBuilder(workflow_data, template=template)
 
         workflow = builder.build_workflow()
-        self.session.add(workflow)
-        self.session.commit()
+        workflow.structure_hash = structure_hash
 
-        workflow.root_task.create_input_sources(self.session, [])
+        # Input sources only depend on the in-memory graph, so they can be
+        # resolved before anything is written.
+        builder.build_input_sources(self.session)
+        if template is None:
+            workflow_template.put_template(structure_hash,
+                    builder.compile_template())
+
+        if _BULK_SAVE:
+            bulk_save(self.session, workflow)
+        else:
+            self.session.add(workflow)
+            self.session.flush()
+
+        # Build the immutable graph (including the webhook routing table)
+        # now, so that status changes never have to look webhooks up.
+        get_workflow_graph(self.session, workflow.id)
+
+        # Every model is still in memory, so this is the cheapest time to
+        # build the net.  SubmitNet only has to read it back.
+        workflow.petri_net = self._build_petri_net(workflow)
 
         self.session.commit()
 
@@ -226,7 +274,8 @@ class Backend(object):
 
         query = self._base_reports_query(model_class, workflow_id, since)
 
-        instances = query.order_by(model_class.timestamp).limit(limit + 1).all()
+        instances = query.order_by(model_class.timestamp, model_class.id
+                ).limit(limit + 1).all()
 
         if instances:
             if len(instances) == limit + 1:
@@ -279,15 +328,15 @@ class Backend(object):
 
         try:
             LOG.info('Updating execution (%s) in workflow "%s"',
-                    execution_id, execution.workflow.name,
-                    extra={'workflowName':execution.workflow.name})
+                    execution_id, execution.workflow_name,
+                    extra={'workflowName':execution.workflow_name})
             execution.update(update_data)
         except exceptions.UpdateError:
             # We log here because we have access to workflow.name here
             LOG.exception('Exception while updating execution (%s) '
                     'in workflow "%s"', execution_id,
-                    execution.workflow.name,
-                    extra={'workflowName':execution.workflow.name})
+                    execution.workflow_name,
+                    extra={'workflowName':execution.workflow_name})
             raise
 
         self.session.commit()
@@ -303,26 +352,91 @@ class Backend(object):
                 'Task with id (%s) not found '
                 'while handling "%s" callback' % (task_id, callback_type))
         else:
+            self._validate_callback(task, callback_type, [body_data])
             LOG.info('Got "%s" callback for task (%s:%s) in workflow "%s"',
-                callback_type, task.name, task_id, task.workflow.name,
-                extra={'workflowName':task.workflow.name})
-            task.handle_callback(callback_type, body_data, query_string_data)
+                callback_type, task.name, task_id, task.workflow_name,
+                extra={'workflowName':task.workflow_name})
+            self._handle_next_step(task.handle_callback(callback_type,
+                body_data, query_string_data))
 
     def handle_method_callback(self, method_id, callback_type, body_data,
             query_string_data):
+        method = self._get_callback_method(method_id, callback_type)
+        self._validate_callback(method, callback_type, [body_data])
+        LOG.info('Got "%s" callback for %s method (%s:%s) in workflow "%s"',
+            callback_type, method.__class__.__name__, method.name,
+            method_id, method.workflow_name,
+            extra={'workflowName':method.workflow_name})
+        self._handle_next_step(method.handle_callback(callback_type,
+            body_data, query_string_data))
+
+    def _handle_next_step(self, step):
+        # An internal step the net has run in the callback before it
+        # (see step_chains), rather than notifying it on its own.
+        if isinstance(step, step_chains.Step):
+            if step.kind == 'task':
+                self.handle_task_callback(step.id, step.callback_type,
+                        step.body_data, step.query_string_data)
+            else:
+                self.handle_method_callback(step.id, step.callback_type,
+                        step.body_data, step.query_string_data)
+
+    def handle_method_callbacks(self, method_id, callback_type,
+            body_data_list, query_string_data):
+        method = self._get_callback_method(method_id, callback_type)
+        self._validate_callback(method, callback_type, body_data_list)
+        LOG.info('Got %s "%s" callbacks for %s method (%s:%s) in workflow '
+            '"%s"', len(body_data_list), callback_type,
+            method.__class__.__name__, method.name, method_id,
+            method.workflow_name, extra={'workflowName':method.workflow_name})
+        method.handle_callbacks(callback_type, body_data_list,
+                query_string_data)
+
+    def queue_task_callback(self, task_id, callback_type, body_data,
+            query_string_data):
+        self._queue_callback('task', task_id, callback_type, body_data,
+                query_string_data)
+
+    def queue_method_callback(self, method_id, callback_type, body_data,
+            query_string_data):
+        self._queue_callback('method', method_id, callback_type, body_data,
+                query_string_data)
+
+    def _queue_callback(self, target, target_id, callback_type, body_data,
+            query_string_data):
+        model_class = models.Task if target == 'task' else models.Method
+        entity = self.session.query(model_class).get(target_id)
+        if entity is None:
+            raise NoSuchEntityError(
+                '%s with id (%s) not found while handling "%s" callback'
+                % (target.capitalize(), target_id, callback_type))
+        # Rejected now, as the synchronous path would, rather than retried
+        # by the callback processor until it gives up.
+        self._validate_callback(entity, callback_type, [body_data])
+
+        callback_queue.enqueue(self.session, target, target_id,
+                callback_type, body_data, query_string_data)
+        self.session.commit()
+
+    def _validate_callback(self, entity, callback_type, body_data_list):
+        if callback_type not in entity.VALID_CALLBACK_TYPES:
+            raise exceptions.InvalidCallbackError(
+                'Invalid callback type (%s).  Allowed types: %s'
+                % (callback_type, sorted(entity.VALID_CALLBACK_TYPES)))
+        for body_data in body_data_list:
+            if body_data is not None and not isinstance(body_data, dict):
+                raise exceptions.InvalidCallbackError(
+                    'Expected a JSON object as the body of a "%s" callback'
+                    % callback_type)
+
+    def _get_callback_method(self, method_id, callback_type):
         try:
-            method = self.session.query(models.Method
+            return self.session.query(models.Method
                 ).filter_by(id=method_id).one()
         except NoResultFound:
             raise NoSuchEntityError(
                 'Method with id (%s) not found '
                 'while handling "%s" callback' % (method_id, callback_type))
-        else:
-            LOG.info('Got "%s" callback for %s method (%s:%s) in workflow "%s"',
-                callback_type, method.__class__.__name__, method.name,
-                method_id, method.workflow.name,
-                extra={'workflowName':method.workflow.name})
-            method.handle_callback(callback_type, body_data, query_string_data)
 
     def server_info(self):
         result = get_server_info('ptero_workflow.implementation.celery_app')
@@ -346,8 +460,22 @@ class Backend(object):
                 workflow.name, workflow.id,
                 extra={'workflowName': workflow.name})
         workflow.issue_job_delete_requests()
+        task_ids = [task_id for (task_id,) in self.session.query(
+            models.Task.id).filter_by(workflow_id=workflow.id)]
+        stored = self.session.query(models.Result.blob_key,
+                models.Result.content_hash).filter(
+                        models.Result.task_id.in_(task_ids),
+                        or_(models.Result.blob_key.isnot(None),
+                            models.Result.content_hash.isnot(None))).all()
         self.session.delete(workflow)
         self.session.commit()
+        evict_workflow_graph(workflow.id)
+        evict_task_results(task_ids)
+        blob_store.delete_unreferenced(self.session,
+                set(key for key, content_hash in stored if key))
+        models.delete_unreferenced_content(self.session,
+                set(content_hash for key, content_hash in stored
+                    if content_hash))
 
     def get_workflow_summary(self, workflow_id):
         m = models
@@ -364,40 +492,45 @@ class Backend(object):
 
         return self._get_workflow(workflow_id).as_dict_for_summary()
 
-    def submit_job(self, execution_id):
+    def submit_job(self, execution_id, derive_status=False):
         execution = self._get_execution(execution_id)
+        method = execution.method
 
         job_id = str(uuid.uuid4())
-        execution.data['jobId'] = job_id
+        execution.set_data({'jobId': job_id})
+
+        job_url = method.get_job_submit_url(job_id)
+        submit_data = method.get_job_submit_data(execution.id, derive_status)
+        execution_name = execution.name
+        workflow_name = execution.workflow_name
+        # Don't hold a transaction open while waiting on the job service.
         self.session.commit()
 
-        job_url = execution.method.get_job_submit_url(job_id)
         LOG.info('Submitting Job for execution "%s" of workflow '
-                '"%s" -- %s', execution.name, execution.workflow.name,
-                job_url, extra={'workflowName': execution.workflow.name})
-
-        submit_data = execution.method.get_job_submit_data(execution.id)
-        result = self.http_with_result_task.delay('PUT', job_url, **submit_data)
+                '"%s" -- %s', execution_name, workflow_name,
+                job_url, extra={'workflowName': workflow_name})
+        job_url_from_header = submit_job(method.service_url, job_url,
+                submit_data)
 
-        response_info = result.wait()
-        if 'json' in response_info:
+        if job_url_from_header is not None:
             execution.status = scheduled
-            url_from_header = response_info['headers']['location']
-            execution.data['jobUrl'] = url_from_header
+            execution.set_data({'jobUrl': job_url_from_header})
         else:
             error_message = 'Failed to submit job to service. ' +\
                     'Execution id: %s'
             LOG.error(error_message, execution.id,
-                    extra={'workflowName': execution.workflow.name})
+                    extra={'workflowName': workflow_name})
             execution.status = errored
-            execution.data['error_message'] = error_message
+            execution.set_data({'error_message': error_message})
+            method.record_task_status(execution, failed,
+                    {'derive_status': derive_status})
 
             response_url = execution.data[
                     'petri_response_links_for_job']['failure']
             LOG.info('Notifying petri: execution "%s" failed for'
-                    ' workflow "%s"', execution.name, execution.workflow.name,
-                    extra={'workflowName': execution.workflow.name})
-            self.http_task.delay('PUT', response_url)
+                    ' workflow "%s"', execution_name, workflow_name,
+                    extra={'workflowName': workflow_name})
+            outbox.send(self.session, 'PUT', response_url)
         self.session.commit()
 
     def get_spawned_workflows(self, workflow_id):
@@ -0,0 +1,284 @@
+from ptero_common import nicer_logging
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import urlparse
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['FileSystemBlobStore', 'get_blob_store', 'threshold',
+        'should_offload', 'put',
+        'put_array', 'element_range', 'load', 'read_chunks',
+        'delete_unreferenced', 'sweep']
+
+
+# Results whose JSON is larger than this are written to the blob store
+# configured by PTERO_WORKFLOW_BLOB_STORE_URL (e.g. file:///var/ptero/blobs),
+# leaving only their key in the database.  Without a store nothing is
+# offloaded.
+_STORE_URL = os.environ.get('PTERO_WORKFLOW_BLOB_STORE_URL')
+_THRESHOLD = int(os.environ.get('PTERO_WORKFLOW_BLOB_THRESHOLD',
+    1024 * 1024))
+_CHUNK_SIZE = 64 * 1024
+_SWEEP_BATCH_SIZE = 1000
+
+
+class FileSystemBlobStore(object):
+    """
+    Stores blobs as files under <root>, named by the sha256 of their
+    content, so that identical payloads are only stored once.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def put(self, chunks, reserve=None):
+        """
+        Writes the strings in <chunks> to a new blob and returns its key.
+        <reserve> (if given) is called with the key once it is known, before
+        the blob can be opened under it.
+        """
+        digest = hashlib.sha256()
+        _ensure_directory(self.root)
+        handle, temp_path = tempfile.mkstemp(dir=self.root)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+            key = digest.hexdigest()
+            if reserve is not None:
+                reserve(key)
+            _ensure_directory(os.path.dirname(self._path(key)))
+            os.rename(temp_path, self._path(key))
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return key
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def keys(self):
+        try:
+            directories = os.listdir(self.root)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        for directory in directories:
+            path = os.path.join(self.root, directory)
+            if len(directory) == 2 and os.path.isdir(path):
+                for key in os.listdir(path):
+                    yield key
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+
+def _ensure_directory(directory):
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+# Other stores can be added by url scheme; they need put, open, delete and
+# keys.
+STORE_CLASSES = {
+    'file': lambda url: FileSystemBlobStore(url.path),
+}
+
+_STORE = None
+
+
+def get_blob_store():
+    global _STORE
+    if _STORE is None and _STORE_URL:
+        url = urlparse.urlparse(_STORE_URL)
+        _STORE = STORE_CLASSES[url.scheme](url)
+    return _STORE
+
+
+def threshold():
+    """
+    The length above which JSON is offloaded, or None if there's no blob
+    store to offload it to.
+    """
+    if get_blob_store() is None:
+        return None
+    return _THRESHOLD
+
+
+def should_offload(data_text):
+    """
+    True if the JSON <data_text> is too large to keep in the database.
+    """
+    return get_blob_store() is not None and len(data_text) > _THRESHOLD
+
+
+def put(connection, chunks):
+    """
+    Writes the strings in <chunks> to a new blob and returns its key.  The
+    key's row in the blob table is locked in <connection>'s transaction
+    before the blob is made visible, so that delete_unreferenced can't
+    delete it before a result that refers to it is committed.
+    """
+    return get_blob_store().put(chunks, reserve=lambda key: _lock(
+        connection, key, None))
+
+
+def put_array(connection, elements):
+    """
+    Like put, for a JSON array each of whose <elements> is given as an
+    iterable of strings.  Where each element starts is recorded with the
+    blob, so that one element can be read without parsing the others.
+    """
+    # offsets[i] is where element i starts, and the last offset is just
+    # past the closing bracket, so element i ends one byte (the comma or
+    # the bracket) before offsets[i + 1].
+    offsets = []
+
+    def chunks():
+        position = 1
+        yield '['
+        for i, element in enumerate(elements):
+            if i:
+                position += 1
+                yield ','
+            offsets.append(position)
+            for chunk in element:
+                position += len(chunk)
+                yield chunk
+        offsets.append(position + 1)
+        yield ']'
+
+    return get_blob_store().put(chunks(), reserve=lambda key: _lock(
+        connection, key, offsets))
+
+
+def _lock(connection, key, element_offsets):
+    # Waits for a delete_unreferenced that is deleting the key to finish.
+    connection.execute(text("""
+        INSERT INTO blob (key, element_offsets)
+        VALUES (:key, CAST(:element_offsets AS bigint[]))
+        ON CONFLICT (key) DO UPDATE SET element_offsets =
+            coalesce(blob.element_offsets, EXCLUDED.element_offsets)
+    """), {'key': key, 'element_offsets': element_offsets})
+
+
+def element_range(session, key, index):
+    """
+    Returns (start, end) of the bytes of element <index> of the array in
+    blob <key>, or None if they weren't recorded.
+    """
+    row = session.execute(text("""
+        SELECT element_offsets[:index + 1], element_offsets[:index + 2] - 1
+        FROM blob WHERE key = :key
+    """), {'key': key, 'index': index}).first()
+    if row is None or None in row:
+        return None
+    return tuple(row)
+
+
+def load(key, path=(), element_range=None):
+    """
+    Returns the element at <path> (a list of indexes) of the data in a
+    blob, or None if there is no such element.  Given the element_range of
+    path[0], only that element is read.
+    """
+    with get_blob_store().open(key) as f:
+        if path and element_range is not None:
+            start, end = element_range
+            f.seek(start)
+            data = json.loads(f.read(end - start))
+            path = path[1:]
+        else:
+            data = json.load(f)
+    for index in path:
+        try:
+            data = data[index]
+        except (IndexError, KeyError, TypeError):
+            return None
+    return data
+
+
+def read_chunks(key, element_range=None):
+    """
+    Yields the JSON of a blob, or of the element at <element_range> in it,
+    a chunk at a time without parsing it.
+    """
+    with get_blob_store().open(key) as blob:
+        if element_range is None:
+            for chunk in iter(lambda: blob.read(_CHUNK_SIZE), ''):
+                yield chunk
+        else:
+            start, end = element_range
+            blob.seek(start)
+            while start < end:
+                chunk = blob.read(min(_CHUNK_SIZE, end - start))
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+
+
+def delete_unreferenced(session, keys):
+    """
+    Deletes (and commits deleting) the blobs among <keys> that no result
+    refers to any more.
+    """
+    if not keys:
+        return
+    try:
+        deleted = [key for (key,) in session.execute(text("""
+            DELETE FROM blob
+            WHERE key = ANY(:keys) AND NOT EXISTS (
+                SELECT 1 FROM result WHERE result.blob_key = blob.key)
+            RETURNING key
+        """), {'keys': list(keys)})]
+        # Removed before committing, while put waits on the deleted rows
+        # for anyone writing the same content again.
+        for key in deleted:
+            LOG.debug('Deleting unreferenced blob %s', key)
+            get_blob_store().delete(key)
+        session.commit()
+    except IntegrityError:
+        # A result referring to one of them was created meanwhile; they
+        # will be deleted along with a later workflow or by sweep.
+        session.rollback()
+
+
+def sweep(session):
+    """
+    Deletes every blob that no result refers to, including those written
+    by transactions that were then rolled back.  Run it from time to time
+    with "python -m ptero_workflow.implementation.blob_sweep".
+    """
+    store = get_blob_store()
+    if store is None:
+        return
+    keys = list(store.keys())
+    for start in xrange(0, len(keys), _SWEEP_BATCH_SIZE):
+        batch = keys[start:start + _SWEEP_BATCH_SIZE]
+        # Blobs without a row are recorded, so that they are deleted under
+        # the same locks as the others.
+        session.execute(text("""
+            INSERT INTO blob (key)
+            SELECT unnest(CAST(:keys AS text[]))
+            ON CONFLICT DO NOTHING
+        """), {'keys': batch})
+        session.commit()
+        delete_unreferenced(session, batch)
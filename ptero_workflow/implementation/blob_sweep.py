@@ -0,0 +1,15 @@
+from ptero_common.logging_configuration import configure_web_logging
+from ptero_workflow.implementation import blob_store
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import os
+
+
+def main():
+    configure_web_logging("WORKFLOW")
+    engine = create_engine(os.environ['PTERO_WORKFLOW_DB_STRING'])
+    blob_store.sweep(sessionmaker(bind=engine)())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+from collections import defaultdict
+from sqlalchemy.orm import object_mapper
+from sqlalchemy.orm.attributes import instance_state
+from sqlalchemy.orm.interfaces import MANYTOONE, ONETOMANY
+from sqlalchemy.orm.session import make_transient_to_detached
+from sqlalchemy.schema import sort_tables_and_constraints
+from sqlalchemy.sql.expression import ClauseElement
+from ptero_common import nicer_logging
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['bulk_save']
+
+
+_ROWS_PER_INSERT = 1000
+
+
+def bulk_save(session, root):
+    """
+    Persists <root> and every new object cascaded from it using one
+    multi-row INSERT per table (per thousand rows) instead of the unit of
+    work's INSERT per object.  Primary keys are drawn from the tables'
+    sequences up front so that foreign keys can be filled in memory.
+
+    Mapper before_insert listeners are called for every object, as they
+    would be by a flush.  Afterwards the objects are attached to <session>
+    as if they had been loaded from the database; nothing further is
+    flushed for them.
+    """
+    session.add(root)
+    objects = list(session.new)
+    for obj in objects:
+        session.expunge(obj)
+
+    _allocate_ids(session, objects)
+    _sync_foreign_keys(objects)
+    _dispatch_before_insert(session.connection(), objects)
+
+    rows = _rows_by_table(objects)
+    tables, deferred_constraints = _insert_order(rows)
+    deferred_values = _defer_columns(rows, deferred_constraints)
+
+    for table in tables:
+        for start in xrange(0, len(rows[table]), _ROWS_PER_INSERT):
+            session.execute(table.insert().values(
+                rows[table][start:start + _ROWS_PER_INSERT]))
+
+    for (table, column), values in deferred_values.iteritems():
+        _update_column(session, table, column, values)
+
+    for obj in objects:
+        make_transient_to_detached(obj)
+    for obj in objects:
+        session.add(obj)
+
+    LOG.debug('Bulk saved %s objects into %s tables', len(objects),
+            len(tables))
+
+
+def _allocate_ids(session, objects):
+    objects_by_table = defaultdict(list)
+    for obj in objects:
+        objects_by_table[object_mapper(obj).base_mapper.local_table].append(
+                obj)
+
+    for table, table_objects in objects_by_table.iteritems():
+        ids = session.execute("""
+            SELECT nextval(:sequence) FROM generate_series(1, :count)
+        """, {'sequence': '%s_id_seq' % table.name,
+              'count': len(table_objects)}).fetchall()
+        for obj, (id,) in zip(table_objects, ids):
+            obj.id = id
+
+
+def _sync_foreign_keys(objects):
+    for obj in objects:
+        state_dict = instance_state(obj).dict
+        for relationship in object_mapper(obj).relationships:
+            value = state_dict.get(relationship.key)
+            if value is None:
+                continue
+
+            if relationship.direction is MANYTOONE:
+                _copy_columns(relationship.local_remote_pairs,
+                        source=value, destination=obj)
+            elif relationship.direction is ONETOMANY:
+                if isinstance(value, dict):
+                    value = value.values()
+                for child in value:
+                    _copy_columns([(remote, local) for local, remote
+                        in relationship.local_remote_pairs],
+                        source=obj, destination=child)
+
+
+def _dispatch_before_insert(connection, objects):
+    for obj in objects:
+        mapper = object_mapper(obj)
+        mapper.dispatch.before_insert(mapper, connection, obj)
+
+
+def _copy_columns(destination_source_pairs, source, destination):
+    source_mapper = object_mapper(source)
+    destination_mapper = object_mapper(destination)
+    for destination_column, source_column in destination_source_pairs:
+        setattr(destination,
+                destination_mapper.get_property_by_column(
+                    destination_column).key,
+                getattr(source,
+                    source_mapper.get_property_by_column(source_column).key))
+
+
+def _rows_by_table(objects):
+    rows = defaultdict(list)
+    for obj in objects:
+        mapper = object_mapper(obj)
+        for table in mapper.tables:
+            rows[table].append(_row(obj, mapper, table))
+    return rows
+
+
+def _row(obj, mapper, table):
+    state_dict = instance_state(obj).dict
+    row = {}
+    for column in table.columns:
+        key = mapper.get_property_by_column(column).key
+        value = state_dict.get(key)
+        if value is None and column.default is not None:
+            value = _default_value(column.default)
+        if key not in state_dict and not _is_clause_element(value):
+            # so that reading it later doesn't have to hit the database
+            setattr(obj, key, value)
+        row[column.key] = value
+    return row
+
+
+def _default_value(default):
+    if default.is_callable:
+        return default.arg(None)
+    else:
+        return default.arg
+
+
+def _is_clause_element(value):
+    return isinstance(value, ClauseElement)
+
+
+def _insert_order(rows):
+    """
+    Returns the tables in an order that satisfies their foreign keys, and
+    the foreign key constraints that have to be filled in after every row
+    is inserted (use_alter constraints or the ones closing a cycle).
+    """
+    def separate(constraint):
+        if constraint.use_alter or not _is_used(constraint, rows):
+            return True
+
+    tables = []
+    deferred_constraints = []
+    for table, constraints in sort_tables_and_constraints(rows.keys(),
+            filter_fn=separate):
+        if table is not None:
+            tables.append(table)
+        else:
+            deferred_constraints.extend(c for c in constraints
+                    if _is_used(c, rows))
+    return tables, deferred_constraints
+
+
+def _is_used(constraint, rows):
+    return any(row[column.key] is not None for row in rows[constraint.table]
+            for column in constraint.columns)
+
+
+def _defer_columns(rows, constraints):
+    deferred_values = defaultdict(list)
+    for constraint in constraints:
+        table = constraint.table
+        for column in constraint.columns:
+            for row in rows[table]:
+                if row[column.key] is not None:
+                    deferred_values[(table, column)].append(
+                            (row['id'], row[column.key]))
+                    row[column.key] = None
+    return deferred_values
+
+
+def _update_column(session, table, column, values):
+    ids, column_values = zip(*values)
+    session.execute("""
+        UPDATE %(table)s SET %(column)s = data.value
+        FROM unnest(:ids, :values) AS data(id, value)
+        WHERE %(table)s.id = data.id
+    """ % {'table': table.name, 'column': column.name},
+        {'ids': list(ids), 'values': list(column_values)})
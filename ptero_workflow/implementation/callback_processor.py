@@ -0,0 +1,152 @@
+from multiprocessing.pool import ThreadPool
+from ptero_common import nicer_logging
+from ptero_common.exceptions import NoSuchEntityError
+from ptero_common.logging_configuration import configure_web_logging
+from ptero_workflow.implementation.exceptions import ValidationError
+from ptero_workflow.implementation.factory import Factory
+from ptero_workflow.implementation.models.callback_queue import NOTIFY_CHANNEL
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import create_engine, text
+import os
+import select
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['CallbackProcessor']
+
+
+_BATCH_SIZE = int(os.environ.get('PTERO_WORKFLOW_CALLBACK_BATCH_SIZE', 100))
+_CONCURRENCY = int(os.environ.get('PTERO_WORKFLOW_CALLBACK_CONCURRENCY', 8))
+_POLL_INTERVAL = float(os.environ.get(
+    'PTERO_WORKFLOW_CALLBACK_POLL_INTERVAL', 5))
+_MAX_ATTEMPTS = int(os.environ.get('PTERO_WORKFLOW_CALLBACK_MAX_ATTEMPTS',
+    10))
+_RETRY_DELAY = float(os.environ.get('PTERO_WORKFLOW_CALLBACK_RETRY_DELAY',
+    1))
+
+
+class CallbackProcessor(object):
+    """
+    Handles the callbacks queued in the queued_callback table when the API
+    runs with PTERO_WORKFLOW_QUEUE_CALLBACKS set.  Only the oldest callback
+    for each ordering key is claimed (with SKIP LOCKED), so callbacks for one
+    execution are handled in order while those for different executions are
+    handled in parallel, by up to <concurrency> threads and by any number of
+    processors.  A callback that fails is retried, holding back the ones
+    queued after it for the same execution.
+    """
+    def __init__(self, engine, factory, batch_size=_BATCH_SIZE,
+            concurrency=_CONCURRENCY):
+        self.engine = engine
+        self.factory = factory
+        self.batch_size = batch_size
+        self.pool = ThreadPool(concurrency)
+
+    def run_forever(self):
+        connection = self.engine.raw_connection()
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.cursor().execute('LISTEN %s' % NOTIFY_CHANNEL)
+
+        while True:
+            while self.process_batch():
+                pass
+
+            if select.select([connection], [], [], _POLL_INTERVAL)[0]:
+                connection.poll()
+                del connection.notifies[:]
+
+    def process_batch(self):
+        with self.engine.begin() as connection:
+            callbacks = connection.execute(text("""
+                SELECT id, target, target_id, callback_type, body, query,
+                    attempts
+                FROM queued_callback AS q
+                WHERE available_at <= now()
+                AND NOT EXISTS (
+                    SELECT 1 FROM queued_callback AS earlier
+                    WHERE earlier.ordering_key = q.ordering_key
+                    AND earlier.id < q.id
+                )
+                ORDER BY id
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            """), limit=self.batch_size).fetchall()
+
+            if callbacks:
+                handled = self.pool.map(self._handle, callbacks)
+                self._delete(connection, [c.id for c, ok
+                    in zip(callbacks, handled) if ok])
+                self._reschedule(connection, [c.id for c, ok
+                    in zip(callbacks, handled) if not ok])
+
+        return len(callbacks)
+
+    def _handle(self, callback):
+        backend = self.factory.create_backend()
+        try:
+            if callback.target == 'task':
+                backend.handle_task_callback(callback.target_id,
+                        callback.callback_type, callback.body, callback.query)
+            else:
+                backend.handle_method_callback(callback.target_id,
+                        callback.callback_type, callback.body, callback.query)
+        except NoSuchEntityError:
+            # The workflow has been deleted since the callback was queued.
+            LOG.warning('Dropping "%s" callback for deleted %s (%s)',
+                    callback.callback_type, callback.target,
+                    callback.target_id)
+        except ValidationError as e:
+            # Retrying can't make it valid.
+            LOG.error('Dropping invalid "%s" callback for %s (%s): %s',
+                    callback.callback_type, callback.target,
+                    callback.target_id, e.message)
+        except Exception:
+            LOG.exception('Failed to handle "%s" callback for %s (%s) '
+                    '(attempt %s)', callback.callback_type, callback.target,
+                    callback.target_id, callback.attempts + 1)
+            return False
+        finally:
+            backend.cleanup()
+        return True
+
+    def _delete(self, connection, ids):
+        if ids:
+            connection.execute(text("""
+                DELETE FROM queued_callback WHERE id = ANY(:ids)
+            """), ids=ids)
+
+    def _reschedule(self, connection, ids):
+        if not ids:
+            return
+
+        abandoned = connection.execute(text("""
+            DELETE FROM queued_callback
+            WHERE id = ANY(:ids) AND attempts + 1 >= :max_attempts
+            RETURNING target, target_id, callback_type
+        """), ids=ids, max_attempts=_MAX_ATTEMPTS).fetchall()
+        for target, target_id, callback_type in abandoned:
+            LOG.error('Giving up on "%s" callback for %s (%s) after %s '
+                    'attempts', callback_type, target, target_id,
+                    _MAX_ATTEMPTS)
+
+        connection.execute(text("""
+            UPDATE queued_callback
+            SET attempts = attempts + 1,
+                available_at = now() +
+                    :retry_delay * power(2, attempts) * interval '1 second'
+            WHERE id = ANY(:ids)
+        """), ids=ids, retry_delay=_RETRY_DELAY)
+
+
+def main():
+    configure_web_logging("WORKFLOW")
+    db_string = os.environ['PTERO_WORKFLOW_DB_STRING']
+    CallbackProcessor(create_engine(db_string),
+            Factory(db_string, pool_size=_CONCURRENCY)).run_forever()
+
+
+if __name__ == '__main__':
+    import signal
+    signal.signal(signal.SIGTERM, signal.getsignal(signal.SIGINT))
+    main()
@@ -1,6 +1,8 @@
 from celery.signals import worker_init, setup_logging
+from psycopg2 import extensions
 import celery
 import os
+import psycopg2
 from factory import Factory
 from ptero_common.logging_configuration import configure_celery_logging
 from ptero_common.celery.utils import get_celery_config
@@ -34,7 +36,36 @@ def setup_celery_logging(**kwargs):
 
 
 @worker_init.connect
-def initialize_factory(**kwargs):
+def initialize_factory(sender=None, **kwargs):
+    _make_psycopg2_cooperative()
+    # Every green thread of the submit worker's eventlet pool may hold a
+    # database connection at once, so the pool keeps as many.
     app.factory = Factory(
         database_url=os.environ['PTERO_WORKFLOW_DB_STRING'],
-            celery_app=app)
+            celery_app=app, pool_size=sender.concurrency)
+
+
+def _make_psycopg2_cooperative():
+    # Under the eventlet pool (see the Procfile) a psycopg2 query would
+    # otherwise block every green thread in the worker until it returns.
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return
+    if patcher.is_monkey_patched('socket'):
+        extensions.set_wait_callback(_eventlet_wait_callback)
+
+
+def _eventlet_wait_callback(connection, timeout=-1):
+    from eventlet.hubs import trampoline
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(connection.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(connection.fileno(), write=True)
+        else:
+            raise psycopg2.OperationalError(
+                    'Bad result from poll: %r' % state)
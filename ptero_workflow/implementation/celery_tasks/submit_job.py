@@ -10,7 +10,7 @@ __all__ = ['SubmitJob']
 class SubmitJob(celery.Task):
     ignore_result = True
 
-    def run(self, execution_id):
+    def run(self, execution_id, derive_status=False):
         backend = celery.current_app.factory.create_backend()
-        backend.submit_job(execution_id)
+        backend.submit_job(execution_id, derive_status)
         backend.cleanup()
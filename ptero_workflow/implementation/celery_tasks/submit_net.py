@@ -1,5 +1,7 @@
 import celery
 from ptero_common import nicer_logging
+from ptero_workflow.implementation.exceptions import PetriSubmissionError
+import os
 
 
 LOG = nicer_logging.getLogger(__name__)
@@ -7,8 +9,13 @@ LOG = nicer_logging.getLogger(__name__)
 __all__ = ['SubmitNet']
 
 
+_RETRY_DELAY = int(os.environ.get('PTERO_WORKFLOW_SUBMIT_NET_RETRY_DELAY', 10))
+
+
 class SubmitNet(celery.Task):
     ignore_result = True
+    max_retries = int(os.environ.get('PTERO_WORKFLOW_SUBMIT_NET_MAX_RETRIES',
+        10))
 
     def run(self, workflow_name):
         LOG.info('Preparing to submit workflow named "%s"', workflow_name,
@@ -16,5 +23,11 @@ class SubmitNet(celery.Task):
         backend = celery.current_app.factory.create_backend()
         LOG.info('Preparing to submit workflow "%s"', workflow_name,
                 extra={'workflowName':workflow_name})
-        backend.submit_net(workflow_name)
-        backend.cleanup()
+        try:
+            backend.submit_net(workflow_name)
+        except PetriSubmissionError as e:
+            LOG.warning('Failed to submit petri net for workflow "%s": %s',
+                    workflow_name, e, extra={'workflowName':workflow_name})
+            raise self.retry(exc=e, countdown=_RETRY_DELAY)
+        finally:
+            backend.cleanup()
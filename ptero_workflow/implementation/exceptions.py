@@ -43,7 +43,15 @@ class UnknownIntegrityError(ValidationError):
 
 
 class DAGCycleError(ValidationError):
-    pass
+    def __init__(self, message, members=()):
+        super(DAGCycleError, self).__init__(message)
+        self.members = members
+
+
+class UnreachableTaskError(ValidationError):
+    def __init__(self, message, members=()):
+        super(UnreachableTaskError, self).__init__(message)
+        self.members = members
 
 
 class IllegalTaskNameError(ValidationError):
@@ -54,10 +62,18 @@ class InvalidExecutionUrlError(ValidationError):
     pass
 
 
+class InvalidCallbackError(ValidationError):
+    pass
+
+
 class DuplicatePetriNetError(Exception):
     pass
 
 
+class PetriSubmissionError(Exception):
+    pass
+
+
 class DuplicateJobError(Exception):
     pass
 
@@ -1,5 +1,9 @@
 from ptero_common.factories.bigfactory import BigFactory
 from ptero_workflow.implementation import backend
+from sqlalchemy.dialects import plugins
+from sqlalchemy.engine import CreateEnginePlugin
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 import os
 
 
@@ -7,6 +11,15 @@ __all__ = ['Factory']
 
 
 class Factory(BigFactory):
+    """
+    Pass <pool_size> to keep that many database connections in the pool of
+    the factory's engine, e.g. one for each green thread of a worker.
+    """
+    def __init__(self, database_url, celery_app=None, pool_size=None):
+        if pool_size is not None:
+            database_url = _with_pool_size(database_url, pool_size)
+        BigFactory.__init__(self, database_url, celery_app=celery_app)
+
     @property
     def backend_class(self):
         return backend.Backend
@@ -18,3 +31,28 @@ class Factory(BigFactory):
         if self.celery_app is None:
             from ptero_workflow.implementation.celery_app import app
             self.celery_app = app
+
+
+_POOL_SIZE_PLUGIN = 'ptero_workflow_pool_size'
+
+
+def _with_pool_size(database_url, pool_size):
+    # The engine is created by BigFactory, so the pool size is handed to it
+    # in the url, for _PoolSizePlugin to take out again.
+    url = make_url(database_url)
+    url.query['plugin'] = _POOL_SIZE_PLUGIN
+    url.query['pool_size'] = str(pool_size)
+    return str(url)
+
+
+class _PoolSizePlugin(CreateEnginePlugin):
+    def __init__(self, url, kwargs):
+        CreateEnginePlugin.__init__(self, url, kwargs)
+        self.pool_size = int(url.query.pop('pool_size'))
+
+    def handle_pool_kwargs(self, pool_cls, pool_args):
+        if issubclass(pool_cls, QueuePool):
+            pool_args['pool_size'] = self.pool_size
+
+
+plugins.register(_POOL_SIZE_PLUGIN, __name__, '_PoolSizePlugin')
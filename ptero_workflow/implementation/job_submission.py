@@ -0,0 +1,73 @@
+from ptero_common import nicer_logging
+from requests.adapters import HTTPAdapter
+import os
+import requests
+import threading
+import time
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['submit_job']
+
+
+_POOL_SIZE = int(os.environ.get('PTERO_WORKFLOW_JOB_SUBMIT_POOL_SIZE', 20))
+_TIMEOUT = float(os.environ.get('PTERO_WORKFLOW_JOB_SUBMIT_TIMEOUT', 60))
+_RETRIES = int(os.environ.get('PTERO_WORKFLOW_JOB_SUBMIT_RETRIES', 3))
+_RETRY_DELAY = float(os.environ.get('PTERO_WORKFLOW_JOB_SUBMIT_RETRY_DELAY',
+    1))
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def submit_job(service_url, job_url, submit_data):
+    """
+    PUTs a job to its service over a keep-alive connection pool shared by
+    every submission to that service_url.  Returns the new job's url, or None
+    if it could not be submitted.  Connection errors and 5xx responses are
+    retried (up to PTERO_WORKFLOW_JOB_SUBMIT_RETRIES times, with backoff),
+    which is safe because the job's id is part of job_url.
+    """
+    for attempt in range(_RETRIES + 1):
+        if attempt:
+            time.sleep(_RETRY_DELAY * 2 ** (attempt - 1))
+
+        try:
+            response = _get_session(service_url).put(job_url,
+                    json=submit_data, timeout=_TIMEOUT)
+        except requests.ConnectionError:
+            LOG.exception('Failed to PUT job to %s (attempt %s)', job_url,
+                    attempt + 1)
+            continue
+        except requests.RequestException:
+            LOG.exception('Failed to PUT job to %s', job_url)
+            return None
+
+        if response.status_code >= 500:
+            LOG.warning('Got %s response to job PUT at %s (attempt %s): %s',
+                    response.status_code, job_url, attempt + 1,
+                    response.text)
+        elif response.status_code in (200, 201) and \
+                'location' in response.headers:
+            return response.headers['location']
+        else:
+            LOG.error('Got %s response to job PUT at %s: %s',
+                    response.status_code, job_url, response.text)
+            return None
+
+    LOG.error('Giving up on job PUT at %s after %s attempts', job_url,
+            _RETRIES + 1)
+    return None
+
+
+def _get_session(service_url):
+    with _SESSIONS_LOCK:
+        if service_url not in _SESSIONS:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1,
+                    pool_maxsize=_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _SESSIONS[service_url] = session
+        return _SESSIONS[service_url]
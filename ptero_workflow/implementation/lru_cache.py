@@ -0,0 +1,74 @@
+from collections import OrderedDict
+import threading
+
+
+__all__ = ['LRUCache']
+
+
+class LRUCache(object):
+    """
+    A thread-safe, bounded mapping that evicts the least recently used
+    entries once more than max_entries are stored, or once the sizes given
+    to put add up to more than max_bytes (if given).
+    """
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                entry = self._entries.pop(key)
+            except KeyError:
+                return default
+            self._entries[key] = entry
+            return entry[0]
+
+    def put(self, key, value, size=0):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, size)
+            self.size += size
+            while (len(self._entries) > self.max_entries or
+                    self.max_bytes is not None and self.size > self.max_bytes):
+                value, size = self._entries.popitem(last=False)[1]
+                self.size -= size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._discard(key, default)
+
+    def discard_if(self, predicate):
+        """
+        Removes every entry whose key satisfies predicate.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _discard(self, key, default=None):
+        try:
+            value, size = self._entries.pop(key)
+        except KeyError:
+            return default
+        self.size -= size
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -1,15 +1,21 @@
-from networkx.exception import NetworkXUnfeasible
 from ptero_workflow.implementation import exceptions, models
 from ptero_workflow.implementation import validators
+from ptero_workflow.implementation.workflow_template import WorkflowTemplate
 from ptero_workflow.utils import deterministic_topological_ordering
 
 
 class ModelBuilder(object):
-    def __init__(self, data):
+    def __init__(self, data, template=None):
         validators.required_inputs(data)
         self.data = data
+        # A WorkflowTemplate of an already validated workflow with the same
+        # structure, whose orderings and input sources are reused.
+        self.template = template
         self.workflow = models.Workflow(name=data.get('name'))
 
+        self.task_paths = {}
+        self.orderings = {}
+
     def build_workflow(self):
         root_task = self.build_root_task()
         self.workflow.root_task = root_task
@@ -50,6 +56,7 @@ class ModelBuilder(object):
                 parallel_by=task_data.get('parallelBy'),
                 parent=parent_method,
                 workflow=self.workflow)
+        self.task_paths[task] = self.child_path(parent_method, task_name)
 
         webhook_data = task_data.get('webhooks', {})
         self.build_webhooks_for_task(webhook_data, task)
@@ -60,6 +67,15 @@ class ModelBuilder(object):
 
         return task
 
+    def child_path(self, parent_method, name):
+        if parent_method is None:
+            return (name,)
+        else:
+            return self.method_path(parent_method) + (name,)
+
+    def method_path(self, method):
+        return self.task_paths[method.task] + (method.name,)
+
     def build_webhooks_for_task(self, webhook_data, task):
         return self.build_webhooks_for_entity(webhook_data, entity=task,
                 arg_name='task')
@@ -95,7 +111,8 @@ class ModelBuilder(object):
         return method
 
     def build_dag_method(self, method_data, index, parent_task):
-        validators.dag_task_names(method_data['parameters']['tasks'])
+        if self.template is None:
+            validators.dag_task_names(method_data['parameters']['tasks'])
 
         method = models.DAG(name=method_data['name'], index=index,
                 task=parent_task, workflow=self.workflow)
@@ -104,7 +121,8 @@ class ModelBuilder(object):
         method.children = children
 
         links_data = method_data['parameters']['links']
-        validators.unique_links(links_data)
+        if self.template is None:
+            validators.unique_links(links_data)
         self.build_links(links_data, method)
 
         return method
@@ -116,16 +134,29 @@ class ModelBuilder(object):
         try:
             ordering = deterministic_topological_ordering(nodes, links,
                     start_node='input connector')
-        except NetworkXUnfeasible:
-            raise exceptions.DAGCycleError('DAG named "%s" has a cycle' % 
-                    dag_data['name'])
+        except exceptions.DAGCycleError as e:
+            raise exceptions.DAGCycleError(
+                    'DAG named "%s" has a cycle involving: %s' % (
+                        dag_data['name'], ', '.join(e.members)),
+                    members=e.members)
+        except exceptions.UnreachableTaskError as e:
+            raise exceptions.UnreachableTaskError(
+                    'DAG named "%s" has tasks not linked from its input '
+                    'connector: %s' % (dag_data['name'], ', '.join(e.members)),
+                    members=e.members)
 
         # disregard input_connector and output_connector
         return ordering[1:-1]
 
     def build_dag_children(self, dag_data, parent_method):
         children = {}
-        ordering = self.get_deterministic_topological_ordering(dag_data)
+        path = self.method_path(parent_method)
+        if self.template is None:
+            ordering = self.get_deterministic_topological_ordering(dag_data)
+        else:
+            ordering = self.template.orderings[path]
+        self.orderings[path] = ordering
+
         for idx, name in enumerate(ordering):
             task_data = dag_data['parameters']['tasks'][name]
             task = self.build_task(name, task_data,
@@ -139,6 +170,8 @@ class ModelBuilder(object):
         children['output connector'] = models.OutputConnector(
             name='output connector', parent=parent_method,
             workflow=self.workflow, topological_index=-1)
+        for name in ['input connector', 'output connector']:
+            self.task_paths[children[name]] = path + (name,)
 
         return children
 
@@ -186,6 +219,7 @@ class ModelBuilder(object):
 
     def build_input_holder(self):
         task = models.InputHolder(name='input_holder', workflow=self.workflow)
+        self.task_paths[task] = (task.name,)
         link = models.Link(source_task=task,
                 destination_task=self.workflow.root_task)
         for i in self.inputs.iterkeys():
@@ -200,6 +234,7 @@ class ModelBuilder(object):
     def build_root_task_output_link(self):
         dummy_output_task = models.InputHolder(name='dummy output task',
                 workflow=self.workflow)
+        self.task_paths[dummy_output_task] = (dummy_output_task.name,)
 
         link = models.Link(source_task=self.workflow.root_task,
             destination_task=dummy_output_task)
@@ -221,3 +256,30 @@ class ModelBuilder(object):
         input_holder.set_outputs(self.inputs,
                 color=self.workflow.color,
                 parent_color=self.workflow.parent_color)
+
+    def build_input_sources(self, session):
+        if self.template is None:
+            self.workflow.root_task.create_input_sources(session, [])
+        else:
+            tasks = {path: task for task, path in self.task_paths.iteritems()}
+            for (destination_path, destination_property, source_path,
+                    source_property, parallel_depths) \
+                    in self.template.input_sources:
+                models.InputSource(
+                        destination_task=tasks[destination_path],
+                        destination_property=destination_property,
+                        source_task=tasks[source_path],
+                        source_property=source_property,
+                        parallel_depths=list(parallel_depths),
+                        workflow=self.workflow)
+
+    def compile_template(self):
+        """
+        Returns a WorkflowTemplate for workflows with the same structure as
+        the one built (including its input sources) by this builder.
+        """
+        input_sources = tuple((self.task_paths[s.destination_task],
+            s.destination_property, self.task_paths[s.source_task],
+            s.source_property, tuple(s.parallel_depths))
+            for s in self.workflow.all_input_sources)
+        return WorkflowTemplate(dict(self.orderings), input_sources)
@@ -7,6 +7,8 @@ from .task import *
 from .result import *
 from .workflow import *
 from .webhook import *
+from .outbox import *
+from .callback_queue import *
 
 
 # flake8: noqa
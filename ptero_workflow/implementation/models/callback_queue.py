@@ -0,0 +1,56 @@
+from .base import Base
+from .json_type import JSON
+from .notifications import notify_on_commit
+from sqlalchemy import Column, DateTime, Integer, String, Text, func
+
+
+__all__ = ['QueuedCallback']
+
+
+NOTIFY_CHANNEL = 'ptero_workflow_callbacks'
+
+
+class QueuedCallback(Base):
+    """
+    A task or method callback accepted by the API and waiting for a callback
+    processor.  Callbacks with the same ordering_key (those for the same
+    execution) are handled one at a time, in the order they arrived.
+    """
+    __tablename__ = 'queued_callback'
+
+    id = Column(Integer, primary_key=True)
+
+    target = Column(String, nullable=False)
+    target_id = Column(Integer, nullable=False)
+    callback_type = Column(Text, nullable=False)
+    body = Column(JSON, nullable=True)
+    query = Column(JSON, nullable=False)
+
+    ordering_key = Column(Text, nullable=False, index=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime(timezone=True), nullable=False,
+            default=func.now(), index=True)
+
+
+def enqueue(session, target, target_id, callback_type, body_data,
+        query_string_data):
+    """
+    Queues a callback for <target> ('task' or 'method') in the session's
+    transaction.  Processors are woken up when the transaction commits.
+    """
+    session.add(QueuedCallback(target=target, target_id=target_id,
+        callback_type=callback_type, body=body_data, query=query_string_data,
+        ordering_key=ordering_key(target, target_id, body_data,
+            query_string_data)))
+    notify_on_commit(session, NOTIFY_CHANNEL)
+
+
+def ordering_key(target, target_id, body_data, query_string_data):
+    # Job services call back with the execution's id, petri with the color
+    # of the execution of the task or method.
+    if 'execution_id' in query_string_data:
+        return 'execution-%s' % query_string_data['execution_id']
+    else:
+        return '%s-%s-%s' % (target, target_id,
+                (body_data or {}).get('color'))
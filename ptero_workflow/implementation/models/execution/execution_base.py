@@ -1,18 +1,29 @@
 from ..base import Base
 from ..json_type import JSON, MutableJSONDict
+from .. import webhook
+from ptero_workflow.implementation.workflow_graph import get_workflow_graph
 from ptero_workflow.urls import url_for
 from sqlalchemy import Column, DateTime, ForeignKey, Integer, Text, String
-from sqlalchemy import UniqueConstraint, func
+from sqlalchemy import Index, UniqueConstraint, func, literal, select
+from sqlalchemy import and_, column, exists, false, inspect, true, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm.session import object_session
 from ptero_workflow.implementation.exceptions import (OutputsAlreadySet,
         ImmutableUpdateError, InvalidStatusError)
 from operator import attrgetter
+import json
 from ptero_common import nicer_logging
 from ptero_common import statuses
 
 LOG = nicer_logging.getLogger(__name__)
 
-__all__ = ['Execution', 'ExecutionStatusHistory']
+__all__ = ['Execution', 'ExecutionStatusHistory', 'NEW_STATUS_PATH',
+        'RUNNING_STATUS_PATH']
+
+
+NEW_STATUS_PATH = ('new',)
+RUNNING_STATUS_PATH = ('new', statuses.scheduled, statuses.running)
 
 
 class Execution(Base):
@@ -21,6 +32,8 @@ class Execution(Base):
     __table_args__ = (
         UniqueConstraint('method_id', 'color'),
         UniqueConstraint('task_id', 'color'),
+        Index('ix_execution_workflow_id_timestamp', 'workflow_id',
+            'timestamp'),
     )
 
     id = Column(Integer, primary_key=True)
@@ -67,9 +80,94 @@ class Execution(Base):
                     status='new')
 
 
+    @classmethod
+    def get_or_create(cls, session, parent_column, parent_id, color, group,
+            workflow_id, status_path=NEW_STATUS_PATH):
+        """
+        Returns (execution, created).  A missing execution is written with
+        an INSERT ... ON CONFLICT DO NOTHING that also records its status
+        history along status_path, and whichever row ends up there, new or
+        existing, is selected by the same statement.
+        """
+        statement = _get_or_create_execution_statement(cls._row(
+            parent_column, parent_id, color, group, workflow_id),
+            parent_column, status_path)
+        row = session.query(cls, column('created')).from_statement(
+                statement).first()
+
+        if row is None:
+            # Another transaction inserted the execution after this
+            # statement's snapshot was taken, so neither half could see it.
+            return cls._find(session, parent_column, parent_id, color), False
+
+        execution, created = row
+        if created:
+            execution._send_creation_webhooks(status_path)
+        return execution, created
+
+    @classmethod
+    def get_or_create_many(cls, session, parent_column, parent_id,
+            colors_and_groups, workflow_id, status_path=NEW_STATUS_PATH):
+        """
+        Like get_or_create for a list of (color, group) pairs, in one INSERT
+        and one SELECT.  Returns ({color: execution}, created colors).
+        """
+        if not colors_and_groups:
+            return {}, set()
+
+        statement = _insert_execution_statement([cls._row(parent_column,
+            parent_id, color, group, workflow_id)
+            for color, group in colors_and_groups], parent_column, status_path)
+        created_ids = set(row[0] for row in session.execute(statement))
+
+        executions = session.query(cls).filter(
+                getattr(cls, parent_column) == parent_id,
+                cls.color.in_([c for c, g in colors_and_groups])).all()
+
+        created_colors = set()
+        for execution in executions:
+            if execution.id in created_ids:
+                execution._send_creation_webhooks(status_path)
+                created_colors.add(execution.color)
+        return {e.color: e for e in executions}, created_colors
+
+    @classmethod
+    def _row(cls, parent_column, parent_id, color, group, workflow_id):
+        colors = group.get('color_lineage', []) + [color]
+        begins = group.get('begin_lineage', []) + [group['begin']]
+        return {
+            parent_column: parent_id,
+            'color': color,
+            'parent_color': _get_parent_color(colors),
+            'colors': colors,
+            'begins': begins,
+            'workflow_id': workflow_id,
+            'type': cls.__mapper__.polymorphic_identity,
+        }
+
+    def _send_creation_webhooks(self, status_path):
+        for old_status, status in zip(status_path, status_path[1:]):
+            self._send_webhooks(old_status, status)
+
+    @classmethod
+    def _find(cls, session, parent_column, parent_id, color):
+        return session.query(cls).filter(
+                getattr(cls, parent_column) == parent_id,
+                cls.color == color).first()
+
+    @property
+    def workflow_graph(self):
+        return get_workflow_graph(object_session(self), self.workflow_id)
+
+    @property
+    def workflow_name(self):
+        return self.workflow_graph.name
+
     @property
     def ordered_status_history(self):
-        return sorted(self.status_history, key=attrgetter('timestamp'))
+        # The statuses an execution is created with share a timestamp, so
+        # ties are broken by the order they were inserted in.
+        return sorted(self.status_history, key=attrgetter('timestamp', 'id'))
 
 
     @property
@@ -87,8 +185,8 @@ class Execution(Base):
                 LOG.debug("Refusing to change status of execution (%s) from "
                         "(%s) to (%s) in workflow %s",
                         self.name, self.status, status,
-                        self.parent.workflow.name,
-                        extra={'workflowName':self.parent.workflow.name})
+                        self.workflow_name,
+                        extra={'workflowName':self.workflow_name})
             else:
                 self.send_webhooks(status)
                 self._status = status
@@ -104,22 +202,30 @@ class Execution(Base):
         return max([h.timestamp for h in self.status_history])
 
     def send_webhooks(self, status):
-        webhooks = self.parent.get_webhooks(status)
+        self._send_webhooks(self.status, status)
+
+    def _send_webhooks(self, old_status, status):
+        parent_node = self.parent_node
+        webhooks = parent_node.webhook_routes.get(status)
         if webhooks:
             # this involves at least a little overhead, so only do it once
             # we know that there are webhooks to send.
+            workflow_name = self.workflow_name
             webhook_data = {
-                'workflowUrl': self.parent.workflow.url,
+                'workflowUrl': url_for('workflow-detail',
+                    workflow_id=self.workflow_id),
                 'executionUrl': self.url,
-                'targetName': self.parent.name,
-                'targetType': self.parent.type,
+                'targetName': parent_node.name,
+                'targetType': parent_node.type,
                 'color': self.color,
                 'parentColor': self.parent_color,
-                'oldStatus': self.status,
+                'oldStatus': old_status,
                 'status': status,
             }
-            for webhook in webhooks:
-                webhook.send_after_commit(**webhook_data)
+            session = object_session(self)
+            for name, url in webhooks:
+                webhook.send(session, name, url, workflow_name,
+                        self.parent_type, parent_node.name, **webhook_data)
 
     def as_dict(self, detailed):
         result = {name: getattr(self, name) for name in ['name', 'color',
@@ -196,9 +302,24 @@ class Execution(Base):
         self.status = new_status
 
     def update_data(self, old_data, new_data):
-        updated_data = old_data.copy()
-        updated_data.update(new_data)
-        self.data = updated_data
+        self.set_data(new_data)
+
+    def set_data(self, fields):
+        """
+        Sets the top-level keys of data in <fields> with a single jsonb
+        UPDATE, instead of flushing the whole data dict back to postgres.
+        """
+        object_session(self).execute("""
+            UPDATE execution SET data = data || CAST(:fields AS jsonb)
+            WHERE id = :id
+        """, {'id': self.id, 'fields': json.dumps(fields)})
+
+        # The loaded dict gets the same keys without being flagged as
+        # changed, so a flush never writes it back over the row.  Where it
+        # was flagged already, the flush writes the whole dict, which then
+        # has these keys too.  A dict that isn't loaded is read with them.
+        if 'data' not in inspect(self).unloaded:
+            dict.update(self.data, fields)
 
     def update_outputs(self, old_outputs, new_outputs):
         if (old_outputs):
@@ -222,6 +343,11 @@ class Execution(Base):
 class ExecutionStatusHistory(Base):
     __tablename__ = 'execution_status_history'
 
+    __table_args__ = (
+        Index('ix_execution_status_history_workflow_id_timestamp',
+            'workflow_id', 'timestamp'),
+    )
+
     id = Column(Integer, primary_key=True)
     execution_id = Column(Integer, ForeignKey('execution.id',
             ondelete='CASCADE'), index=True, nullable=False)
@@ -232,8 +358,8 @@ class ExecutionStatusHistory(Base):
     status = Column(Text, index=True, nullable=False)
 
     execution = relationship(Execution,
-            backref=backref('status_history', order_by=timestamp, lazy='joined',
-            passive_deletes='all'))
+            backref=backref('status_history', order_by=(timestamp, id),
+            lazy='joined', passive_deletes='all'))
 
     workflow_id = Column(Integer, ForeignKey('workflow.id', ondelete='CASCADE'),
         nullable=False, index=True)
@@ -248,3 +374,73 @@ class ExecutionStatusHistory(Base):
                 'timestamp': str(self.timestamp),
                 'status': self.status
         }
+
+
+def _insert_execution_statement(rows, parent_column, status_path):
+    history_table = ExecutionStatusHistory.__table__
+    return _insert_history_statement(_new_execution_cte(rows, parent_column,
+        status_path), status_path).returning(history_table.c.execution_id)
+
+
+def _get_or_create_execution_statement(row, parent_column, status_path):
+    """
+    Inserts the execution in <row> along with its status history, and
+    selects it with created = true, or else selects the existing execution
+    with created = false.
+    """
+    execution_table = Execution.__table__
+    history_table = ExecutionStatusHistory.__table__
+
+    new_execution = _new_execution_cte([row], parent_column, status_path)
+    new_history = _insert_history_statement(new_execution, status_path
+            ).returning(history_table.c.execution_id).cte('new_history')
+
+    # Selecting the new execution through its history makes sure the
+    # history insert is part of the statement.
+    created = select(list(new_execution.c) + [true().label('created')]
+            ).where(new_execution.c.id.in_(
+                select([new_history.c.execution_id])))
+    existing = select(list(execution_table.c) + [false().label('created')]
+            ).where(and_(
+                execution_table.c[parent_column] == row[parent_column],
+                execution_table.c.color == row['color'],
+                ~exists(select([new_execution.c.id]))))
+
+    return union_all(created, existing)
+
+
+def _new_execution_cte(rows, parent_column, status_path):
+    execution_table = Execution.__table__
+    return insert(execution_table).values(
+            [dict(row, status=status_path[-1]) for row in rows]
+        ).on_conflict_do_nothing(index_elements=[parent_column, 'color']
+        ).returning(*execution_table.c).cte('new_execution')
+
+
+def _insert_history_statement(new_execution, status_path):
+    history_table = ExecutionStatusHistory.__table__
+
+    # Every status gets the same timestamp, so the history rows are
+    # inserted in status_path order to give them increasing ids, which
+    # break the tie wherever the history is ordered.
+    path_rows = union_all(*[select([new_execution.c.id.label('id'),
+            new_execution.c.workflow_id.label('workflow_id'),
+            literal(status).label('status'),
+            literal(position).label('position')])
+        for position, status in enumerate(status_path)]).alias('path_rows')
+
+    history_rows = select([path_rows.c.id, path_rows.c.workflow_id,
+            path_rows.c.status, func.now()]).order_by(path_rows.c.id,
+                    path_rows.c.position)
+
+    return history_table.insert().from_select(
+            ['execution_id', 'workflow_id', 'status', 'timestamp'],
+            history_rows)
+
+
+def _get_parent_color(colors):
+    if len(colors) == 1:
+        return None
+
+    else:
+        return colors[-2]
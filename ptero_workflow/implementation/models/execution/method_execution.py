@@ -1,4 +1,6 @@
 from ptero_workflow.implementation.models.execution import Execution
+from ptero_workflow.implementation.models import outbox
+from sqlalchemy.orm.session import object_session
 from ptero_common import nicer_logging
 from ptero_common import statuses
 
@@ -15,9 +17,11 @@ class MethodExecution(Execution):
 
     @property
     def name(self):
+        graph = self.workflow_graph
+        method = graph.method(self.method_id)
         return "%s.%s.%s" % (
-                self.method.task.name,
-                self.method.name,
+                graph.task(method.task_id).name,
+                method.name,
                 self.id,
         )
 
@@ -25,6 +29,14 @@ class MethodExecution(Execution):
     def parent(self):
         return self.method
 
+    @property
+    def parent_type(self):
+        return 'Method'
+
+    @property
+    def parent_node(self):
+        return self.workflow_graph.method(self.method_id)
+
     @property
     def child_workflow_urls(self):
         return [w.url for w in self.child_workflows]
@@ -38,11 +50,14 @@ class MethodExecution(Execution):
 
     @property
     def missing_outputs(self):
+        graph = self.workflow_graph
+        output_names = graph.task(graph.method(self.method_id).task_id
+                ).output_names
         outputs = self.get_outputs()
         if outputs is not None:
-            return self.method.task.output_names - set(self.get_outputs())
+            return output_names - set(outputs)
         else:
-            return self.method.task.output_names
+            return output_names
 
     def cancel(self):
         self.status = statuses.canceled
@@ -52,8 +67,9 @@ class MethodExecution(Execution):
         if 'jobUrl' in self.data:
             url = self.data['jobUrl']
             LOG.info("Sending PATCH request to cancel job at %s",
-                   url, extra={'workflowName':self.workflow.name})
-            self.method.http.delay('PATCH', url, status=statuses.canceled)
+                   url, extra={'workflowName':self.workflow_name})
+            outbox.send(object_session(self), 'PATCH', url,
+                    status=statuses.canceled)
 
     def issue_job_delete_requests(self):
         for child_workflow in self.child_workflows:
@@ -62,8 +78,8 @@ class MethodExecution(Execution):
         if 'jobUrl' in self.data:
             url = self.data['jobUrl']
             LOG.info("Sending DELETE request to delete job at %s",
-                   url, extra={'workflowName':self.workflow.name})
-            self.method.http.delay('DELETE', url)
+                   url, extra={'workflowName':self.workflow_name})
+            outbox.send(object_session(self), 'DELETE', url)
 
     def as_dict_for_spawned_workflows_report(self):
         return {
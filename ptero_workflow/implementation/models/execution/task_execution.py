@@ -11,7 +11,7 @@ class TaskExecution(Execution):
     @property
     def name(self):
         return "%s.%s" % (
-                self.task.name,
+                self.workflow_graph.task(self.task_id).name,
                 self.id,
         )
 
@@ -19,6 +19,14 @@ class TaskExecution(Execution):
     def parent(self):
         return self.task
 
+    @property
+    def parent_type(self):
+        return 'Task'
+
+    @property
+    def parent_node(self):
+        return self.workflow_graph.task(self.task_id)
+
     def get_inputs(self):
         return self.task.get_inputs(colors=self.colors,
                 begins=self.begins)
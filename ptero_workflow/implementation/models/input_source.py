@@ -5,9 +5,10 @@ from sqlalchemy import Column, UniqueConstraint
 from sqlalchemy import ForeignKey, Integer, Text
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.orm.session import object_session
-from sqlalchemy.orm.exc import NoResultFound
 from ..exceptions import MissingResultError
+from ptero_workflow.implementation import blob_store, result_cache
 from ptero_common import nicer_logging
+import json
 
 
 __all__ = ['InputSource']
@@ -53,20 +54,99 @@ class InputSource(Base):
         return indexes
 
     def get_data(self, colors, begins):
-        s = object_session(self)
-
-        try:
-            r = s.query(result.Result
-                    ).filter_by(task=self.source_task, name=self.source_property
-                    ).filter(result.Result.color.in_(colors)).one()
-        except NoResultFound:
-            raise MissingResultError("No result found for task (%s:%s) with "
-                    "name (%s) and color one of %s" % (
-                    self.source_task.name, self.source_task.id,
-                    self.source_property, str(colors)))
-
-        indexes = self.parallel_indexes(colors, begins)
-        return r.get_data(indexes)
+        return self.get_all_data(object_session(self), [self], colors,
+                begins)[self.destination_property]
+
+    @classmethod
+    def get_all_data(cls, session, sources, colors, begins):
+        """
+        Returns {destination_property: data} for every source.  Those not
+        in the result cache are read with a single query, in which the
+        (parallel) element each source refers to is extracted by postgres,
+        from result_element where the elements of the result are stored
+        there.
+        """
+        paths = [(source, tuple(source.parallel_indexes(colors, begins)))
+                for source in sources]
+
+        cached = result_cache.get_results([(source.source_id,
+            source.source_property, color, path)
+            for source, path in paths for color in colors])
+
+        data = {}
+        missing = []
+        for source, path in paths:
+            for color in colors:
+                key = (source.source_id, source.source_property, color, path)
+                if key in cached:
+                    data[source.destination_property] = cached[key]
+                    break
+            else:
+                missing.append((source, path))
+
+        if missing:
+            data.update(cls._read_data(session, missing, colors))
+        return data
+
+    @classmethod
+    def get_all_references(cls, session, sources, colors, begins):
+        """
+        Returns {destination_property: ResultReference} for every source,
+        with a single query.  The references are to the result that holds
+        the data, never to an alias of it, so they can be stored as the
+        outputs of a task that only passes its inputs through.
+        """
+        paths = [(source, tuple(source.parallel_indexes(colors, begins)))
+                for source in sources]
+        rows = session.execute("""
+            SELECT wanted.name, source.color, lookup.result_id, lookup.path
+        """ + _LOOKUP, _lookup_params(paths, colors))
+
+        references = {}
+        for name, color, result_id, path in rows:
+            if color is None:
+                raise _missing_result_error(paths, name, colors)
+            references[name] = result.ResultReference(result_id, tuple(path))
+        return references
+
+    @classmethod
+    def _read_data(cls, session, paths, colors):
+        rows = session.execute("""
+            SELECT wanted.name, source.color, result.blob_key, lookup.path,
+                blob.element_offsets[lookup.path[1] + 1],
+                blob.element_offsets[lookup.path[1] + 2] - 1,
+                CAST(CASE
+                    WHEN element.result_id IS NOT NULL
+                        THEN element.data #> CAST(
+                            lookup.path[2:array_length(lookup.path, 1)]
+                            AS text[])
+                    ELSE coalesce(content.data, result.data)
+                        #> CAST(lookup.path AS text[])
+                END AS text)
+        """ + _LOOKUP + """
+            LEFT JOIN result ON result.id = lookup.result_id
+            LEFT JOIN result_content AS content
+                ON content.hash = result.content_hash
+            LEFT JOIN result_element AS element
+                ON element.result_id = result.id
+                AND element.element_index = lookup.path[1]
+            LEFT JOIN blob ON blob.key = result.blob_key
+        """, _lookup_params(paths, colors))
+
+        sources = {source.destination_property: (source, path)
+                for source, path in paths}
+        data = {}
+        for name, color, blob_key, full_path, start, end, text in rows:
+            source, path = sources[name]
+            if color is None:
+                raise _missing_result_error(paths, name, colors)
+            elif blob_key is not None:
+                data[name] = blob_store.load(blob_key, full_path,
+                        None if start is None else (start, end))
+            else:
+                data[name] = result_cache.load_result((source.source_id,
+                    source.source_property, color, path), text)
+        return data
 
     def get_size(self, colors, begins):
         indexes = self.parallel_indexes(colors, begins)
@@ -75,3 +155,37 @@ class InputSource(Base):
                 ).filter_by(task=self.source_task, name=self.source_property
                 ).filter(result.Result.color.in_(colors)).one()
         return r.get_size(indexes)
+
+
+# Finds the result each wanted source refers to.  Aliases are resolved to
+# the result they alias, with the path of the element wanted appended to
+# the path of the aliased element.
+_LOOKUP = """
+    FROM jsonb_to_recordset(CAST(:wanted AS jsonb)) AS wanted(
+        name text, task_id integer, source_name text, path text)
+    LEFT JOIN result AS source ON source.task_id = wanted.task_id
+        AND source.name = wanted.source_name
+        AND source.color = ANY(:colors)
+    LEFT JOIN LATERAL (SELECT
+        coalesce(source.alias_id, source.id) AS result_id,
+        coalesce(source.alias_path, '{}')
+            || CAST(wanted.path AS integer[]) AS path
+    ) AS lookup ON true
+"""
+
+
+def _lookup_params(paths, colors):
+    wanted = [{
+        'name': source.destination_property,
+        'task_id': source.source_id,
+        'source_name': source.source_property,
+        'path': '{%s}' % ','.join(str(i) for i in path),
+    } for source, path in paths]
+    return {'wanted': json.dumps(wanted), 'colors': list(colors)}
+
+
+def _missing_result_error(paths, name, colors):
+    source = next(s for s, path in paths if s.destination_property == name)
+    return MissingResultError("No result found for task (%s:%s) with name "
+            "(%s) and color one of %s" % (source.source_task.name,
+                source.source_id, source.source_property, str(colors)))
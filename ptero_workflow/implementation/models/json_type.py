@@ -1,5 +1,5 @@
 from sqlalchemy import Integer
-from sqlalchemy.dialects.postgresql import JSON as psqlJSON
+from sqlalchemy.dialects.postgresql import JSONB as psqlJSONB
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm.session import object_session
 from sqlalchemy.sql.functions import GenericFunction
@@ -19,7 +19,7 @@ def get_data_element_postgres_extensions(task, indexes):
     return tup[0]
 
 
-class json_array_length(GenericFunction):
+class jsonb_array_length(GenericFunction):
     type = Integer
 
 
@@ -30,10 +30,10 @@ def get_data_size_postgres_extensions(task, indexes):
         q = task.__class__.data
 
     s = object_session(task)
-    tup = s.query(json_array_length(q)).filter_by(id=task.id).one()
+    tup = s.query(jsonb_array_length(q)).filter_by(id=task.id).one()
     return tup[0]
 
-MutableJSONDict = MutableDict.as_mutable(psqlJSON)
-JSON = psqlJSON
+MutableJSONDict = MutableDict.as_mutable(psqlJSONB)
+JSON = psqlJSONB
 get_data_element = get_data_element_postgres_extensions
 get_data_size = get_data_size_postgres_extensions
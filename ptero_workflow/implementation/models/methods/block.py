@@ -1,9 +1,10 @@
+from ..execution.execution_base import RUNNING_STATUS_PATH
 from ..json_type import JSON
+from ..petri_mixin import DERIVED_STATUS_PARAMS, FUSED_PARAMS
 from .method_base import Method
 from sqlalchemy import Column, ForeignKey, Integer
-from sqlalchemy.orm.session import object_session
 from ptero_common import nicer_logging
-from ptero_common.statuses import (scheduled, running, canceled, succeeded)
+from ptero_common.statuses import canceled, failed, succeeded
 
 LOG = nicer_logging.getLogger(__name__)
 
@@ -31,7 +32,8 @@ class Block(Method):
             'outputs': [self._pn('wait')],
             'action': {
                 'type': 'notify',
-                'url': self.callback_url('execute'),
+                'url': self.callback_url('execute',
+                    **dict(FUSED_PARAMS, **DERIVED_STATUS_PARAMS)),
                 'response_places': {
                     'success': self._pn('execute_success'),
                     'failure': self._pn('execute_failure'),
@@ -53,37 +55,31 @@ class Block(Method):
         return self._pn('success'), self._pn('failure')
 
     def execute(self, body_data, query_string_data):
-        s = object_session(self)
-
-        execution = self.get_or_create_execution(body_data['color'], 
-                body_data['group'])
-
-        execution.status = scheduled
-        s.flush()
-        execution.status = running
-        s.flush()
+        execution = self.get_or_create_execution(body_data['color'],
+                body_data['group'], status_path=RUNNING_STATUS_PATH)
 
         if (self.task.is_canceled):
             execution.status = canceled
-            s.commit()
+            self.record_task_status(execution, failed, query_string_data)
 
-            response_url = body_data['response_links']['failure']
             LOG.info('Notifying petri: execution "%s" failed for'
-                    ' workflow "%s"', execution.name, self.workflow.name,
-                    extra={'workflowName':self.workflow.name})
-            self.http.delay('PUT', response_url)
+                    ' workflow "%s"', execution.name, self.workflow_name,
+                    extra={'workflowName':self.workflow_name})
+            return self.respond(body_data, query_string_data, 'failure')
         else:
-            outputs = execution.get_inputs()
-            outputs.setdefault('result', 1)
-            execution.update({'outputs': outputs})
+            if execution.get_outputs() is None:
+                outputs = self.task.get_input_references(execution.colors,
+                        execution.begins)
+                outputs.setdefault('result', 1)
+                self.task.set_outputs(outputs, execution.color,
+                        execution.parent_color)
             execution.status = succeeded
-            s.commit()
+            self.record_task_status(execution, succeeded, query_string_data)
 
-            response_url = body_data['response_links']['success']
             LOG.info('Notifying petri: execution "%s" succeeded for'
-                    ' workflow "%s"', execution.name, self.workflow.name,
-                    extra={'workflowName':self.workflow.name})
-            self.http.delay('PUT', response_url)
+                    ' workflow "%s"', execution.name, self.workflow_name,
+                    extra={'workflowName':self.workflow_name})
+            return self.respond(body_data, query_string_data, 'success')
 
     def get_parameters(self, **kwargs):
         return {}
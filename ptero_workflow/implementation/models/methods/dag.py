@@ -1,3 +1,5 @@
+from ..execution.execution_base import RUNNING_STATUS_PATH
+from ..petri_mixin import DERIVED_STATUS_PARAMS, FUSE_INTERNAL_STEPS
 from .method_base import Method
 from ptero_workflow.implementation.models.link import Link
 from ptero_workflow.implementation.models.task import Task
@@ -23,8 +25,6 @@ class DAG(Method):
             passive_deletes='all',
             collection_class=attribute_mapped_collection('name'))
 
-    child_list = relationship('Task', passive_deletes='all')
-
     __mapper_args__ = {
         'polymorphic_identity': 'DAG',
     }
@@ -32,7 +32,14 @@ class DAG(Method):
     VALID_CALLBACK_TYPES = Method.VALID_CALLBACK_TYPES.union(['set_status'])
 
     def attach_subclass_transitions(self, transitions, start_place):
-        for child in self.child_list:
+        # Adjacency comes from the workflow graph snapshot, so no queries are
+        # issued per child beyond loading the children themselves.
+        children_by_id = {c.id: c for c in self.children.itervalues()}
+        for name, child in sorted(self.children.iteritems()):
+            node = child.graph_node
+            input_tasks = [children_by_id[i] for i in node.input_task_ids]
+            output_tasks = [children_by_id[i] for i in node.output_task_ids]
+
             child_start_place = self._pn(child.name, 'start')
             child_success_place, child_failure_place = child.attach_transitions(
                     transitions, child_start_place)
@@ -49,18 +56,18 @@ class DAG(Method):
                     'outputs': [self._pn('failure_collection')],
                 })
 
-            if child.input_tasks:
+            if input_tasks:
                 transitions.append({
                     'inputs': [self._link_pn(t, child)
-                        for t in child.input_tasks],
+                        for t in input_tasks],
                     'outputs': [child_start_place],
                 })
 
-            if child.output_tasks:
+            if output_tasks:
                 transitions.append({
                     'inputs': [child_success_place],
                     'outputs': [self._link_pn(child, t)
-                        for t in child.output_tasks],
+                        for t in output_tasks],
                 })
 
         transitions.extend([
@@ -88,35 +95,48 @@ class DAG(Method):
 
     def _attach_status_update_actions(self, transitions, action_success_place,
             action_failure_place):
-        transitions.append({
-                'inputs': [action_success_place],
-                'outputs': [self._pn('update_status_success')],
-                'action': {
-                    'type': 'notify',
-                    'url': self.callback_url('set_status',
-                        status=statuses.succeeded)
-                }})
-        success_place = self._pn('update_status_success')
+        if FUSE_INTERNAL_STEPS:
+            # set by the output connector (see report_fused_success)
+            success_place = action_success_place
+        else:
+            transitions.append({
+                    'inputs': [action_success_place],
+                    'outputs': [self._pn('update_status_success')],
+                    'action': {
+                        'type': 'notify',
+                        'url': self.callback_url('set_status',
+                            status=statuses.succeeded,
+                            **DERIVED_STATUS_PARAMS)
+                    }})
+            success_place = self._pn('update_status_success')
 
         transitions.append({
             'inputs': [action_failure_place],
                 'outputs': [self._pn('update_status_failure')],
             'action': {
                 'type': 'notify',
-                'url': self.callback_url('set_status', status=statuses.failed)
+                'url': self.callback_url('set_status', status=statuses.failed,
+                    **DERIVED_STATUS_PARAMS)
             }})
         failure_place = self._pn('update_status_failure')
 
         return success_place, failure_place
 
     def set_status(self, body_data, query_string_data):
-        s = object_session(self)
+        self._set_status(body_data['color'], body_data['group'],
+                query_string_data['status'], query_string_data)
+        object_session(self).commit()
 
-        execution = self.get_or_create_execution(body_data['color'],
-                body_data['group'])
-        execution.status = query_string_data['status']
+    def report_fused_success(self, body_data, query_string_data):
+        # Committed by the output connector's callback, with its response.
+        if query_string_data.get('fused'):
+            self._set_status(body_data['color'], body_data['group'],
+                    statuses.succeeded, query_string_data)
 
-        s.commit()
+    def _set_status(self, color, group, status, query_string_data):
+        execution = self.get_or_create_executions([(color, group)])[color]
+        execution.status = status
+        self.record_task_status(execution, status, query_string_data)
 
     def resolve_output_source(self, session, name, parallel_depths):
         oc = self.children['output connector']
@@ -181,18 +201,6 @@ class DAG(Method):
         if self.index == 0:
             self.task.set_status_running(color, group)
 
-        execution = self.get_or_create_execution(color, group)
-
-        s = object_session(execution)
-        execution.status = statuses.scheduled
-        s.flush()
-        execution.status = statuses.running
-        s.commit()
-
-
-def _get_parent_color(colors):
-    if len(colors) == 1:
-        return None
-
-    else:
-        return colors[-2]
+        execution = self.get_or_create_execution(color, group,
+                status_path=RUNNING_STATUS_PATH)
+        object_session(execution).commit()
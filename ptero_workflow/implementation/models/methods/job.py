@@ -1,5 +1,7 @@
 from ..execution.method_execution import MethodExecution
 from ..json_type import JSON
+from .. import outbox
+from ..petri_mixin import DERIVED_STATUS_PARAMS
 from .method_base import Method
 from sqlalchemy import Column, ForeignKey, Integer, Text
 from sqlalchemy.orm.session import object_session
@@ -33,6 +35,7 @@ class Job(Method):
     VALID_CALLBACK_TYPES = Method.VALID_CALLBACK_TYPES.union(
             ['execute', 'submitted', 'running', 'succeeded',
              'errored', 'failed'])
+    BATCH_CALLBACKS = {'execute': 'execute_batch'}
 
     def attach_subclass_transitions(self, transitions, input_place_name):
         transitions.append({
@@ -40,7 +43,8 @@ class Job(Method):
             'outputs': [self._pn('wait')],
             'action': {
                 'type': 'notify',
-                'url': self.callback_url('execute'),
+                'url': self.callback_url('execute',
+                    **DERIVED_STATUS_PARAMS),
                 'response_places': {
                     'success': self._pn('execute_success'),
                     'failure': self._pn('execute_failure'),
@@ -70,20 +74,59 @@ class Job(Method):
 
         execution = self.get_or_create_execution(body_data['color'],
                 body_data['group'])
-        execution.data['petri_response_links_for_job'] = \
-                body_data['response_links']
+        execution.set_data(
+                {'petri_response_links_for_job': body_data['response_links']})
         s.commit()
 
         if (self.task.is_canceled):
-            execution.status = canceled
-            response_url = body_data['response_links']['failure']
-            LOG.info('Notifing petri: execution "%s" canceled for'
-                    ' workflow "%s"', execution.name, self.workflow.name,
-                    extra={'workflowName': self.workflow.name})
-            self.http.delay('PUT', response_url)
+            self._cancel_execution(execution, body_data, query_string_data)
             s.commit()
         else:
-            self.submit_job.delay(execution.id)
+            self.submit_job.delay(execution.id,
+                    bool(query_string_data.get('derive_status')))
+
+    def execute_batch(self, body_data_list, query_string_data):
+        """
+        Handles the 'execute' callbacks for many colors with one statement
+        per kind of execution and a single commit.
+        """
+        if not body_data_list:
+            return
+
+        s = object_session(self)
+        colors_and_groups = [(body_data['color'], body_data['group'])
+                for body_data in body_data_list]
+
+        if self.index == 0:
+            # Task executions are automatically put into 'running' state
+            self.task.get_or_create_executions(colors_and_groups)
+
+        executions = self.get_or_create_executions(colors_and_groups)
+        for body_data in body_data_list:
+            executions[body_data['color']].set_data(
+                    {'petri_response_links_for_job':
+                        body_data['response_links']})
+
+        if (self.task.is_canceled):
+            for body_data in body_data_list:
+                self._cancel_execution(executions[body_data['color']],
+                        body_data, query_string_data)
+            s.commit()
+        else:
+            s.commit()
+            derive_status = bool(query_string_data.get('derive_status'))
+            for body_data in body_data_list:
+                self.submit_job.delay(executions[body_data['color']].id,
+                        derive_status)
+
+    def _cancel_execution(self, execution, body_data, query_string_data):
+        execution.status = canceled
+        self.record_task_status(execution, failed, query_string_data)
+        response_url = body_data['response_links']['failure']
+        LOG.info('Notifing petri: execution "%s" canceled for'
+                ' workflow "%s"', execution.name, self.workflow_name,
+                extra={'workflowName': self.workflow_name})
+        outbox.send(object_session(self), 'PUT', response_url)
 
     def submitted(self, body_data, query_string_data):
         execution = self._get_execution(query_string_data['execution_id'])
@@ -105,11 +148,10 @@ class Job(Method):
 
     def _update_execution_data(self, execution, body_data):
         if self.service_data_to_save is not None:
-            for field_name in self.service_data_to_save:
-                if field_name in body_data:
-                    execution.data[field_name] = body_data[field_name]
-        else:
-            return
+            fields = {name: body_data[name]
+                    for name in self.service_data_to_save if name in body_data}
+            if fields:
+                execution.set_data(fields)
 
     def _get_execution(self, execution_id):
         s = object_session(self)
@@ -121,52 +163,54 @@ class Job(Method):
 
         missing_outputs = execution.missing_outputs
         if execution.missing_outputs:
-            execution.data['error'] = 'Command failed to set required outputs %s' %\
-                    sorted(execution.missing_outputs)
+            execution.set_data({'error':
+                'Command failed to set required outputs %s' %
+                sorted(execution.missing_outputs)})
             self.errored(body_data, query_string_data)
         else:
             execution.status = succeeded
             self._update_execution_data(execution, body_data)
-
-            s = object_session(self)
-            s.commit()
+            self.record_task_status(execution, succeeded, query_string_data)
 
             response_url = execution.data['petri_response_links_for_job']['success']
 
             LOG.info('Notifying petri: execution "%s" succeeded for'
-                    ' workflow "%s"', execution.name, self.workflow.name,
-                    extra={'workflowName':self.workflow.name})
-            self.http.delay('PUT', response_url)
+                    ' workflow "%s"', execution.name, self.workflow_name,
+                    extra={'workflowName':self.workflow_name})
+            s = object_session(self)
+            outbox.send(s, 'PUT', response_url)
+            s.commit()
 
     def failed(self, body_data, query_string_data):
         execution = self._get_execution(query_string_data['execution_id'])
 
         execution.status = failed
         self._update_execution_data(execution, body_data)
+        self.record_task_status(execution, failed, query_string_data)
 
-        s = object_session(self)
-        s.commit()
         response_url = execution.data['petri_response_links_for_job']['failure']
 
         LOG.info('Notifying petri: execution "%s" failed for'
-                ' workflow "%s"', execution.name, self.workflow.name,
-                extra={'workflowName':self.workflow.name})
-        self.http.delay('PUT', response_url)
+                ' workflow "%s"', execution.name, self.workflow_name,
+                extra={'workflowName':self.workflow_name})
+        s = object_session(self)
+        outbox.send(s, 'PUT', response_url)
+        s.commit()
 
     def errored(self, body_data, query_string_data):
         execution = self._get_execution(query_string_data['execution_id'])
 
         execution.status = errored
         self._update_execution_data(execution, body_data)
-
-        s = object_session(self)
-        s.commit()
+        self.record_task_status(execution, failed, query_string_data)
 
         response_url = execution.data['petri_response_links_for_job']['failure']
         LOG.info('Notifing petri: execution "%s" errored for'
-                ' workflow "%s"', execution.name, self.workflow.name,
-                extra={'workflowName':self.workflow.name})
-        self.http.delay('PUT', response_url)
+                ' workflow "%s"', execution.name, self.workflow_name,
+                extra={'workflowName':self.workflow_name})
+        s = object_session(self)
+        outbox.send(s, 'PUT', response_url)
+        s.commit()
 
     @property
     def submit_job(self):
@@ -176,7 +220,7 @@ class Job(Method):
     def get_job_submit_url(self, job_id):
         return '%s/jobs/%s' % (self.service_url, job_id)
 
-    def get_job_submit_data(self, execution_id):
+    def get_job_submit_data(self, execution_id, derive_status=False):
         submit_data = self.parameters
 
         if 'environment' not in submit_data:
@@ -187,15 +231,20 @@ class Job(Method):
             'PTERO_WORKFLOW_SUBMIT_URL': self.workflow_submit_url,
         })
 
-        self.add_webhooks_to_submit_data(submit_data, execution_id)
+        self.add_webhooks_to_submit_data(submit_data, execution_id,
+                derive_status)
         return submit_data
 
-    def add_webhooks_to_submit_data(self, submit_data, execution_id):
+    def add_webhooks_to_submit_data(self, submit_data, execution_id,
+            derive_status=False):
         webhooks = submit_data.get('webhooks', {})
 
+        # The job's callbacks record the task's status if execute would have.
+        params = {'derive_status': 1} if derive_status else {}
         for status in (submitted, running, errored, failed, succeeded):
             webhooks_entry = webhooks.get(status, [])
-            new_webhook = self.callback_url(status, execution_id=execution_id)
+            new_webhook = self.callback_url(status, execution_id=execution_id,
+                    **params)
             if isinstance(webhooks_entry, list):
                 webhooks[status] = webhooks_entry + [new_webhook]
             else:
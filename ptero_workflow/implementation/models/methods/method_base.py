@@ -1,16 +1,18 @@
 from ..base import Base
+from ..execution.execution_base import NEW_STATUS_PATH
 from ..execution.method_execution import MethodExecution
 from .. import webhook
+from ..petri_mixin import PetriMixin
+from ptero_workflow.implementation.workflow_graph import get_workflow_graph
+from ptero_workflow.implementation.workflow_template import net_id
 from ptero_workflow.urls import url_for
 from sqlalchemy import Column, ForeignKey, Integer, Text, UniqueConstraint
 from sqlalchemy.orm import backref, relationship
 from sqlalchemy.orm.collections import attribute_mapped_collection
 from sqlalchemy.orm.session import object_session
-from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import IntegrityError
-import celery
 import urllib
 from ptero_common import nicer_logging
+from ptero_common import statuses
 
 
 LOG = nicer_logging.getLogger(__name__)
@@ -18,7 +20,7 @@ LOG = nicer_logging.getLogger(__name__)
 __all__ = ['Method']
 
 
-class Method(Base):
+class Method(Base, PetriMixin):
     __tablename__ = 'method'
     service = 'NotImplementedError'
 
@@ -28,6 +30,10 @@ class Method(Base):
 
     VALID_CALLBACK_TYPES = set()
 
+    # Maps callback types to the names of methods that handle a whole batch
+    # of them at once (see handle_callbacks).
+    BATCH_CALLBACKS = {}
+
     id = Column(Integer, primary_key=True)
 
     task_id = Column(Integer, ForeignKey('task.id', ondelete='CASCADE'),
@@ -54,7 +60,8 @@ class Method(Base):
 
 
     def _pn(self, *args):
-        name_base = '-'.join(['method', str(self.id), self.name.replace(' ','_')])
+        name_base = '-'.join(['method', str(net_id('method', self.id)),
+            self.name.replace(' ','_')])
         return '-'.join([name_base] + list(args))
 
     def attach_transitions(self, transitions, start_place):
@@ -62,45 +69,67 @@ class Method(Base):
                         start_place)
 
 
-    def get_or_create_execution(self, color, group):
-        colors = group.get('color_lineage', []) + [color]
-        begins = group.get('begin_lineage', []) + [group['begin']]
-        parent_color = _get_parent_color(colors)
-
+    def record_task_status(self, execution, status, query_string_data):
+        """
+        Passes the status that <execution> of this method gives its task on
+        to the task (see Task.record_method_status).  Any method succeeding
+        makes the task succeed, but only the last one failing makes it fail.
+        Nothing is committed, so the caller commits the task's status in the
+        same transaction as the method's and its petri response.
+        """
+        if status == statuses.succeeded or \
+                self.task.method_list[-1].id == self.id:
+            self.task.record_method_status(execution.colors,
+                    execution.begins, status, query_string_data)
+
+    def get_or_create_executions(self, colors_and_groups,
+            status_path=NEW_STATUS_PATH):
+        """
+        Returns {color: execution} for many colors at once, without
+        committing.
+        """
+        executions, created_colors = MethodExecution.get_or_create_many(
+                object_session(self), 'method_id', self.id, colors_and_groups,
+                self.workflow_id, status_path=status_path)
+
+        for color, execution in executions.iteritems():
+            if color not in created_colors:
+                for status in status_path[1:]:
+                    execution.status = status
+        return executions
+
+    def get_or_create_execution(self, color, group,
+            status_path=NEW_STATUS_PATH):
         s = object_session(self)
 
-        try:
-            return s.query(MethodExecution).filter(
-                    MethodExecution.method==self,
-                    MethodExecution.color==color).one()
-        except NoResultFound:
-            execution = MethodExecution(method=self, color=color,
-                    colors=colors, begins=begins,
-                    parent_color=parent_color,
-                    workflow_id=self.workflow_id,
-            )
-            s.add(execution)
-
-            try:
-                s.commit()
-                return execution
-            except IntegrityError:
-                s.rollback()
-                return s.query(MethodExecution).filter(
-                        MethodExecution.method==self,
-                        MethodExecution.color==color).one()
+        execution, created = MethodExecution.get_or_create(s, 'method_id',
+                self.id, color, group, self.workflow_id,
+                status_path=status_path)
 
+        if created:
+            s.commit()
+        else:
+            for status in status_path[1:]:
+                execution.status = status
+        return execution
+
+    @property
+    def workflow_graph(self):
+        return get_workflow_graph(object_session(self), self.workflow_id)
+
+    @property
+    def graph_node(self):
+        return self.workflow_graph.method(self.id)
+
+    @property
+    def workflow_name(self):
+        return self.workflow_graph.name
 
     def get_webhooks(self, name=None):
         if name is not None:
             return webhook.get_webhooks_for_method(self, name)
         else:
-            return webhook.get_sorted_webhook_dict(self)
-
-    @property
-    def http(self):
-        return celery.current_app.tasks[
-                'ptero_common.celery.http.HTTP']
+            return webhook.get_sorted_webhook_dict(self.graph_node.webhooks)
 
     def handle_callback(self, callback_type, body_data, query_string_data):
         if callback_type in self.VALID_CALLBACK_TYPES:
@@ -109,6 +138,20 @@ class Method(Base):
             raise RuntimeError('Invalid callback type (%s).  Allowed types: %s'
                     % (callback_type, self.VALID_CALLBACK_TYPES))
 
+    def handle_callbacks(self, callback_type, body_data_list,
+            query_string_data):
+        """
+        Handles a batch of callbacks of the same type, such as one for each
+        color of a parallel-by task.  Types without a batch handler are
+        handled one at a time.
+        """
+        if callback_type in self.BATCH_CALLBACKS:
+            return getattr(self, self.BATCH_CALLBACKS[callback_type])(
+                    body_data_list, query_string_data)
+
+        for body_data in body_data_list:
+            self.handle_callback(callback_type, body_data, query_string_data)
+
     def callback_url(self, callback_type, **params):
         if params:
             query_string = '?%s' % urllib.urlencode(params)
@@ -116,7 +159,8 @@ class Method(Base):
             query_string = ''
 
         base_url = url_for('method-callback',
-                method_id=self.id, callback_type=callback_type)
+                method_id=net_id('method', self.id),
+                callback_type=callback_type)
         return base_url + query_string
 
     def execution_url(self, execution_id):
@@ -188,7 +232,7 @@ class Method(Base):
     def cancel(self):
         LOG.info("Canceling method ID:NAME (%s:%s) of task (%s:%s)",
             self.id, self.name, self.task.id, self.task.name,
-            extra={'workflowName':self.workflow.name})
+            extra={'workflowName':self.workflow_name})
         for execution in self.executions.values():
             execution.cancel()
 
@@ -196,14 +240,6 @@ class Method(Base):
         LOG.info("Issuing delete requests for "
                 "method ID:NAME (%s:%s) of task (%s:%s)",
             self.id, self.name, self.task.id, self.task.name,
-            extra={'workflowName':self.workflow.name})
+            extra={'workflowName':self.workflow_name})
         for execution in self.executions.values():
             execution.issue_job_delete_requests()
-
-
-def _get_parent_color(colors):
-    if len(colors) == 1:
-        return None
-
-    else:
-        return colors[-2]
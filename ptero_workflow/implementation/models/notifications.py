@@ -0,0 +1,27 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+__all__ = ['notify_on_commit']
+
+
+_CHANNELS = 'ptero_workflow_notify_channels'
+
+
+def notify_on_commit(session, channel):
+    """
+    Sends NOTIFY <channel> in the session's transaction just before it
+    commits, once however many times it was asked for.
+    """
+    session.info.setdefault(_CHANNELS, set()).add(channel)
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify(session):
+    for channel in sorted(session.info.pop(_CHANNELS, ())):
+        session.execute("NOTIFY %s" % channel)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget(session):
+    session.info.pop(_CHANNELS, None)
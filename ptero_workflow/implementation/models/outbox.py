@@ -0,0 +1,40 @@
+from .base import Base
+from .json_type import JSON
+from .notifications import notify_on_commit
+from sqlalchemy import Column, DateTime, Integer, String, Text, func
+from ptero_common import nicer_logging
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['OutboxMessage']
+
+
+NOTIFY_CHANNEL = 'ptero_workflow_outbox'
+
+
+class OutboxMessage(Base):
+    """
+    An HTTP request (petri response or webhook) that must be delivered once
+    the transaction that created it commits.
+    """
+    __tablename__ = 'outbox_message'
+
+    id = Column(Integer, primary_key=True)
+
+    method = Column(String, nullable=False)
+    url = Column(Text, nullable=False)
+    data = Column(JSON, nullable=False)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime(timezone=True), nullable=False,
+            default=func.now(), index=True)
+
+
+def send(session, method, url, **data):
+    """
+    Queues an HTTP request in the session's transaction.  It is delivered by
+    the outbox dispatcher after (and only if) the transaction commits.
+    """
+    session.add(OutboxMessage(method=method, url=url, data=data))
+    notify_on_commit(session, NOTIFY_CHANNEL)
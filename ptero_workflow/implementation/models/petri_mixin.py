@@ -1,3 +1,29 @@
+from . import outbox
+from ptero_workflow.implementation import step_chains
+from sqlalchemy.orm.session import object_session
+import os
+
+
+# When set, the input and output connectors record their own success (and
+# the output connector its DAG's) in their callbacks, and the net leaves out
+# the notifies for them.  Their notifies and those of blocks and converges
+# are marked as internal steps, so that the petri optimizer can have a chain
+# of them run in one callback.
+FUSE_INTERNAL_STEPS = bool(int(os.environ.get(
+    'PTERO_WORKFLOW_FUSE_INTERNAL_STEPS', 1)))
+
+# When set, a task's status is recorded by the callbacks of its methods,
+# split and join that determine it, and the net leaves out the task's
+# 'succeeded' and 'failed' notifies.
+DERIVE_TASK_STATUS = bool(int(os.environ.get(
+    'PTERO_WORKFLOW_DERIVE_TASK_STATUS', 1)))
+
+# Added to the callback urls involved, so that a callback knows how the net
+# it came from was built whatever the current settings are.
+FUSED_PARAMS = {'fused': 1} if FUSE_INTERNAL_STEPS else {}
+DERIVED_STATUS_PARAMS = {'derive_status': 1} if DERIVE_TASK_STATUS else {}
+
+
 class PetriMixin(object):
     def _pn(self, *args):
         raise NotImplementedError
@@ -5,15 +31,28 @@ class PetriMixin(object):
     def callback_url(self, *args):
         raise NotImplementedError
 
+    def respond(self, body_data, query_string_data, response):
+        """
+        Sends petri the <response> of this internal step and commits, unless
+        the net has the step after it run in the same callback.  That step
+        is returned then, for the backend to handle in this transaction.
+        """
+        step = step_chains.next_step(body_data, query_string_data, response)
+        if step is None:
+            s = object_session(self)
+            outbox.send(s, 'PUT', body_data['response_links'][response])
+            s.commit()
+        return step
+
     def attach_notify_and_wait_transitions(self, transitions, start_place,
-            name):
+            name, **params):
         transitions.extend([
             {
                 'inputs': [start_place],
                 'outputs': [self._pn('wait', name)],
                 'action': {
                     'type': 'notify',
-                    'url': self.callback_url(name),
+                    'url': self.callback_url(name, **params),
                     'response_places': {
                         'success': self._pn('done_waiting_success', name),
                         'failure': self._pn('done_waiting_failure', name),
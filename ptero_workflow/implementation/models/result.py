@@ -1,11 +1,32 @@
 from .base import Base
+from collections import namedtuple
 from sqlalchemy import Column, UniqueConstraint, Index
-from sqlalchemy import ForeignKey, Integer, Text
+from sqlalchemy import BigInteger, ForeignKey, Integer, Text, event, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm.session import object_session
+from ptero_workflow.implementation import blob_store
+import hashlib
+import json
 import json_type
+import os
 
 
-__all__ = ['Result']
+__all__ = ['Blob', 'Result', 'ResultContent', 'ResultElement',
+        'ResultReference', 'canonical_json', 'content_hash',
+        'delete_unreferenced_content']
+
+
+# Results whose canonical JSON is at least this long are stored once per
+# distinct content, in result_content, and refer to it by its hash.
+_CONTENT_MIN_BYTES = int(os.environ.get(
+    'PTERO_WORKFLOW_RESULT_CONTENT_MIN_BYTES', 256))
+
+
+# The element at <path> of the result with id <result_id>.  Storing one as
+# the data of a Result makes that result an alias of the element.
+ResultReference = namedtuple('ResultReference', ['result_id', 'path'])
 
 
 class Result(Base):
@@ -26,8 +47,294 @@ class Result(Base):
 
     data = Column(json_type.JSON)
 
+    # set once the elements of an array result are stored in result_element,
+    # or when the array is stored in a blob along with its element offsets
+    element_count = Column(Integer, nullable=True)
+
+    # set instead of data for results too large to keep in the database
+    blob_key = Column(Text, ForeignKey('blob.key'), nullable=True, index=True)
+
+    # set instead of data for results that are (an element of) another
+    # result.  The aliased result is never an alias itself.
+    alias_id = Column(Integer, ForeignKey('result.id', ondelete='CASCADE'),
+            index=True, nullable=True)
+    alias_path = Column(ARRAY(Integer), nullable=True)
+
+    alias = relationship('Result', remote_side=[id])
+
+    # set instead of data for results stored in result_content
+    content_hash = Column(Text, ForeignKey('result_content.hash'),
+            nullable=True, index=True)
+
+    def __init__(self, data=None, blob_key=None, **kwargs):
+        if isinstance(data, ResultReference):
+            kwargs['alias_id'] = data.result_id
+            kwargs['alias_path'] = list(data.path)
+            data = None
+        elif blob_key is None and data is not None:
+            data_text = canonical_json(data)
+            if blob_store.should_offload(data_text):
+                # written to the blob store just before this is inserted
+                if isinstance(data, list):
+                    self._blob_elements = [canonical_json(element)
+                            for element in data]
+                    kwargs['element_count'] = len(data)
+                else:
+                    self._blob = data_text
+                data = None
+            elif len(data_text) >= _CONTENT_MIN_BYTES:
+                kwargs['content_hash'] = content_hash(data_text)
+                # written to result_content just before this is inserted
+                self._content = data_text
+                data = None
+        if blob_key is not None:
+            data = None
+        Base.__init__(self, data=data, blob_key=blob_key, **kwargs)
+
+    @classmethod
+    def create_array(cls, session, task_id, name, color, parent_color):
+        """
+        Stores the results <name> of the colors of a split over <color> of
+        task <task_id> as one array result.  Small arrays are assembled by
+        postgres.  Others are streamed into a blob if any of their elements
+        is one, and otherwise stored like any other data, so they are
+        offloaded or kept in result_content when they are large enough.
+        """
+        # The text of a jsonb value is never shorter than its canonical
+        # JSON, so no array that should be stored otherwise gets through.
+        max_bytes = _CONTENT_MIN_BYTES
+        if blob_store.threshold() is not None:
+            max_bytes = min(max_bytes, blob_store.threshold() + 1)
+
+        params = {'task_id': task_id, 'name': name, 'color': color,
+                'parent_color': parent_color, 'max_bytes': max_bytes}
+        created = session.execute("""
+            WITH array_data AS (
+                SELECT coalesce(jsonb_agg(
+                        coalesce(content.data, target.data) #> CAST(
+                            coalesce(element.alias_path, '{}') AS text[])
+                        ORDER BY element.color), '[]') AS data,
+                    count(target.blob_key) AS blobs
+                FROM result AS element
+                JOIN result AS target
+                    ON target.id = coalesce(element.alias_id, element.id)
+                LEFT JOIN result_content AS content
+                    ON content.hash = target.content_hash
+                WHERE element.task_id = :task_id AND element.name = :name
+                    AND element.parent_color = :color
+            )
+            INSERT INTO result (task_id, name, color, parent_color, data)
+            SELECT :task_id, :name, :color, :parent_color, data
+            FROM array_data
+            WHERE blobs = 0 AND octet_length(CAST(data AS text)) < :max_bytes
+            RETURNING id
+        """, params).first()
+
+        if created is None:
+            rows = session.execute("""
+                SELECT target.blob_key, element.alias_path,
+                    CAST(coalesce(content.data, target.data) #> CAST(
+                        coalesce(element.alias_path, '{}') AS text[]) AS text),
+                    blob.element_offsets[element.alias_path[1] + 1],
+                    blob.element_offsets[element.alias_path[1] + 2] - 1
+                FROM result AS element
+                JOIN result AS target
+                    ON target.id = coalesce(element.alias_id, element.id)
+                LEFT JOIN result_content AS content
+                    ON content.hash = target.content_hash
+                LEFT JOIN blob ON blob.key = target.blob_key
+                WHERE element.task_id = :task_id AND element.name = :name
+                    AND element.parent_color = :color
+                ORDER BY element.color
+            """, params).fetchall()
+
+            if any(row[0] is not None for row in rows):
+                session.add(cls(task_id=task_id, name=name, color=color,
+                    parent_color=parent_color, element_count=len(rows),
+                    blob_key=blob_store.put_array(session,
+                        (_element_chunks(*row) for row in rows))))
+            else:
+                session.add(cls(task_id=task_id, name=name, color=color,
+                    parent_color=parent_color,
+                    data=[None if data_text is None else json.loads(data_text)
+                        for _, _, data_text, _, _ in rows]))
+
     def get_data(self, indexes):
-        return json_type.get_data_element(self, indexes)
+        if self.alias_id is not None:
+            return self.alias.get_data(self.alias_path + list(indexes))
+        elif self.blob_key is not None:
+            return blob_store.load(self.blob_key, indexes,
+                    self._element_range(indexes))
+        elif indexes and self.element_count is not None:
+            return object_session(self).execute("""
+                SELECT data #> CAST(:path AS text[]) FROM result_element
+                WHERE result_id = :id AND element_index = :index
+            """, self._element_params(indexes)).scalar()
+        else:
+            return object_session(self).execute("""
+                SELECT coalesce(content.data, result.data)
+                    #> CAST(:path AS text[])
+                FROM result
+                LEFT JOIN result_content AS content
+                    ON content.hash = result.content_hash
+                WHERE result.id = :id
+            """, {'id': self.id, 'path': [str(i) for i in indexes]}).scalar()
 
     def get_size(self, indexes):
-        return json_type.get_data_size(self, indexes)
+        if self.alias_id is not None:
+            return self.alias.get_size(self.alias_path + list(indexes))
+        elif self.blob_key is not None:
+            if not indexes and self.element_count is not None:
+                return self.element_count
+            return len(blob_store.load(self.blob_key, indexes,
+                self._element_range(indexes)))
+
+        self.store_elements()
+        if not indexes:
+            return self.element_count
+        else:
+            return object_session(self).execute("""
+                SELECT jsonb_array_length(data #> CAST(:path AS text[]))
+                FROM result_element
+                WHERE result_id = :id AND element_index = :index
+            """, self._element_params(indexes)).scalar()
+
+    def store_elements(self):
+        """
+        Stores each element of this array result in its own row, so that the
+        colors of a split over it can read their elements without parsing
+        the whole array.  Does nothing if they are stored already.
+        """
+        if self.element_count is not None:
+            return
+
+        self.element_count = object_session(self).execute("""
+            WITH result_data AS (
+                SELECT coalesce(content.data, result.data) AS data
+                FROM result
+                LEFT JOIN result_content AS content
+                    ON content.hash = result.content_hash
+                WHERE result.id = :id
+            ), stored AS (
+                INSERT INTO result_element (result_id, element_index, data)
+                SELECT :id, element.index - 1, element.value
+                FROM result_data, jsonb_array_elements(result_data.data)
+                    WITH ORDINALITY AS element(value, index)
+                ON CONFLICT DO NOTHING
+            )
+            SELECT jsonb_array_length(data) FROM result_data
+        """, {'id': self.id}).scalar()
+
+    def _element_range(self, indexes):
+        if indexes and self.element_count is not None:
+            return blob_store.element_range(object_session(self),
+                    self.blob_key, indexes[0])
+
+    def _element_params(self, indexes):
+        return {
+            'id': self.id,
+            'index': indexes[0],
+            'path': [str(i) for i in indexes[1:]],
+        }
+
+
+def canonical_json(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def content_hash(data_text):
+    return hashlib.sha256(data_text).hexdigest()
+
+
+def delete_unreferenced_content(session, hashes):
+    """
+    Deletes (and commits deleting) the result_content rows among <hashes>
+    that no result refers to any more.
+    """
+    if not hashes:
+        return
+    try:
+        session.execute("""
+            DELETE FROM result_content
+            WHERE hash = ANY(:hashes) AND NOT EXISTS (
+                SELECT 1 FROM result
+                WHERE result.content_hash = result_content.hash)
+        """, {'hashes': list(hashes)})
+        session.commit()
+    except IntegrityError:
+        # A result referring to one of them was created meanwhile; they
+        # will be deleted along with a later workflow.
+        session.rollback()
+
+
+def _element_chunks(blob_key, path, data_text, start, end):
+    if blob_key is not None and not path:
+        return blob_store.read_chunks(blob_key)
+    elif blob_key is not None and len(path) == 1 and start is not None:
+        return blob_store.read_chunks(blob_key, (start, end))
+    elif blob_key is not None:
+        return [canonical_json(blob_store.load(blob_key, path,
+            None if start is None else (start, end)))]
+    elif data_text is None:
+        return ['null']
+    elif isinstance(data_text, unicode):
+        return [data_text.encode('utf-8')]
+    else:
+        return [data_text]
+
+
+class ResultElement(Base):
+    __tablename__ = 'result_element'
+
+    result_id = Column(Integer, ForeignKey('result.id', ondelete='CASCADE'),
+            primary_key=True)
+    element_index = Column(Integer, primary_key=True)
+
+    data = Column(json_type.JSON)
+
+
+class Blob(Base):
+    """
+    A blob in the blob store.  Its row is locked while a result referring to
+    it is written, so that it isn't deleted in the meantime (see
+    blob_store.put and blob_store.delete_unreferenced).
+    """
+    __tablename__ = 'blob'
+
+    key = Column(Text, primary_key=True)
+
+    # where each element starts in a blob holding an array, followed by
+    # where the array ends (see blob_store.put_array)
+    element_offsets = Column(ARRAY(BigInteger), nullable=True)
+
+
+class ResultContent(Base):
+    __tablename__ = 'result_content'
+
+    hash = Column(Text, primary_key=True)
+    data = Column(json_type.JSON, nullable=False)
+
+
+@event.listens_for(Result, 'before_insert')
+def _store_blob(mapper, connection, target):
+    elements = getattr(target, '_blob_elements', None)
+    data_text = getattr(target, '_blob', None)
+    if elements is not None:
+        target.blob_key = blob_store.put_array(connection,
+                ([element] for element in elements))
+    elif data_text is not None:
+        target.blob_key = blob_store.put(connection, [data_text])
+
+
+@event.listens_for(Result, 'before_insert')
+def _store_content(mapper, connection, target):
+    data_text = getattr(target, '_content', None)
+    if data_text is not None:
+        # The no-op update locks an existing row until we commit, so that
+        # delete_unreferenced_content can't delete it before our result
+        # refers to it: the delete waits for us and then fails instead.
+        connection.execute(text("""
+            INSERT INTO result_content (hash, data)
+            VALUES (:hash, CAST(:data AS jsonb))
+            ON CONFLICT (hash) DO UPDATE SET hash = EXCLUDED.hash
+        """), hash=target.content_hash, data=data_text)
@@ -1,5 +1,7 @@
+from ..petri_mixin import FUSED_PARAMS
 from .task_base import Task
 from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy.orm.session import object_session
 from ptero_common import nicer_logging
 
 
@@ -23,7 +25,11 @@ class InputConnector(Task):
 
     def attach_subclass_transitions(self, transitions, start_place):
         return self.attach_notify_and_wait_transitions(transitions, start_place,
-                'set_dag_status_running')
+                'set_dag_status_running', **FUSED_PARAMS)
+
+    @property
+    def reports_success_in_callback(self):
+        return True
 
     def set_dag_status_running(self, body_data, query_string_data):
         execution = self.parent.get_or_create_execution(body_data['color'],
@@ -32,20 +38,22 @@ class InputConnector(Task):
         try:
             self.parent.set_status_running(body_data['color'],
                     body_data['group'])
-            response_url = body_data['response_links']['success']
+            self.report_fused_success(body_data, query_string_data)
+            response = 'success'
             LOG.info('Notifying petri: input connector (%s) set dag (%s) '
                     'status to running for workflow "%s"',
-                    self.id, self.parent.name, self.workflow.name,
-                    extra={'workflowName':self.workflow.name})
+                    self.id, self.parent.name, self.workflow_name,
+                    extra={'workflowName':self.workflow_name})
         except:
             LOG.exception("Exception while setting dag (%s) status "
                     "to running", self.parent.name)
-            response_url = body_data['response_links']['failure']
+            object_session(self).rollback()
+            response = 'failure'
             LOG.info('Notifying petri: input connector (%s) failed to set '
                     'dag (%s) status to running for workflow "%s"',
-                    self.id, self.parent.name, self.workflow.name,
-                    extra={'workflowName':self.workflow.name})
-        self.http.delay('PUT', response_url)
+                    self.id, self.parent.name, self.workflow_name,
+                    extra={'workflowName':self.workflow_name})
+        return self.respond(body_data, query_string_data, response)
 
     def resolve_output_source(self, session, name, parallel_depths):
         return self.parent.task.resolve_input_source(session, name,
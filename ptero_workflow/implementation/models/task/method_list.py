@@ -42,6 +42,10 @@ class MethodList(Task):
 
         return self._pn('success'), last_failure_place
 
+    @property
+    def derives_status(self):
+        return bool(self.method_list)
+
     def create_input_sources(self, session, parallel_depths):
         super(MethodList, self).create_input_sources(session, parallel_depths)
         for method in self.method_list:
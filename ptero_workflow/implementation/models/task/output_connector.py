@@ -1,6 +1,6 @@
+from ..petri_mixin import DERIVED_STATUS_PARAMS, FUSED_PARAMS
 from .task_base import Task
 from sqlalchemy import Column, ForeignKey, Integer
-from sqlalchemy.orm.session import object_session
 from ptero_common import nicer_logging
 
 
@@ -31,7 +31,8 @@ class OutputConnector(Task):
                 'outputs': [self._pn('wait')],
                 'action': {
                     'type': 'notify',
-                    'url': self.callback_url('copy_outputs_to_parent'),
+                    'url': self.callback_url('copy_outputs_to_parent',
+                        **dict(FUSED_PARAMS, **DERIVED_STATUS_PARAMS)),
                     'response_places': {
                         'continue': self._pn('response'),
                     },
@@ -45,26 +46,29 @@ class OutputConnector(Task):
 
         return self._pn('success'), None
 
+    @property
+    def reports_success_in_callback(self):
+        return True
+
     def copy_outputs_to_parent(self, body_data, query_string_data):
         color = body_data['color']
         group = body_data['group']
-        response_links = body_data['response_links']
 
         colors = group.get('color_lineage', []) + [color]
         begins = group.get('begin_lineage', []) + [group['begin']]
         parent_color = _get_parent_color(colors)
 
-        data = self.get_inputs(colors, begins)
+        references = self.get_input_references(colors, begins)
 
-        self.parent.task.set_outputs(data, color, parent_color)
-        s = object_session(self)
-        s.commit()
+        self.parent.task.set_outputs(references, color, parent_color)
+        self.report_fused_success(body_data, query_string_data)
+        self.parent.report_fused_success(body_data, query_string_data)
 
         LOG.info('Notifying petri: output connector (%s) copied outputs '
                 'to parent (%s) for workflow "%s"',
-                self.id, self.parent.name, self.workflow.name,
-                extra={'workflowName':self.workflow.name})
-        self.http.delay('PUT', response_links['continue'])
+                self.id, self.parent.name, self.workflow_name,
+                extra={'workflowName':self.workflow_name})
+        return self.respond(body_data, query_string_data, 'continue')
 
 
 def _get_parent_color(colors):
@@ -1,8 +1,11 @@
 from ..base import Base
 from .. import result
 from .. import input_source
-from ..petri_mixin import PetriMixin
+from ..petri_mixin import (DERIVE_TASK_STATUS, DERIVED_STATUS_PARAMS,
+        FUSE_INTERNAL_STEPS, PetriMixin)
+from ..execution.execution_base import RUNNING_STATUS_PATH
 from ..execution.task_execution import TaskExecution
+from .. import outbox
 from .. import webhook
 from sqlalchemy import Column, UniqueConstraint
 from sqlalchemy import ForeignKey, Integer, Text, Boolean
@@ -10,13 +13,13 @@ from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import backref, relationship
 from sqlalchemy.orm.collections import attribute_mapped_collection
 from sqlalchemy.orm.session import object_session
-from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import IntegrityError
-import celery
 from ptero_common import nicer_logging
 import urllib
 from ptero_common import statuses
-from ptero_workflow.implementation import exceptions
+from ptero_workflow.implementation import (blob_store, exceptions,
+        result_cache)
+from ptero_workflow.implementation.workflow_graph import get_workflow_graph
+from ptero_workflow.implementation.workflow_template import net_id
 from ptero_workflow.urls import url_for
 
 
@@ -72,11 +75,23 @@ class Task(Base, PetriMixin):
             # if task hasn't created any Executions of this color yet
             return None
 
+    @property
+    def workflow_graph(self):
+        return get_workflow_graph(object_session(self), self.workflow_id)
+
+    @property
+    def graph_node(self):
+        return self.workflow_graph.task(self.id)
+
+    @property
+    def workflow_name(self):
+        return self.workflow_graph.name
+
     def get_webhooks(self, name=None):
         if name is not None:
             return webhook.get_webhooks_for_task(self, name)
         else:
-            return webhook.get_sorted_webhook_dict(self)
+            return webhook.get_sorted_webhook_dict(self.graph_node.webhooks)
 
     def cancel(self):
         if self.parent is not None:
@@ -86,7 +101,7 @@ class Task(Base, PetriMixin):
             parent_info = ''
         LOG.info("Canceling task ID:%s with name (%s)%s",
             self.id, self.name, parent_info,
-            extra={'workflowName':self.workflow.name})
+            extra={'workflowName':self.workflow_name})
         self.is_canceled = True
         for execution in self.executions.values():
             execution.cancel()
@@ -99,12 +114,13 @@ class Task(Base, PetriMixin):
             parent_info = ''
         LOG.info("Issuing job delete requests for Task ID:%s with name (%s)%s",
             self.id, self.name, parent_info,
-            extra={'workflowName':self.workflow.name})
+            extra={'workflowName':self.workflow_name})
         for execution in self.executions.values():
             execution.issue_job_delete_requests()
 
     def _pn(self, *args):
-        name_base = '-'.join(['task', str(self.id), self.name.replace(' ','_')])
+        name_base = '-'.join(['task', str(net_id('task', self.id)),
+            self.name.replace(' ','_')])
         return '-'.join([name_base] + list(args))
 
     def as_dict(self, detailed):
@@ -114,6 +130,7 @@ class Task(Base, PetriMixin):
         raise NotImplementedError
 
     def attach_transitions(self, transitions, start_place):
+        derived = self.elides_status_notifies
 
         if self.parallel_by is None:
             action_success, action_failure = \
@@ -125,7 +142,8 @@ class Task(Base, PetriMixin):
             subclass_success, subclass_failure = \
                     self.attach_subclass_transitions(transitions, split)
             update_success, update_failure = self._attach_status_update_actions(
-                    transitions, subclass_success, subclass_failure, 'inner')
+                    transitions, subclass_success, subclass_failure, 'inner',
+                    report_success=not derived, report_failure=not derived)
             action_success, join_failure = \
                     self._attach_join_transitions(transitions,
                             update_success, update_failure)
@@ -134,7 +152,9 @@ class Task(Base, PetriMixin):
                             split_failure, join_failure)
 
         success, failure = self._attach_status_update_actions(
-                transitions, action_success, action_failure, 'outer')
+                transitions, action_success, action_failure, 'outer',
+                report_success=not (derived or self.fuses_success_update),
+                report_failure=not derived)
 
 
         return success, failure
@@ -150,7 +170,8 @@ class Task(Base, PetriMixin):
                     self._pn('join_fail_wait')],
                 'action': {
                     'type': 'notify',
-                    'url': self.callback_url('get_split_size'),
+                    'url': self.callback_url('get_split_size',
+                        **DERIVED_STATUS_PARAMS),
                     'requested_data': ['color_group_size'],
                     'response_places': {
                         'send_data': self._pn('split_size_success'),
@@ -202,7 +223,8 @@ class Task(Base, PetriMixin):
                 'outputs': [self._pn('array_result_wait')],
                 'action': {
                     'type': 'notify',
-                    'url': self.callback_url('create_array_result'),
+                    'url': self.callback_url('create_array_result',
+                        **DERIVED_STATUS_PARAMS),
                     'response_places': {
                         'created': self._pn('array_result_callback'),
                     }
@@ -231,18 +253,22 @@ class Task(Base, PetriMixin):
         return self._pn('join_success'), self._pn('join_fail')
 
     def _attach_status_update_actions(self, transitions, action_success_place,
-            action_failure_place, name):
-        transitions.append({
-                'inputs': [action_success_place],
-                'outputs': [self._pn('update_status_success', name)],
-                'action': {
-                    'type': 'notify',
-                    'url': self.callback_url('succeeded'),
-                }})
-        success_place = self._pn('update_status_success', name)
+            action_failure_place, name, report_success=True,
+            report_failure=True):
+        if report_success:
+            transitions.append({
+                    'inputs': [action_success_place],
+                    'outputs': [self._pn('update_status_success', name)],
+                    'action': {
+                        'type': 'notify',
+                        'url': self.callback_url('succeeded'),
+                    }})
+            success_place = self._pn('update_status_success', name)
+        else:
+            success_place = action_success_place
 
 
-        if action_failure_place is None:
+        if action_failure_place is None or not report_failure:
             failure_place = action_failure_place
 
         else:
@@ -303,22 +329,25 @@ class Task(Base, PetriMixin):
             s.rollback()
             LOG.exception('%s - Failed to get split size',
                     self.workflow_id)
+            self._record_derived_status(colors, begins, statuses.failed,
+                    query_string_data)
             LOG.info('Notifying petri: execution "%s" failed to compute '
                     'split size for workflow "%s"',
-                    execution.name, self.workflow.name,
-                    extra={'workflowName':self.workflow.name})
-            self.http.delay('PUT', response_links['failure'])
+                    execution.name, self.workflow_name,
+                    extra={'workflowName':self.workflow_name})
+            outbox.send(s, 'PUT', response_links['failure'])
 
-            execution.data['error'] = \
-                'Failed to get split size: %s' % e.message
+            execution.set_data({
+                'error': 'Failed to get split size: %s' % e.message})
             s.commit()
             return
 
         LOG.info('Notifying petri: execution "%s" has split size %s for'
-                ' workflow "%s"', execution.name, size, self.workflow.name,
-                extra={'workflowName':self.workflow.name})
-        self.http.delay('PUT', response_links['send_data'],
+                ' workflow "%s"', execution.name, size, self.workflow_name,
+                extra={'workflowName':self.workflow_name})
+        outbox.send(s, 'PUT', response_links['send_data'],
                 color_group_size=size)
+        s.commit()
 
 
     def create_array_result(self, body_data, query_string_data):
@@ -329,25 +358,25 @@ class Task(Base, PetriMixin):
         response_links = body_data['response_links']
 
         s = object_session(self)
-        for output_name in self.output_names:
+        for output_name in self.graph_node.output_names:
             source, name, parallel_depths = self.resolve_output_source(s,
                     output_name, [])
-            results = s.query(result.Result
-                    ).filter_by(task=source, name=name, parent_color=color
-                    ).order_by('result.color'
-                    ).all()
+            # The array is assembled by postgres (or the blob store), so
+            # however wide the split was it never has to pass through this
+            # process.
+            result.Result.create_array(s, source.id, name, color,
+                    parent_color)
 
-            array_result = result.Result(task=source, name=name,
-                    color=color, parent_color=parent_color,
-                    data=[r.data for r in results])
-            s.add(array_result)
-
-        s.commit()
+        colors = group.get('color_lineage', []) + [color]
+        begins = group.get('begin_lineage', []) + [group['begin']]
+        self._record_derived_status(colors, begins, statuses.succeeded,
+                query_string_data)
 
         LOG.info('Notifying petri: created array result for task (%s) for'
-                ' workflow "%s"', self.name, self.workflow.name,
-                extra={'workflowName':self.workflow.name})
-        self.http.delay('PUT', response_links['created'])
+                ' workflow "%s"', self.name, self.workflow_name,
+                extra={'workflowName':self.workflow_name})
+        outbox.send(s, 'PUT', response_links['created'])
+        s.commit()
 
     @property
     def input_names(self):
@@ -382,30 +411,12 @@ class Task(Base, PetriMixin):
             query_string = ''
 
         base_url = url_for('task-callback',
-                task_id=self.id, callback_type=callback_type)
+                task_id=net_id('task', self.id),
+                callback_type=callback_type)
         return base_url + query_string
 
-    @property
-    def input_tasks(self):
-        source_ids = set([l.source_id for l in self.input_links])
-        if source_ids:
-            s = object_session(self)
-            return s.query(Task).filter(Task.id.in_(source_ids)).all()
-        else:
-            return []
-
-    @property
-    def output_tasks(self):
-        destination_ids = set([l.destination_id for l in self.output_links])
-        if destination_ids:
-            s = object_session(self)
-            return s.query(Task).filter(
-                    Task.id.in_(destination_ids)).all()
-        else:
-            return []
-
     def set_outputs(self, outputs, color, parent_color):
-        for output_name in self.output_names:
+        for output_name in self.graph_node.output_names:
             if output_name not in outputs.keys():
                 raise exceptions.MissingOutputError(
                         "No value specified for output (%s) on task (%s:%s), "
@@ -417,16 +428,22 @@ class Task(Base, PetriMixin):
                         parent_color=parent_color)
 
     def get_inputs(self, colors, begins):
-        inputs = {}
-        for source in self.input_sources:
-            inputs[source.destination_property] = source.get_data(
-                    colors, begins)
+        inputs = input_source.InputSource.get_all_data(object_session(self),
+                self.input_sources, colors, begins)
 
         LOG.debug('Got inputs for Task (%s:%s), colors=%s in workflow %s: %s',
-                self.name, self.id, colors, self.workflow.name, inputs)
+                self.name, self.id, colors, self.workflow_name, inputs)
 
         return inputs
 
+    def get_input_references(self, colors, begins):
+        """
+        Like get_inputs, but returns references to the results instead of
+        their data, for passing inputs through as outputs without copying.
+        """
+        return input_source.InputSource.get_all_references(
+                object_session(self), self.input_sources, colors, begins)
+
     def handle_callback(self, callback_type, body_data, query_string_data):
         if callback_type in self.VALID_CALLBACK_TYPES:
             return getattr(self, callback_type)(body_data, query_string_data)
@@ -437,37 +454,9 @@ class Task(Base, PetriMixin):
     def get_or_create_execution(self, color, group):
         s = object_session(self)
 
-        try:
-            execution = s.query(TaskExecution).filter(
-                    TaskExecution.task==self,
-                    TaskExecution.color==color).one()
-            created_execution = False
-        except NoResultFound:
-            colors = group.get('color_lineage', []) + [color]
-            begins = group.get('begin_lineage', []) + [group['begin']]
-            parent_color = _get_parent_color(colors)
-
-            execution = TaskExecution(task=self, color=color,
-                    colors=colors, begins=begins,
-                    workflow_id=self.workflow_id,
-                    parent_color=parent_color,
-            )
-            s.add(execution)
-            try:
-                s.commit()
-                created_execution = True
-            except IntegrityError:
-                s.rollback()
-                execution = s.query(TaskExecution).filter(
-                        TaskExecution.task==self,
-                        TaskExecution.color==color).one()
-                created_execution = False
-
-        if created_execution:
-            execution.status = statuses.scheduled
-            s.flush()
-            execution.status = statuses.running
-            s.flush()
+        execution, created_execution = TaskExecution.get_or_create(s,
+                'task_id', self.id, color, group, self.workflow_id,
+                status_path=RUNNING_STATUS_PATH)
 
         if self.is_canceled:
             execution.status = statuses.canceled
@@ -476,6 +465,85 @@ class Task(Base, PetriMixin):
 
         return execution
 
+    def get_or_create_executions(self, colors_and_groups):
+        """
+        Returns {color: execution} for many colors at once, without
+        committing.
+        """
+        executions, created_colors = TaskExecution.get_or_create_many(
+                object_session(self), 'task_id', self.id, colors_and_groups,
+                self.workflow_id, status_path=RUNNING_STATUS_PATH)
+
+        if self.is_canceled:
+            for execution in executions.itervalues():
+                execution.status = statuses.canceled
+        return executions
+
+    @property
+    def reports_success_in_callback(self):
+        """
+        True if this task succeeds exactly when one of our own callbacks
+        does, so that callback can record the task's success itself.
+        """
+        return False
+
+    @property
+    def fuses_success_update(self):
+        return FUSE_INTERNAL_STEPS and self.reports_success_in_callback
+
+    def report_fused_success(self, body_data, query_string_data):
+        """
+        Called from the internal step this task's success follows from, in
+        place of the 'succeeded' notify that a fused net leaves out.
+        """
+        if query_string_data.get('fused') and \
+                self.reports_success_in_callback:
+            # Not committed here: the success has to be committed together
+            # with the rest of that step's callback and its petri response.
+            self._record_status(body_data['color'], body_data['group'],
+                    statuses.succeeded)
+
+    @property
+    def derives_status(self):
+        """
+        True if the callbacks of this task's methods, split and join
+        determine its status, so they can record it themselves.
+        """
+        return False
+
+    @property
+    def elides_status_notifies(self):
+        return DERIVE_TASK_STATUS and self.derives_status
+
+    def record_method_status(self, colors, begins, status,
+            query_string_data):
+        """
+        Records the <status> one of this task's methods gives it for the
+        execution of <colors>, in place of the status notifies that a net
+        built with DERIVE_TASK_STATUS leaves out.
+        """
+        if self._record_derived_status(colors, begins, status,
+                query_string_data) and self.parallel_by is not None and \
+                status == statuses.failed:
+            # The first color to fail fails the whole task, just as the
+            # join's failure transition does.
+            self._record_derived_status(colors[:-1], begins[:-1], status,
+                    query_string_data)
+
+    def _record_derived_status(self, colors, begins, status,
+            query_string_data):
+        if not (query_string_data.get('derive_status') and
+                self.derives_status):
+            return False
+
+        # Left for the callback to commit along with its petri response.
+        self._record_status(colors[-1], {
+            'color_lineage': colors[:-1],
+            'begin_lineage': begins[:-1],
+            'begin': begins[-1],
+        }, status)
+        return True
+
     def succeeded(self, body_data, query_string_data):
         self._ended(body_data, query_string_data, statuses.succeeded)
 
@@ -483,15 +551,13 @@ class Task(Base, PetriMixin):
         self._ended(body_data, query_string_data, statuses.failed)
 
     def _ended(self, body_data, query_string_data, status):
+        self._record_status(body_data['color'], body_data['group'], status)
+        object_session(self).commit()
 
-        s = object_session(self)
-
-        execution = self.get_or_create_execution(body_data['color'],
-                body_data['group'])
+    def _record_status(self, color, group, status):
+        execution = self.get_or_create_executions([(color, group)])[color]
         execution.status = status
 
-        s.commit()
-
     def resolve_input_source(self, session, name, parallel_depths):
         if self.parallel_by == name:
             pdepths = [self.parallel_depth] + parallel_depths
@@ -535,21 +601,38 @@ class Task(Base, PetriMixin):
                 )
                 session.add(in_source)
 
-    @property
-    def http(self):
-        return celery.current_app.tasks[
-                'ptero_common.celery.http.HTTP']
-
     def get_outputs(self, color):
         s = object_session(self)
-        results = s.query(result.Result).filter_by(task=self, color=color).all()
-        if results:
-            return {r.name: r.data for r in results}
-
-
-def _get_parent_color(colors):
-    if len(colors) == 1:
-        return None
+        names = [name for (name,) in s.query(result.Result.name
+                ).filter_by(task_id=self.id, color=color)]
+        if not names:
+            return None
 
-    else:
-        return colors[-2]
+        outputs = {key[1]: data for key, data in result_cache.get_results(
+            [(self.id, name, color, ()) for name in names]).iteritems()}
+
+        missing = [name for name in names if name not in outputs]
+        if missing:
+            rows = s.execute("""
+                SELECT source.name, target.blob_key, source.alias_path,
+                    blob.element_offsets[source.alias_path[1] + 1],
+                    blob.element_offsets[source.alias_path[1] + 2] - 1,
+                    CAST(coalesce(content.data, target.data) #> CAST(
+                        coalesce(source.alias_path, '{}') AS text[]) AS text)
+                FROM result AS source
+                JOIN result AS target
+                    ON target.id = coalesce(source.alias_id, source.id)
+                LEFT JOIN result_content AS content
+                    ON content.hash = target.content_hash
+                LEFT JOIN blob ON blob.key = target.blob_key
+                WHERE source.task_id = :task_id AND source.color = :color
+                    AND source.name = ANY(:names)
+            """, {'task_id': self.id, 'color': color, 'names': missing})
+            for name, blob_key, path, start, end, text in rows:
+                if blob_key is not None:
+                    outputs[name] = blob_store.load(blob_key, path or (),
+                            None if start is None else (start, end))
+                else:
+                    outputs[name] = result_cache.load_result(
+                            (self.id, name, color, ()), text)
+        return outputs
@@ -1,26 +1,14 @@
 from .base import Base
+from . import outbox
 from sqlalchemy import Column, ForeignKey, Integer, String, Index
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy.orm.session import object_session
-from sqlalchemy import event
-from collections import defaultdict
-import celery
 from ptero_common import nicer_logging
-from ptero_common.statuses import succeeded, failed, canceled, errored
 from ptero_common.utils import format_dict_of_lists
 
 LOG = nicer_logging.getLogger(__name__)
 
 __all__ = ['Webhook']
 
-webhooks_awaiting_dispatch = []
-
-
-def dispatch_webhooks(session):
-    for webhook_fn in globals()['webhooks_awaiting_dispatch']:
-        webhook_fn(session)
-    globals()['webhooks_awaiting_dispatch'] = []
-
 
 class Webhook(Base):
     __tablename__ = 'webhook'
@@ -58,67 +46,28 @@ class Webhook(Base):
         else:
             return 'Task'
 
-    @property
-    def http(self):
-        return celery.current_app.tasks[
-                'ptero_common.celery.http.HTTP']
-
-    def send(self, **data):
-        LOG.info('Sending webhook: %s "%s" of workflow "%s" reached status %s '
-                '-- %s',
-                self.parent_type, self.parent.name, self.parent.workflow.name,
-                self.name, self.url,
-                extra={'workflowName':self.parent.workflow.name})
-        self.http.delay('POST', self.url, webhookName=self.name, **data)
-
-    def send_after_commit(self, **data):
-        session = object_session(self)
-        url = self.url
-        name = self.name
-        workflow_name = self.parent.workflow.name
-        parent_type = self.parent_type
-        parent_name = self.parent.name
-
-        # Note: closure over self, url, name, data, ect...
-        # Closure is to ensure no SQL is emmitted on a 'committed' session
-        def closure_fn(session):
-            LOG.info('Sending webhook after commit: %s "%s" of workflow "%s" reached '
-                    'status %s -- %s',
-                    parent_type, parent_name, workflow_name, name, url,
-                    extra={'workflowName':workflow_name})
-            self.http.delay('POST', url, webhookName=name, **data)
-
-        # globals is used to ensure that if 'after_commit' is called repeatedly,
-        # that webhooks only get sent once.
-        globals()['webhooks_awaiting_dispatch'].append(closure_fn)
-        event.listen(session, "after_commit", dispatch_webhooks)
-
-
-NAME_SYNONYMS = {
-        succeeded : [succeeded, "ended"],
-        failed : [failed, "ended"],
-        canceled : [canceled, "ended"],
-        errored : [errored, "ended"],
-}
-
-
-def get_sorted_webhook_dict(entity):
-    unsorted_webhook_dict = defaultdict(list)
-    for webhook in entity.webhooks:
-        unsorted_webhook_dict[webhook.name].append(webhook.url)
-
-    return format_dict_of_lists(unsorted_webhook_dict)
+
+def send(session, name, url, workflow_name, parent_type, parent_name,
+        **data):
+    LOG.info('Queueing webhook: %s "%s" of workflow "%s" reached '
+            'status %s -- %s',
+            parent_type, parent_name, workflow_name, name, url,
+            extra={'workflowName':workflow_name})
+    outbox.send(session, 'POST', url, webhookName=name, **data)
+
+
+def get_sorted_webhook_dict(webhooks):
+    return format_dict_of_lists({name: list(urls)
+        for name, urls in webhooks.iteritems()})
 
 
 def get_webhooks_for_task(task, name):
-    s = object_session(task)
-    equivalent_names = NAME_SYNONYMS.get(name, [name])
-    return s.query(Webhook).filter_by(task_id=task.id).filter(
-        Webhook.name.in_(equivalent_names)).all()
+    """
+    Returns the (name, url) pairs to be notified when an execution of the
+    task reaches status <name>, without querying the database.
+    """
+    return task.graph_node.webhook_routes.get(name, ())
 
 
 def get_webhooks_for_method(method, name):
-    s = object_session(method)
-    equivalent_names = NAME_SYNONYMS.get(name, [name])
-    return s.query(Webhook).filter_by(method_id=method.id).filter(
-        Webhook.name.in_(equivalent_names)).all()
+    return method.graph_node.webhook_routes.get(name, ())
@@ -1,7 +1,10 @@
 from .base import Base
+from ptero_workflow.implementation import workflow_template
+from ptero_workflow.implementation.petri_optimizer import optimize_net
 from ptero_workflow.urls import url_for
-from sqlalchemy import Column, ForeignKey, Integer, Text
+from sqlalchemy import Column, ForeignKey, Integer, LargeBinary, Text
 from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm.session import object_session
 import base64
 from ptero_common import nicer_logging
 import os
@@ -14,6 +17,8 @@ __all__ = ['Workflow']
 LOG = nicer_logging.getLogger(__name__)
 
 
+_OPTIMIZE_NET = bool(int(os.environ.get('PTERO_WORKFLOW_OPTIMIZE_NET', 1)))
+
 
 def _generate_uuid():
     return base64.urlsafe_b64encode(uuid.uuid4().bytes)[:-2]
@@ -29,6 +34,11 @@ class Workflow(Base):
             index=True,
             default=_generate_uuid)
 
+    structure_hash = Column(Text, nullable=True)
+
+    # gzipped JSON of the (compacted) net that is submitted to petri
+    petri_net = Column(LargeBinary, nullable=True)
+
     root_task_id = Column(Integer, ForeignKey('task.id', ondelete='CASCADE',
         use_alter=True))
 
@@ -183,7 +193,17 @@ class Workflow(Base):
         return self.root_task.get_outputs(0)
 
     def build_petri_net(self):
-        return {
+        return workflow_template.build_petri_net(self, object_session(self))
+
+    def build_petri_net_from_models(self):
+        net = {
             'initialMarking': [self.start_place_name],
             'transitions': self.get_petri_transitions(),
         }
+        if _OPTIMIZE_NET:
+            net, removed = optimize_net(net)
+            LOG.info('Petri net optimizer removed %s transitions and %s '
+                    'places for workflow "%s"', removed['transitions'],
+                    removed['places'], self.name,
+                    extra={'workflowName':self.name})
+        return net
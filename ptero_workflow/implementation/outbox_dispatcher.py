@@ -0,0 +1,211 @@
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from ptero_common import nicer_logging
+from ptero_common.logging_configuration import configure_web_logging
+from ptero_workflow.implementation.models.outbox import NOTIFY_CHANNEL
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from requests.adapters import HTTPAdapter
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+import json
+import os
+import psycopg2
+import requests
+import select
+import time
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['OutboxDispatcher']
+
+
+_BATCH_SIZE = int(os.environ.get('PTERO_WORKFLOW_OUTBOX_BATCH_SIZE', 100))
+_CONCURRENCY = int(os.environ.get('PTERO_WORKFLOW_OUTBOX_CONCURRENCY', 16))
+_POLL_INTERVAL = float(os.environ.get(
+    'PTERO_WORKFLOW_OUTBOX_POLL_INTERVAL', 5))
+_MAX_ATTEMPTS = int(os.environ.get('PTERO_WORKFLOW_OUTBOX_MAX_ATTEMPTS', 10))
+_RETRY_DELAY = float(os.environ.get('PTERO_WORKFLOW_OUTBOX_RETRY_DELAY', 1))
+_HTTP_TIMEOUT = float(os.environ.get('PTERO_WORKFLOW_OUTBOX_HTTP_TIMEOUT',
+    30))
+# Claimed messages aren't claimed again for this many seconds, unless the
+# dispatcher that claimed them reschedules them sooner.  It should exceed
+# the time a batch takes to deliver, or messages may be sent twice.
+_LEASE = float(os.environ.get('PTERO_WORKFLOW_OUTBOX_LEASE', 300))
+
+
+class OutboxDispatcher(object):
+    """
+    Delivers the requests queued in the outbox_message table.  Batches are
+    claimed with SKIP LOCKED, so several dispatchers can run side by side,
+    and each batch is sent over pooled keep-alive connections with at most
+    <concurrency> requests in flight.  The requests of a batch to the same
+    url are sent one at a time, in the order they were queued, and those
+    after one that fails are held back until it is retried.  Claiming a message leases it by
+    moving its available_at past the lease; it is committed before the
+    batch is sent, so no transaction stays open while waiting on HTTP.
+    """
+    def __init__(self, engine, batch_size=_BATCH_SIZE,
+            concurrency=_CONCURRENCY):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pool = ThreadPool(concurrency)
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency,
+                pool_maxsize=concurrency)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+
+    def run_forever(self):
+        connection = None
+        while True:
+            try:
+                if connection is None:
+                    connection = self._listen()
+
+                while self.dispatch_batch() == self.batch_size:
+                    pass
+
+                # Wake up on commit of a new message, or after the poll
+                # interval to pick up messages whose retry delay has passed.
+                if select.select([connection], [], [], _POLL_INTERVAL)[0]:
+                    connection.poll()
+                    del connection.notifies[:]
+            except (psycopg2.Error, DBAPIError):
+                LOG.exception('Lost the connection to the database, '
+                        'reconnecting in %s seconds', _POLL_INTERVAL)
+                if connection is not None:
+                    connection.invalidate()
+                    connection = None
+                time.sleep(_POLL_INTERVAL)
+
+    def _listen(self):
+        connection = self.engine.raw_connection()
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.cursor().execute('LISTEN %s' % NOTIFY_CHANNEL)
+        return connection
+
+    def dispatch_batch(self):
+        messages = self._claim()
+        if messages:
+            outcomes = self.pool.map(self._deliver_in_order,
+                    _group_by_url(messages))
+            with self.engine.begin() as connection:
+                self._delete(connection, [id for delivered, failed, held
+                    in outcomes for id in delivered])
+                self._reschedule(connection, [failed for delivered, failed,
+                    held in outcomes if failed is not None])
+                for delivered, failed, held in outcomes:
+                    self._hold(connection, held, failed)
+
+        return len(messages)
+
+    def _claim(self):
+        with self.engine.begin() as connection:
+            messages = connection.execute(text("""
+                UPDATE outbox_message
+                SET available_at = now() + :lease * interval '1 second'
+                WHERE id IN (
+                    SELECT id FROM outbox_message
+                    WHERE available_at <= now()
+                    ORDER BY id
+                    LIMIT :limit
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, method, url, data, attempts
+            """), lease=_LEASE, limit=self.batch_size).fetchall()
+        return sorted(messages, key=lambda m: m.id)
+
+    def _deliver_in_order(self, messages):
+        """
+        Delivers <messages> one at a time until one fails.  Returns the ids
+        of those delivered, the id of the one that failed (or None) and the
+        ids of those after it, which weren't sent.
+        """
+        for i, message in enumerate(messages):
+            if not self._deliver(message):
+                return ([m.id for m in messages[:i]], message.id,
+                        [m.id for m in messages[i + 1:]])
+        return [m.id for m in messages], None, []
+
+    def _deliver(self, message):
+        try:
+            response = self.http.request(message.method, message.url,
+                    data=json.dumps(message.data),
+                    headers={'Content-Type': 'application/json'},
+                    timeout=_HTTP_TIMEOUT)
+        except requests.RequestException:
+            LOG.exception('Failed to send %s request to %s (attempt %s)',
+                    message.method, message.url, message.attempts + 1)
+            return False
+
+        if response.status_code >= 500:
+            LOG.warning('Got %s response to %s request to %s (attempt %s)',
+                    response.status_code, message.method, message.url,
+                    message.attempts + 1)
+            return False
+        elif response.status_code >= 400:
+            LOG.error('Got %s response to %s request to %s, not retrying',
+                    response.status_code, message.method, message.url)
+        return True
+
+    def _delete(self, connection, ids):
+        if ids:
+            connection.execute(text("""
+                DELETE FROM outbox_message WHERE id = ANY(:ids)
+            """), ids=ids)
+
+    def _reschedule(self, connection, ids):
+        if not ids:
+            return
+
+        abandoned = connection.execute(text("""
+            DELETE FROM outbox_message
+            WHERE id = ANY(:ids) AND attempts + 1 >= :max_attempts
+            RETURNING method, url
+        """), ids=ids, max_attempts=_MAX_ATTEMPTS).fetchall()
+        for method, url in abandoned:
+            LOG.error('Giving up on %s request to %s after %s attempts',
+                    method, url, _MAX_ATTEMPTS)
+
+        connection.execute(text("""
+            UPDATE outbox_message
+            SET attempts = attempts + 1,
+                available_at = now() +
+                    :retry_delay * power(2, attempts) * interval '1 second'
+            WHERE id = ANY(:ids)
+        """), ids=ids, retry_delay=_RETRY_DELAY)
+
+
+    def _hold(self, connection, ids, failed_id):
+        """
+        Makes the messages in <ids> available when the one they were held
+        back by is, or right away if it was given up on.
+        """
+        if ids:
+            connection.execute(text("""
+                UPDATE outbox_message
+                SET available_at = coalesce((SELECT available_at
+                    FROM outbox_message WHERE id = :failed_id), now())
+                WHERE id = ANY(:ids)
+            """), ids=ids, failed_id=failed_id)
+
+
+def _group_by_url(messages):
+    groups = OrderedDict()
+    for message in messages:
+        groups.setdefault(message.url, []).append(message)
+    return groups.values()
+
+
+def main():
+    configure_web_logging("WORKFLOW")
+    engine = create_engine(os.environ['PTERO_WORKFLOW_DB_STRING'])
+    OutboxDispatcher(engine).run_forever()
+
+
+if __name__ == '__main__':
+    import signal
+    signal.signal(signal.SIGTERM, signal.getsignal(signal.SIGINT))
+    main()
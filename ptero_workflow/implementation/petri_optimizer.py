@@ -0,0 +1,246 @@
+from ptero_workflow.implementation import step_chains
+from ptero_common import nicer_logging
+import copy
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['optimize_net']
+
+
+def optimize_net(net):
+    """
+    Returns an equivalent copy of the petri net <net> with fewer places and
+    transitions, and a dict counting what was removed.
+
+    - Transitions that can never fire, because one of their input places
+      never receives a token, are removed along with those places.
+    - Forwarding transitions (no action, one input, one output) whose input
+      place feeds nothing else are removed, and their input place is
+      replaced by their output place everywhere.  This collapses chains of
+      forwarding transitions, or-joins and single-method success funnels.
+    - An internal step that is only ever reached through a response of
+      another one is run in that step's callback instead of being notified
+      itself (see step_chains), so a chain of them costs one notify.
+    """
+    net = copy.deepcopy(net)
+    places_before = _places(net)
+    transitions_before = len(net['transitions'])
+
+    net['transitions'] = _remove_dead_transitions(net)
+    net['transitions'] = _merge_forwarding_transitions(net)
+    net['transitions'] = _fuse_internal_steps(net)
+
+    removed = {
+        'transitions': transitions_before - len(net['transitions']),
+        'places': len(places_before) - len(_places(net)),
+    }
+    return net, removed
+
+
+def _places(net):
+    places = set(net['initialMarking'])
+    for transition in net['transitions']:
+        places.update(transition['inputs'])
+        places.update(transition['outputs'])
+        places.update(_response_places(transition).itervalues())
+    return places
+
+
+def _response_places(transition):
+    return (transition.get('action') or {}).get('response_places', {})
+
+
+def _remove_dead_transitions(net):
+    transitions = net['transitions']
+    while True:
+        produced = set(net['initialMarking'])
+        for transition in transitions:
+            produced.update(transition['outputs'])
+            produced.update(_response_places(transition).itervalues())
+
+        live = [t for t in transitions
+                if all(p in produced for p in t['inputs'])]
+        if len(live) == len(transitions):
+            return transitions
+        transitions = live
+
+
+def _is_forwarding(transition):
+    return (set(transition) == set(['inputs', 'outputs']) and
+            len(transition['inputs']) == 1 and
+            len(transition['outputs']) == 1)
+
+
+def _merge_forwarding_transitions(net):
+    consumer_counts = _consumer_counts(net['transitions'])
+    memberships = _memberships(net)
+
+    # Every place is replaced by at most one other: the output of the
+    # single transition consuming it.
+    replacements = {}
+
+    def resolve(place):
+        while place in replacements:
+            place = replacements[place]
+        return place
+
+    kept = []
+    for transition in net['transitions']:
+        if _is_forwarding(transition):
+            source = transition['inputs'][0]
+            target = resolve(transition['outputs'][0])
+            # Merging must neither close a loop nor put a place into a list
+            # that already has its replacement.
+            if (consumer_counts[source] == 1 and target != source and
+                    not memberships[source] & memberships[target]):
+                replacements[source] = target
+                memberships[target] |= memberships.pop(source)
+                continue
+        kept.append(transition)
+
+    net['initialMarking'] = [resolve(p) for p in net['initialMarking']]
+    for transition in kept:
+        transition['inputs'] = [resolve(p) for p in transition['inputs']]
+        transition['outputs'] = [resolve(p) for p in transition['outputs']]
+        response_places = _response_places(transition)
+        for name, place in response_places.items():
+            response_places[name] = resolve(place)
+
+    return kept
+
+
+def _consumer_counts(transitions):
+    counts = {}
+    for transition in transitions:
+        for place in set(transition['inputs']):
+            counts[place] = counts.get(place, 0) + 1
+    return counts
+
+
+def _memberships(net):
+    """
+    Maps each place to the indexes of the input, output and marking lists
+    it appears in.  Response places may share a place, so they don't count.
+    """
+    place_lists = [net['initialMarking']]
+    for transition in net['transitions']:
+        place_lists.append(transition['inputs'])
+        place_lists.append(transition['outputs'])
+
+    memberships = {}
+    for index, places in enumerate(place_lists):
+        for place in places:
+            memberships.setdefault(place, set()).add(index)
+    return memberships
+
+
+def _fuse_internal_steps(net):
+    transitions = net['transitions']
+    while True:
+        fusion = _find_fusion(net['initialMarking'], transitions)
+        if fusion is None:
+            return transitions
+        transitions = _fuse(transitions, *fusion)
+
+
+def _find_fusion(initial_marking, transitions):
+    """
+    Returns the indexes of an internal step, the join of the response that
+    leads on to another internal step, and that step; or None.
+    """
+    consumers = _place_transitions(transitions, 'inputs')
+    producers = _place_transitions(transitions, 'outputs')
+
+    for index, transition in enumerate(transitions):
+        joins = _step_joins(transition, transitions, consumers)
+        if joins is None:
+            continue
+
+        last_step = step_chains.step_count(transition['action']['url']) - 1
+        for key, join_index in sorted(joins.iteritems()):
+            outputs = transitions[join_index]['outputs']
+            if (step_chains.split_response_key(key)[0] != last_step or
+                    len(outputs) != 1):
+                continue
+
+            (place,) = outputs
+            if (place in initial_marking or
+                    producers.get(place) != [join_index] or
+                    len(consumers.get(place, [])) != 1):
+                continue
+
+            next_index = consumers[place][0]
+            next_transition = transitions[next_index]
+            if (next_index != index and
+                    next_transition['inputs'] == [place] and
+                    _step_joins(next_transition, transitions,
+                        consumers) is not None):
+                return index, key, join_index, next_index
+    return None
+
+
+def _place_transitions(transitions, field):
+    result = {}
+    for index, transition in enumerate(transitions):
+        for place in set(transition[field]):
+            result.setdefault(place, []).append(index)
+    return result
+
+
+def _step_joins(transition, transitions, consumers):
+    """
+    Returns {response_places key: join index} for an internal step notify
+    whose wait place feeds nothing but the joins with its responses, or
+    None for any other transition.
+    """
+    action = transition.get('action') or {}
+    if (action.get('type') != 'notify' or
+            not step_chains.is_internal_step(action['url']) or
+            len(transition['outputs']) != 1):
+        return None
+
+    (wait,) = transition['outputs']
+    response_places = action.get('response_places', {})
+    if len(set(response_places.itervalues())) != len(response_places):
+        return None
+
+    joins = {}
+    for key, place in response_places.iteritems():
+        if len(consumers.get(place, [])) != 1:
+            return None
+        join_index = consumers[place][0]
+        join = transitions[join_index]
+        if (set(join) != set(['inputs', 'outputs']) or
+                sorted(join['inputs']) != sorted([wait, place])):
+            return None
+        joins[key] = join_index
+
+    if sorted(consumers.get(wait, [])) != sorted(joins.itervalues()):
+        return None
+    return joins
+
+
+def _fuse(transitions, index, key, join_index, next_index):
+    step = transitions[index]['action']
+    next_step = transitions[next_index]['action']
+    (wait,) = transitions[index]['outputs']
+    (next_wait,) = transitions[next_index]['outputs']
+    step_count = step_chains.step_count(step['url'])
+
+    response = step_chains.split_response_key(key)[1]
+    step['url'] = step_chains.append_step(step['url'], response,
+            next_step['url'])
+    del step['response_places'][key]
+    for next_key, place in next_step['response_places'].iteritems():
+        next_step_index, next_response = step_chains.split_response_key(
+                next_key)
+        step['response_places'][step_chains.response_key(
+            step_count + next_step_index, next_response)] = place
+
+    for transition in transitions:
+        transition['inputs'] = [wait if p == next_wait else p
+                for p in transition['inputs']]
+
+    return [t for i, t in enumerate(transitions)
+            if i not in (join_index, next_index)]
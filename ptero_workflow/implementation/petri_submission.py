@@ -0,0 +1,100 @@
+from ptero_common import nicer_logging
+from ptero_workflow.implementation.exceptions import PetriSubmissionError
+from requests.adapters import HTTPAdapter
+import json
+import os
+import requests
+import zlib
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['compact_net', 'encode_net', 'decode_net', 'put_net']
+
+
+_COMPACT_PLACES = bool(int(os.environ.get(
+    'PTERO_WORKFLOW_COMPACT_NET_PLACES', 1)))
+_GZIP = bool(int(os.environ.get('PTERO_WORKFLOW_PETRI_GZIP', 1)))
+_TIMEOUT = float(os.environ.get('PTERO_WORKFLOW_PETRI_SUBMIT_TIMEOUT', 60))
+
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter())
+_SESSION.mount('https://', HTTPAdapter())
+
+
+def compact_net(net):
+    """
+    Returns the net with every place renamed to a short id ("p0", "p1",
+    ...), in order of first appearance.  Nothing outside the net refers to
+    place names, so only its size changes.
+    """
+    if not _COMPACT_PLACES:
+        return net
+
+    ids = {}
+
+    def place_id(place):
+        if place not in ids:
+            ids[place] = 'p%x' % len(ids)
+        return ids[place]
+
+    result = {'initialMarking': [place_id(p) for p in net['initialMarking']]}
+    result['transitions'] = []
+    for transition in net['transitions']:
+        compacted = dict(transition)
+        compacted['inputs'] = [place_id(p) for p in transition['inputs']]
+        compacted['outputs'] = [place_id(p) for p in transition['outputs']]
+
+        action = transition.get('action')
+        if action and 'response_places' in action:
+            compacted['action'] = dict(action)
+            compacted['action']['response_places'] = {
+                    name: place_id(place) for name, place
+                    in action['response_places'].iteritems()}
+        result['transitions'].append(compacted)
+    return result
+
+
+def encode_net(net):
+    """
+    Returns the gzipped JSON of the net, as stored and sent to petri.
+    """
+    return _gzip(json.dumps(net, separators=(',', ':')))
+
+
+def decode_net(encoded_net):
+    return json.loads(_gunzip(encoded_net))
+
+
+def put_net(url, encoded_net):
+    """
+    PUTs a net encoded by encode_net to petri, still gzipped unless
+    PTERO_WORKFLOW_PETRI_GZIP=0.  Raises PetriSubmissionError if petri did
+    not accept it.
+    """
+    headers = {'Content-Type': 'application/json'}
+    if _GZIP:
+        body = encoded_net
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        body = _gunzip(encoded_net)
+
+    try:
+        response = _SESSION.put(url, data=body, headers=headers,
+                timeout=_TIMEOUT)
+    except requests.RequestException as e:
+        raise PetriSubmissionError('Failed to PUT net to %s: %s' % (url, e))
+
+    if response.status_code >= 300:
+        raise PetriSubmissionError('Got %s response to PUT of net to %s: %s'
+                % (response.status_code, url, response.text))
+    LOG.debug('PUT %s bytes of net to %s', len(body), url)
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
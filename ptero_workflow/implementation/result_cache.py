@@ -0,0 +1,110 @@
+from ptero_workflow.implementation.lru_cache import LRUCache
+import hashlib
+import json
+import os
+
+
+__all__ = ['get_results', 'put_result', 'load_result', 'evict_task_results']
+
+
+# Results are never changed once written, so the only invalidation needed
+# is dropping the results of a deleted workflow to free their space.  The
+# local cache keeps the decoded data, which callers share and must not
+# modify, and accounts for it by the length of its JSON text.  Memcached is
+# sent the text itself.
+_MAX_BYTES = int(os.environ.get('PTERO_WORKFLOW_RESULT_CACHE_BYTES',
+    64 * 1024 * 1024))
+_MAX_ENTRIES = int(os.environ.get('PTERO_WORKFLOW_RESULT_CACHE_SIZE', 100000))
+_MEMCACHED = os.environ.get('PTERO_WORKFLOW_RESULT_CACHE_MEMCACHED')
+
+_MISSING = object()
+
+
+class _LocalBackend(object):
+    def __init__(self, max_entries=_MAX_ENTRIES, max_bytes=_MAX_BYTES):
+        self._cache = LRUCache(max_entries, max_bytes=max_bytes)
+
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            # None is stored for JSON null, so a miss needs its own marker
+            data = self._cache.get(key, _MISSING)
+            if data is not _MISSING:
+                found[key] = data
+        return found
+
+    def put(self, key, data, text):
+        self._cache.put(key, data, size=len(text))
+
+    def evict_tasks(self, task_ids):
+        task_ids = set(task_ids)
+        self._cache.discard_if(lambda key: key[0] in task_ids)
+
+
+class _MemcachedBackend(object):
+    """
+    Shares results between processes through a memcached-compatible server
+    given as "host:port" (requires pymemcache).  Deleted workflows' results
+    are left to the server's own eviction: ids are never reused, so they
+    are never read again.
+    """
+    def __init__(self, server):
+        from pymemcache.client.base import Client
+        host, port = server.rsplit(':', 1)
+        self._client = Client((host, int(port)))
+
+    def get_many(self, keys):
+        names = {_memcached_key(key): key for key in keys}
+        if not names:
+            return {}
+        return {names[name]: json.loads(text) for name, text
+                in self._client.get_many(names.keys()).iteritems()}
+
+    def put(self, key, data, text):
+        if len(text) <= _MAX_BYTES:
+            self._client.set(_memcached_key(key), text, noreply=True)
+
+    def evict_tasks(self, task_ids):
+        pass
+
+
+def _memcached_key(key):
+    return 'ptero-result-' + hashlib.sha1(json.dumps(key)).hexdigest()
+
+
+if _MEMCACHED:
+    _BACKEND = _MemcachedBackend(_MEMCACHED)
+else:
+    _BACKEND = _LocalBackend()
+
+
+def get_results(keys):
+    """
+    Returns {key: data} for the keys whose results are cached.  A key is
+    (task_id, name, color, path), where path is the tuple of indexes of the
+    element of the result wanted (empty for the whole result).
+    """
+    return _BACKEND.get_many(keys)
+
+
+def put_result(key, text):
+    """
+    Caches the JSON <text> of the result (element) identified by <key>.
+    """
+    _BACKEND.put(key, json.loads(text), text)
+
+
+def load_result(key, text):
+    """
+    Returns the data in the JSON <text> read for <key>, after caching it.
+    <text> is None where postgres found no (element of the) result.
+    """
+    if text is None:
+        return None
+    data = json.loads(text)
+    _BACKEND.put(key, data, text)
+    return data
+
+
+def evict_task_results(task_ids):
+    _BACKEND.evict_tasks(task_ids)
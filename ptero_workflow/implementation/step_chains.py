@@ -0,0 +1,124 @@
+from collections import namedtuple
+import re
+
+
+__all__ = ['Step', 'is_internal_step', 'step_count', 'response_key',
+        'split_response_key', 'append_step', 'next_step']
+
+
+# Internal steps (see petri_mixin.FUSE_INTERNAL_STEPS) are notified with
+# this parameter set, which marks them as fusable for the petri optimizer.
+_INTERNAL_PARAM = 'fused=1'
+
+# Names the steps a fused notify runs after its own callback, e.g.
+# 'success.method.12.execute,continue.task.5.copy_outputs_to_parent' runs
+# method 12's 'execute' callback when the notified step's response is
+# 'success', and then task 5's when that one's is too.  The ids aren't url
+# encoded, so that net templates can still stamp them.
+_STEPS_PARAM = 'then'
+
+_CALLBACK_URL_PATTERN = re.compile(
+        r'/callbacks/(task|method)s/([^/]+)/callbacks/([^/]+)$')
+
+
+class Step(namedtuple('Step', ['kind', 'id', 'callback_type', 'body_data',
+        'query_string_data'])):
+    """
+    An internal step to be handled in the callback of the step before it,
+    like a callback of <callback_type> for task or method (<kind>) <id>.
+    """
+
+
+def is_internal_step(url):
+    return _INTERNAL_PARAM in url.partition('?')[2].split('&')
+
+
+def step_count(url):
+    steps = _params(url).get(_STEPS_PARAM)
+    return 1 + (len(steps.split(',')) if steps else 0)
+
+
+def response_key(index, response):
+    """
+    The response_places key of a fused notify for <response> of its
+    <index>th step.
+    """
+    if index == 0:
+        return response
+    else:
+        return '%d-%s' % (index, response)
+
+
+def split_response_key(key):
+    """
+    Returns the index of the step and its response for a response_places
+    key of a fused notify.
+    """
+    head, separator, tail = key.partition('-')
+    if separator and head.isdigit():
+        return int(head), tail
+    else:
+        return 0, key
+
+
+def append_step(url, response, step_url):
+    """
+    Returns the url of a notify that runs the (possibly fused) internal
+    steps notified at <step_url> once the last step of <url> responds with
+    <response>.  The query parameters of both are kept, so every step sees
+    the settings the net was built with.
+    """
+    base, _, query = url.partition('?')
+    params = [p for p in query.split('&')
+            if p and p.partition('=')[0] != _STEPS_PARAM]
+    names = set(p.partition('=')[0] for p in params)
+
+    step_base, _, step_query = step_url.partition('?')
+    for param in step_query.split('&'):
+        name = param.partition('=')[0]
+        if param and name not in names and name != _STEPS_PARAM:
+            params.append(param)
+
+    kind, id, callback_type = _CALLBACK_URL_PATTERN.search(step_base).groups()
+    steps = [_params(url).get(_STEPS_PARAM),
+            '.'.join([response, kind, id, callback_type]),
+            _params(step_url).get(_STEPS_PARAM)]
+    params.append('%s=%s' % (_STEPS_PARAM, ','.join(s for s in steps if s)))
+
+    return '%s?%s' % (base, '&'.join(params))
+
+
+def _params(url):
+    return dict(p.partition('=')[::2]
+            for p in url.partition('?')[2].split('&') if p)
+
+
+def next_step(body_data, query_string_data, response):
+    """
+    Returns the Step to handle after a step's callback that responded with
+    <response>, or None if it is petri's to have.
+    """
+    steps = query_string_data.get(_STEPS_PARAM)
+    if not steps:
+        return None
+
+    steps = steps.split(',')
+    expected_response, kind, id, callback_type = steps[0].split('.')
+    if response != expected_response:
+        return None
+
+    response_links = {}
+    for key, url in body_data['response_links'].iteritems():
+        index, name = split_response_key(key)
+        if index > 0:
+            response_links[response_key(index - 1, name)] = url
+
+    query_string_data = dict(query_string_data.items())
+    if steps[1:]:
+        query_string_data[_STEPS_PARAM] = ','.join(steps[1:])
+    else:
+        del query_string_data[_STEPS_PARAM]
+
+    return Step(kind, int(id), callback_type,
+            dict(body_data, response_links=response_links),
+            query_string_data)
@@ -0,0 +1,210 @@
+from collections import defaultdict, namedtuple
+from ptero_workflow.implementation.lru_cache import LRUCache
+from ptero_common.statuses import succeeded, failed, canceled, errored
+import os
+
+
+__all__ = ['get_workflow_graph', 'evict_workflow_graph', 'WorkflowGraph',
+        'NAME_SYNONYMS']
+
+
+NAME_SYNONYMS = {
+        succeeded : [succeeded, "ended"],
+        failed : [failed, "ended"],
+        canceled : [canceled, "ended"],
+        errored : [errored, "ended"],
+}
+
+
+_CACHE = LRUCache(int(os.environ.get('PTERO_WORKFLOW_GRAPH_CACHE_SIZE',
+    256)))
+
+
+TaskNode = namedtuple('TaskNode', ['id', 'name', 'type', 'parent_id',
+    'parallel_by', 'topological_index', 'parallel_depth', 'input_names',
+    'output_names', 'input_task_ids', 'output_task_ids', 'webhooks',
+    'webhook_routes'])
+
+MethodNode = namedtuple('MethodNode', ['id', 'name', 'type', 'task_id',
+    'index', 'webhooks', 'webhook_routes'])
+
+InputSourceNode = namedtuple('InputSourceNode', ['destination_property',
+    'source_id', 'source_property', 'parallel_depths'])
+
+
+class WorkflowGraph(object):
+    """
+    Read-only snapshot of everything about a workflow that is fixed once it
+    has been created: its tasks, methods, links, webhooks and input sources.
+    """
+    def __init__(self, workflow_id, name, tasks, methods, input_sources):
+        self.workflow_id = workflow_id
+        self.name = name
+        self.tasks = tasks
+        self.methods = methods
+        self.input_sources = input_sources
+
+    def task(self, task_id):
+        return self.tasks[task_id]
+
+    def method(self, method_id):
+        return self.methods[method_id]
+
+    def task_input_sources(self, task_id):
+        return self.input_sources.get(task_id, ())
+
+
+def get_workflow_graph(session, workflow_id):
+    graph = _CACHE.get(workflow_id)
+    if graph is None:
+        graph = load_workflow_graph(session, workflow_id)
+        _CACHE.put(workflow_id, graph)
+    return graph
+
+
+def evict_workflow_graph(workflow_id):
+    _CACHE.pop(workflow_id)
+
+
+def load_workflow_graph(session, workflow_id):
+    params = {'workflow_id': workflow_id}
+
+    name = session.execute("""
+        SELECT name FROM workflow WHERE id = :workflow_id
+    """, params).scalar()
+
+    task_rows = session.execute("""
+        SELECT id, name, type, parent_id, parallel_by, topological_index
+        FROM task WHERE workflow_id = :workflow_id
+    """, params).fetchall()
+
+    method_rows = session.execute("""
+        SELECT id, name, type, task_id, index
+        FROM method WHERE workflow_id = :workflow_id
+    """, params).fetchall()
+
+    link_rows = session.execute("""
+        SELECT link.source_id, link.destination_id,
+            data_flow_entry.source_property,
+            data_flow_entry.destination_property
+        FROM link
+        JOIN task ON task.id = link.destination_id
+        LEFT JOIN data_flow_entry ON data_flow_entry.link_id = link.id
+        WHERE task.workflow_id = :workflow_id
+    """, params).fetchall()
+
+    webhook_rows = session.execute("""
+        SELECT webhook.task_id, webhook.method_id, webhook.name, webhook.url
+        FROM webhook
+        LEFT JOIN task ON task.id = webhook.task_id
+        LEFT JOIN method ON method.id = webhook.method_id
+        WHERE task.workflow_id = :workflow_id
+            OR method.workflow_id = :workflow_id
+        ORDER BY webhook.id
+    """, params).fetchall()
+
+    input_source_rows = session.execute("""
+        SELECT destination_id, destination_property, source_id,
+            source_property, parallel_depths
+        FROM input_source WHERE workflow_id = :workflow_id
+    """, params).fetchall()
+
+    return build_workflow_graph(workflow_id, name, task_rows, method_rows,
+            link_rows, webhook_rows, input_source_rows)
+
+
+def build_workflow_graph(workflow_id, name, task_rows, method_rows,
+        link_rows, webhook_rows, input_source_rows):
+    task_webhooks = defaultdict(lambda: defaultdict(list))
+    method_webhooks = defaultdict(lambda: defaultdict(list))
+    for task_id, method_id, webhook_name, url in webhook_rows:
+        if method_id is not None:
+            method_webhooks[method_id][webhook_name].append(url)
+        else:
+            task_webhooks[task_id][webhook_name].append(url)
+
+    methods = {}
+    for method_id, method_name, type, task_id, index in method_rows:
+        webhooks = _freeze(method_webhooks[method_id])
+        methods[method_id] = MethodNode(method_id, method_name, type,
+                task_id, index, webhooks, _webhook_routes(webhooks))
+
+    input_names = defaultdict(set)
+    output_names = defaultdict(set)
+    input_task_ids = defaultdict(set)
+    output_task_ids = defaultdict(set)
+    for source_id, destination_id, source_property, destination_property \
+            in link_rows:
+        input_task_ids[destination_id].add(source_id)
+        output_task_ids[source_id].add(destination_id)
+        if source_property is not None:
+            output_names[source_id].add(source_property)
+            input_names[destination_id].add(destination_property)
+
+    parallel_by = {row[0]: row[4] for row in task_rows}
+    parent_task_ids = {row[0]: _parent_task_id(row[3], methods)
+            for row in task_rows}
+    depths = {}
+
+    tasks = {}
+    for task_id, task_name, type, parent_id, _, topological_index \
+            in task_rows:
+        webhooks = _freeze(task_webhooks[task_id])
+        tasks[task_id] = TaskNode(task_id, task_name, type, parent_id,
+                parallel_by[task_id], topological_index,
+                _parallel_depth(task_id, parallel_by, parent_task_ids, depths),
+                frozenset(input_names[task_id]),
+                frozenset(output_names[task_id]),
+                tuple(sorted(input_task_ids[task_id])),
+                tuple(sorted(output_task_ids[task_id])),
+                webhooks, _webhook_routes(webhooks))
+
+    input_sources = defaultdict(list)
+    for destination_id, destination_property, source_id, source_property, \
+            parallel_depths in input_source_rows:
+        input_sources[destination_id].append(InputSourceNode(
+            destination_property, source_id, source_property,
+            tuple(parallel_depths)))
+
+    return WorkflowGraph(workflow_id, name, tasks, methods,
+            {k: tuple(v) for k, v in input_sources.iteritems()})
+
+
+def _freeze(webhooks):
+    return {name: tuple(urls) for name, urls in webhooks.iteritems()}
+
+
+def _webhook_routes(webhooks):
+    """
+    Maps each status to the (name, url) pairs of the webhooks that fire
+    when an execution reaches it, with synonyms such as "ended" expanded.
+    """
+    routes = defaultdict(list)
+    for name, urls in webhooks.iteritems():
+        routes[name].extend((name, url) for url in urls)
+    for status, synonyms in NAME_SYNONYMS.iteritems():
+        for name in synonyms:
+            if name != status:
+                routes[status].extend((name, url)
+                        for url in webhooks.get(name, ()))
+    return {status: tuple(route) for status, route in routes.iteritems()
+            if route}
+
+
+def _parent_task_id(parent_method_id, methods):
+    if parent_method_id is None:
+        return None
+    else:
+        return methods[parent_method_id].task_id
+
+
+def _parallel_depth(task_id, parallel_by, parent_task_ids, depths):
+    if task_id not in depths:
+        increment = 1 if parallel_by[task_id] else 0
+        parent_task_id = parent_task_ids[task_id]
+        if parent_task_id is None:
+            depths[task_id] = increment
+        else:
+            depths[task_id] = increment + _parallel_depth(parent_task_id,
+                    parallel_by, parent_task_ids, depths)
+    return depths[task_id]
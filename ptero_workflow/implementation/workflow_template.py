@@ -0,0 +1,221 @@
+from ptero_workflow.implementation.lru_cache import LRUCache
+from ptero_workflow.implementation.workflow_graph import get_workflow_graph
+from ptero_common import nicer_logging
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import re
+import threading
+
+
+LOG = nicer_logging.getLogger(__name__)
+
+__all__ = ['structure_hash', 'get_template', 'put_template',
+        'WorkflowTemplate', 'get_net_template', 'put_net_template',
+        'PetriNetTemplate', 'build_petri_net', 'entity_paths', 'net_id']
+
+
+_CACHE_SIZE = int(os.environ.get('PTERO_WORKFLOW_TEMPLATE_CACHE_SIZE', 256))
+
+_TEMPLATES = LRUCache(_CACHE_SIZE)
+_NET_TEMPLATES = LRUCache(_CACHE_SIZE)
+
+# json.dumps escapes the NUL delimiters, so they can't clash with names.
+_TOKEN_FORMAT = '\x00%d\x00'
+_TOKEN_PATTERN = re.compile(r'\\u0000(\d+)\\u0000')
+
+_NET_ID_TOKENS = threading.local()
+
+
+def structure_hash(workflow_data):
+    """
+    Returns a digest of the parts of a workflow POST body that determine
+    its graph: task and method names, services, parallelBy, nesting, links,
+    dataFlow and the names of the inputs.  Workflow and job parameters,
+    service urls, webhooks and input values are not part of it.
+    """
+    structure = {
+        'dag': _dag_structure(workflow_data),
+        'inputs': sorted(workflow_data.get('inputs', {}).keys()),
+    }
+    return hashlib.sha1(json.dumps(structure, sort_keys=True,
+        separators=(',', ':'))).hexdigest()
+
+
+def _dag_structure(dag_data):
+    return {
+        'tasks': {name: _task_structure(task_data)
+            for name, task_data in dag_data['tasks'].iteritems()},
+        'links': sorted(_link_structure(l) for l in dag_data['links']),
+    }
+
+
+def _task_structure(task_data):
+    return {
+        'parallelBy': task_data.get('parallelBy'),
+        'methods': [_method_structure(m)
+            for m in task_data.get('methods', [])],
+    }
+
+
+def _method_structure(method_data):
+    result = {
+        'name': method_data['name'],
+        'service': method_data['service'],
+    }
+    if method_data['service'] == 'workflow':
+        result['dag'] = _dag_structure(method_data['parameters'])
+    return result
+
+
+def _link_structure(link_data):
+    return [link_data['source'], link_data['destination'],
+            sorted(link_data.get('dataFlow', {}).items())]
+
+
+class WorkflowTemplate(object):
+    """
+    The validated and compiled parts of a workflow structure that
+    ModelBuilder would otherwise work out again for every submission.
+
+    Entities are identified by their path of names from the root task, e.g.
+    ('root', 'root', 'A', 'execute') for method 'execute' of task 'A'.
+
+        orderings       {dag method path: topological ordering of children}
+        input_sources   ((destination task path, destination property,
+                          source task path, source property,
+                          parallel depths), ...)
+    """
+    def __init__(self, orderings, input_sources):
+        self.orderings = orderings
+        self.input_sources = input_sources
+
+
+def get_template(structure_hash):
+    return _TEMPLATES.get(structure_hash)
+
+
+def put_template(structure_hash, template):
+    _TEMPLATES.put(structure_hash, template)
+
+
+class PetriNetTemplate(object):
+    """
+    A workflow's petri net serialized with placeholder tokens in place of
+    the task and method ids.  Stamping it with another workflow's ids (of
+    the same structure) gives that workflow's net.
+    """
+    def __init__(self, serialized_net, slots):
+        self.serialized_net = serialized_net
+        # slots[n] is the (kind, path) of the entity whose id replaces token n
+        self.slots = slots
+
+    @classmethod
+    def compile(cls, paths, build_net):
+        """
+        <paths> maps (kind, id) to path for every task and method, and
+        <build_net> builds the net while net ids are being tokenized.
+        """
+        ordered = sorted(paths.iteritems(), key=lambda item: item[1])
+        tokens = {key: _TOKEN_FORMAT % slot
+                for slot, (key, _) in enumerate(ordered)}
+        with _net_id_tokens(tokens):
+            net = build_net()
+
+        return cls(json.dumps(net), [(kind, path)
+            for (kind, _), path in ordered])
+
+    def stamp(self, paths):
+        ids = {(kind, path): id for (kind, id), path in paths.iteritems()}
+        values = [str(ids[slot]) for slot in self.slots]
+        return json.loads(_TOKEN_PATTERN.sub(
+            lambda match: values[int(match.group(1))], self.serialized_net))
+
+
+def get_net_template(key):
+    return _NET_TEMPLATES.get(key)
+
+
+def put_net_template(key, template):
+    _NET_TEMPLATES.put(key, template)
+
+
+def build_petri_net(workflow, session):
+    """
+    Returns the workflow's petri net, stamped from the template shared by
+    workflows of the same structure when there is one.
+    """
+    if workflow.structure_hash is None:
+        return workflow.build_petri_net_from_models()
+
+    paths = entity_paths(get_workflow_graph(session, workflow.id))
+    key = _net_template_key(workflow.structure_hash)
+    template = get_net_template(key)
+    if template is None:
+        template = PetriNetTemplate.compile(paths,
+                workflow.build_petri_net_from_models)
+        put_net_template(key, template)
+    else:
+        LOG.debug('Stamping petri net for workflow "%s" from template %s',
+                workflow.name, workflow.structure_hash,
+                extra={'workflowName': workflow.name})
+    return template.stamp(paths)
+
+
+def _net_template_key(structure_hash):
+    # The expire transitions depend on these settings, not on the structure.
+    return (structure_hash,
+            os.environ.get('PTERO_WORKFLOW_SUCCEEDED_EXPIRE_SECONDS'),
+            os.environ.get('PTERO_WORKFLOW_FAILED_EXPIRE_SECONDS'))
+
+
+def entity_paths(graph):
+    """
+    Maps ('task', id) and ('method', id) of every task and method in the
+    WorkflowGraph to its path of names.
+    """
+    task_paths = {}
+
+    def task_path(task_id):
+        if task_id not in task_paths:
+            task = graph.task(task_id)
+            if task.parent_id is None:
+                task_paths[task_id] = (task.name,)
+            else:
+                task_paths[task_id] = method_path(task.parent_id) + (
+                        task.name,)
+        return task_paths[task_id]
+
+    def method_path(method_id):
+        method = graph.method(method_id)
+        return task_path(method.task_id) + (method.name,)
+
+    paths = {}
+    for task_id in graph.tasks:
+        paths[('task', task_id)] = task_path(task_id)
+    for method_id in graph.methods:
+        paths[('method', method_id)] = method_path(method_id)
+    return paths
+
+
+def net_id(kind, id):
+    """
+    The id used for a task or method (<kind> is 'task' or 'method') in petri
+    place names and callback urls.  While a net template is being compiled
+    this is a placeholder token instead of the real id.
+    """
+    tokens = getattr(_NET_ID_TOKENS, 'tokens', None)
+    if tokens is None:
+        return id
+    else:
+        return tokens[(kind, id)]
+
+
+@contextmanager
+def _net_id_tokens(tokens):
+    _NET_ID_TOKENS.tokens = tokens
+    try:
+        yield
+    finally:
+        _NET_ID_TOKENS.tokens = None
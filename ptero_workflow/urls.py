@@ -21,11 +21,15 @@ ENDPOINT_INFO = {
         },
         'task-callback': {
             'url': '/callbacks/tasks/<int:task_id>/callbacks/<string:callback_type>',
-            'format': '/callbacks/tasks/%(task_id)d/callbacks/%(callback_type)s',
+            'format': '/callbacks/tasks/%(task_id)s/callbacks/%(callback_type)s',
         },
         'method-callback': {
             'url': '/callbacks/methods/<int:method_id>/callbacks/<string:callback_type>',
-            'format': '/callbacks/methods/%(method_id)d/callbacks/%(callback_type)s',
+            'format': '/callbacks/methods/%(method_id)s/callbacks/%(callback_type)s',
+        },
+        'method-callback-batch': {
+            'url': '/callbacks/methods/<int:method_id>/callbacks/<string:callback_type>/batch',
+            'format': '/callbacks/methods/%(method_id)s/callbacks/%(callback_type)s/batch',
         },
         'report': {
             'url': '/reports/<string:report_type>',
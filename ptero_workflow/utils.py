@@ -1,6 +1,7 @@
-from networkx import DiGraph
-from networkx.algorithms import is_directed_acyclic_graph
-from networkx.exception import NetworkXUnfeasible
+from collections import defaultdict
+from ptero_workflow.implementation.exceptions import (DAGCycleError,
+        UnreachableTaskError)
+import heapq
 import os
 
 
@@ -10,38 +11,90 @@ def base_dir():
 
 def deterministic_topological_ordering(nodes, links, start_node):
     """
-    Topological sort that is deterministic because it sorts (alphabetically)
-    candidates to check
+    Topological sort that is deterministic because, of the nodes reachable
+    from start_node that are ready, the (alphabetically) smallest is always
+    taken next.  Raises DAGCycleError, with the nodes on the cycle(s) as its
+    <members>, if the graph has a cycle, or else UnreachableTaskError, with
+    the nodes that can't be reached from start_node, if there are any.
     """
-    graph = DiGraph()
-    graph.add_nodes_from(nodes)
-    for link in links:
-        graph.add_edge(*link)
+    successors = defaultdict(set)
+    in_degree = defaultdict(int)
+    for node in nodes:
+        in_degree[node] += 0
+    for source, destination in set(links):
+        successors[source].add(destination)
+        in_degree[destination] += 1
+        in_degree[source] += 0
 
-    if not is_directed_acyclic_graph(graph):
-        raise NetworkXUnfeasible
+    remaining_in_degree = dict(in_degree)
+    ready = [start_node]
+    result = []
+    while ready:
+        name = heapq.heappop(ready)
+        result.append(name)
+        for successor in successors[name]:
+            remaining_in_degree[successor] -= 1
+            if remaining_in_degree[successor] == 0 and \
+                    successor != start_node:
+                heapq.heappush(ready, successor)
 
-    task_names = sorted(graph.successors(start_node))
-    task_set = set(task_names)
-    graph.remove_node(start_node)
+    # Every node was reached without going back to start_node, unless there
+    # is a cycle (or a part of the graph that is not reachable at all).
+    if len(result) < len(in_degree) or in_degree[start_node]:
+        members = _cycle_members(successors, in_degree)
+        if members:
+            raise DAGCycleError('Found a cycle among: %s' % ', '.join(
+                str(m) for m in members), members=members)
 
-    result = [start_node]
-    while task_names:
-        for name in task_names:
-            if graph.in_degree(name) == 0:
-                result.append(name)
+        members = sorted(set(in_degree) - _reachable(successors, start_node))
+        raise UnreachableTaskError('Not reachable from %s: %s' % (start_node,
+            ', '.join(str(m) for m in members)), members=members)
 
-                # it is OK to modify task_names because we break out
-                # of loop below
-                task_names.remove(name)
+    return result
 
-                new_successors = [t for t in graph.successors(name)
-                        if t not in task_set]
-                task_names.extend(new_successors)
-                task_names.sort()
-                task_set.update(set(new_successors))
 
-                graph.remove_node(name)
-                break
+def _cycle_members(successors, in_degree):
+    """
+    Returns the (sorted) nodes left after repeatedly removing every node
+    with no predecessors or no successors; empty if there is no cycle.
+    """
+    predecessors = _predecessors(successors)
 
-    return result
+    remaining = set(in_degree)
+    in_count = {n: len(predecessors[n]) for n in remaining}
+    out_count = {n: len(successors[n]) for n in remaining}
+    removable = [n for n in remaining if not in_count[n] or not out_count[n]]
+    while removable:
+        node = removable.pop()
+        if node not in remaining:
+            continue
+        remaining.remove(node)
+        for successor in successors[node]:
+            in_count[successor] -= 1
+            if in_count[successor] == 0:
+                removable.append(successor)
+        for predecessor in predecessors[node]:
+            out_count[predecessor] -= 1
+            if out_count[predecessor] == 0:
+                removable.append(predecessor)
+
+    return sorted(remaining)
+
+
+def _reachable(successors, start_node):
+    reached = set([start_node])
+    pending = [start_node]
+    while pending:
+        for successor in successors[pending.pop()]:
+            if successor not in reached:
+                reached.add(successor)
+                pending.append(successor)
+    return reached
+
+
+def _predecessors(successors):
+    predecessors = defaultdict(set)
+    for source, destinations in successors.items():
+        for destination in destinations:
+            predecessors[destination].add(source)
+    return predecessors
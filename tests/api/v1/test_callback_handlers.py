@@ -10,6 +10,17 @@ class TestCallbackHandlers(BaseAPITest):
         response = self.post(bad_url, {})
         self.assertEqual(NO_SUCH_ENTITY_STATUS_CODE, response.status_code)
 
+    def test_batch_callback_on_nonexistent_method(self):
+        bad_endpoint = '/v1/callbacks/methods/55021/callbacks/execute/batch'
+        bad_url = '%s%s' % (self.base_url, bad_endpoint)
+        response = self.post(bad_url, [])
+        self.assertEqual(NO_SUCH_ENTITY_STATUS_CODE, response.status_code)
+
+    def test_batch_callback_requires_list(self):
+        endpoint = '/v1/callbacks/methods/55021/callbacks/execute/batch'
+        response = self.post('%s%s' % (self.base_url, endpoint), {})
+        self.assertEqual(400, response.status_code)
+
     def test_callback_on_nonexistent_task(self):
         bad_endpoint = '/v1/callbacks/tasks/55021/callbacks/errored'
         bad_url = '%s%s' % (self.base_url, bad_endpoint)
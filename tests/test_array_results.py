@@ -0,0 +1,65 @@
+from ptero_workflow.implementation import models
+from ptero_workflow.implementation.models import result
+from tests.util import BackendTestCase, block_workflow_data
+import unittest
+import uuid
+
+
+class TestCreateArray(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        self.inputs = {'a': [1, {'b': 2}], 'c': 'kittens'}
+        self.workflow = self.save_workflow(block_workflow_data(self.inputs))
+        self.task = self.workflow.tasks['A']
+        self.input_result = self.get_result(self.workflow, 'a')
+
+    def create_array(self, elements, color=100):
+        # added out of order, to check that the array is in color order
+        for i, element in reversed(list(enumerate(elements))):
+            self.backend.session.add(models.Result(task_id=self.task.id,
+                name='out', color=color + 1 + i, parent_color=color,
+                data=element))
+        self.backend.session.commit()
+
+        models.Result.create_array(self.backend.session, self.task.id, 'out',
+                color, None)
+        self.backend.session.commit()
+        return self.backend.session.query(models.Result).filter_by(
+                task_id=self.task.id, name='out', color=color).one()
+
+    def test_small_arrays_are_built_by_postgres(self):
+        array = self.create_array([
+            'x',
+            models.ResultReference(self.input_result.id, (1,)),
+            None,
+            [1, 2],
+            models.ResultReference(self.input_result.id, ()),
+        ])
+
+        expected = ['x', {'b': 2}, None, [1, 2], [1, {'b': 2}]]
+        self.assertEqual(array.data, expected)
+        self.assertIsNone(array.content_hash)
+        self.assertIsNone(array.blob_key)
+        self.assertEqual(array.get_data([]), expected)
+        self.assertEqual(array.get_data([1]), {'b': 2})
+
+    def test_empty_array(self):
+        array = self.create_array([])
+        self.assertEqual(array.data, [])
+
+    def test_large_arrays_are_stored_as_content(self):
+        value = {'id': str(uuid.uuid4())}
+        elements = ['/some/long/path/%d' % i
+                for i in range(result._CONTENT_MIN_BYTES // 10)] + [value]
+        first = self.create_array(elements, color=100)
+        second = self.create_array(elements, color=200)
+
+        self.assertIsNone(first.data)
+        self.assertIsNotNone(first.content_hash)
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(first.get_data([]), elements)
+        self.assertEqual(first.get_data([len(elements) - 1]), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
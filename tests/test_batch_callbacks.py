@@ -0,0 +1,94 @@
+from ptero_workflow.implementation import models
+from ptero_common import statuses
+from sqlalchemy import event
+from tests.util import BackendTestCase, job_task, link, workflow_data
+import unittest
+
+
+class TestExecuteBatch(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        # A runs once for each element of in_a, as colors 1 to 3 of the
+        # color group that begins at 1, and B once they have all finished.
+        parameters = {
+            'commandLine': ['true'],
+            'user': 'dummy-user',
+            'workingDirectory': '/tmp',
+        }
+        self.workflow = self.save_workflow(workflow_data({
+            'A': job_task(parameters=parameters, parallel_by='param'),
+            'B': job_task(parameters=parameters),
+        }, [
+            link('input connector', 'A', {'in_a': 'param'}),
+            link('A', 'B', {'param': 'param'}),
+            link('B', 'output connector', {'param': 'out_a'}),
+        ], {'in_a': [1, 2, 3]}))
+        self.task = self.workflow.tasks['A']
+        self.job = self.task.method_list[0]
+
+    def body_data(self, color):
+        return {
+            'color': color,
+            'group': {'color_lineage': [0], 'begin_lineage': [0],
+                'begin': 1, 'parent_color': 0},
+            'response_links': {
+                'success': 'http://localhost:1/success/%d' % color,
+                'failure': 'http://localhost:1/failure/%d' % color,
+            },
+        }
+
+    def count_commits(self, function, *args):
+        commits = []
+
+        def count(session):
+            commits.append(session)
+
+        session = self.backend.session
+        event.listen(session, 'after_commit', count)
+        try:
+            function(*args)
+        finally:
+            event.remove(session, 'after_commit', count)
+        return len(commits)
+
+    def test_canceled_batch_commits_once(self):
+        colors = [1, 2, 3]
+        self.task.is_canceled = True
+        self.backend.session.commit()
+
+        commits = self.count_commits(self.job.execute_batch,
+                [self.body_data(c) for c in colors], {'derive_status': '1'})
+        self.assertEqual(commits, 1)
+
+        self.backend.session.expire_all()
+        for color in colors:
+            execution = self.job.executions[color]
+            self.assertEqual(execution.status, statuses.canceled)
+            self.assertEqual(execution.parent_color, 0)
+            self.assertEqual([h.status for h in
+                execution.ordered_status_history],
+                ['new', statuses.canceled])
+            self.assertEqual(execution.data['petri_response_links_for_job'],
+                    self.body_data(color)['response_links'])
+
+            task_execution = self.task.executions[color]
+            self.assertEqual([h.status for h in
+                task_execution.ordered_status_history],
+                ['new', statuses.scheduled, statuses.running,
+                    statuses.canceled])
+
+        urls = set(url for (url,) in self.backend.session.query(
+            models.OutboxMessage.url))
+        for color in colors:
+            self.assertIn(self.body_data(color)['response_links']['failure'],
+                    urls)
+
+    def test_empty_batch_does_nothing(self):
+        commits = self.count_commits(self.job.execute_batch, [], {})
+        self.assertEqual(commits, 0)
+        self.assertEqual(self.backend.session.query(models.MethodExecution
+            ).filter_by(method_id=self.job.id).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
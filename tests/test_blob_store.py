@@ -0,0 +1,245 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ptero_workflow.implementation import blob_store, models
+from ptero_workflow.implementation.blob_store import FileSystemBlobStore
+from sqlalchemy.exc import OperationalError
+from tests.util import (BackendTestCase, block_task, block_workflow_data,
+        chain_workflow_data)
+import uuid
+
+
+class TestFileSystemBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = FileSystemBlobStore(os.path.join(self.root, 'blobs'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        key = self.store.put(['[1,', '2]'])
+        with self.store.open(key) as f:
+            self.assertEqual(f.read(), '[1,2]')
+
+    def test_same_content_same_key(self):
+        self.assertEqual(self.store.put(['[1,2]']),
+                self.store.put(['[1,', '2]']))
+        self.assertNotEqual(self.store.put(['[1,2]']),
+                self.store.put(['[2,1]']))
+
+    def test_delete(self):
+        key = self.store.put(['"kittens"'])
+        self.store.delete(key)
+        self.assertRaises(IOError, self.store.open, key)
+        # deleting a missing blob is not an error
+        self.store.delete(key)
+
+    def test_reserved_before_visible(self):
+        reserved = []
+
+        def reserve(key):
+            self.assertRaises(IOError, self.store.open, key)
+            reserved.append(key)
+
+        key = self.store.put(['"kittens"'], reserve=reserve)
+        self.assertEqual(reserved, [key])
+
+    def test_keys(self):
+        self.assertEqual(list(self.store.keys()), [])
+        keys = set([self.store.put(['1']), self.store.put(['2'])])
+        self.assertEqual(set(self.store.keys()), keys)
+
+
+class BlobStoreDBTest(BackendTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = FileSystemBlobStore(self.root)
+        self.saved_store = blob_store._STORE
+        self.saved_threshold = blob_store._THRESHOLD
+        blob_store._STORE = self.store
+        blob_store._THRESHOLD = 10
+        BackendTestCase.setUp(self)
+
+    def tearDown(self):
+        BackendTestCase.tearDown(self)
+        blob_store._STORE = self.saved_store
+        blob_store._THRESHOLD = self.saved_threshold
+        shutil.rmtree(self.root)
+
+    def save_block_workflow(self, inputs, parallel_by=None):
+        return self.save_workflow(block_workflow_data(inputs, parallel_by))
+
+    def blob_keys(self, workflow):
+        task_ids = [task.id for task in workflow.all_tasks]
+        return set(key for (key,) in self.backend.session.query(
+            models.Result.blob_key).filter(
+                models.Result.task_id.in_(task_ids),
+                models.Result.blob_key.isnot(None)))
+
+    def exists(self, key):
+        return key in set(self.store.keys())
+
+    def element_offsets(self, key):
+        return self.backend.session.query(models.Blob).get(
+                key).element_offsets
+
+
+class TestBlobDeletion(BlobStoreDBTest):
+    def test_shared_blobs_are_deleted_with_their_last_result(self):
+        value = {'id': str(uuid.uuid4())}
+        first = self.save_block_workflow({'a': value})
+        second = self.save_block_workflow({'a': value})
+        (key,) = self.blob_keys(first)
+        self.assertEqual(self.blob_keys(second), set([key]))
+
+        self.delete_workflow(first)
+        self.assertTrue(self.exists(key))
+        self.assertEqual(second.root_task.get_inputs([0], [0]), {'a': value})
+
+        self.delete_workflow(second)
+        self.assertFalse(self.exists(key))
+        self.assertIsNone(self.backend.session.query(models.Blob).get(key))
+
+    def test_deletion_waits_for_writers(self):
+        writer = self.factory.create_backend()
+        key = blob_store.put(writer.session, ['"%s"' % uuid.uuid4()])
+
+        self.backend.session.execute("SET lock_timeout = '100ms'")
+        with self.assertRaises(OperationalError):
+            blob_store.delete_unreferenced(self.backend.session, [key])
+        self.backend.session.rollback()
+        self.assertTrue(self.exists(key))
+
+        writer.session.rollback()
+        writer.session.close()
+        blob_store.sweep(self.backend.session)
+        self.assertFalse(self.exists(key))
+
+    def test_sweep_deletes_only_unreferenced_blobs(self):
+        orphan = self.store.put(['"%s"' % uuid.uuid4()])
+        workflow = self.save_block_workflow({'a': {'id': str(uuid.uuid4())}})
+        (key,) = self.blob_keys(workflow)
+
+        blob_store.sweep(self.backend.session)
+        self.assertFalse(self.exists(orphan))
+        self.assertTrue(self.exists(key))
+
+
+class TestOffloadedArrays(BlobStoreDBTest):
+    def setUp(self):
+        BlobStoreDBTest.setUp(self)
+        self.value = [{'id': str(uuid.uuid4())}, [1, 2, 3], 'kittens', None]
+        self.workflow = self.save_block_workflow({'a': self.value})
+        self.result = self.get_result(self.workflow, 'a')
+        self.task = self.workflow.tasks['A']
+
+    def test_offloaded_in_init(self):
+        self.assertIsNotNone(self.result.blob_key)
+        self.assertIsNone(self.result.data)
+        self.assertEqual(self.result.element_count, len(self.value))
+        self.assertEqual(len(self.element_offsets(self.result.blob_key)),
+                len(self.value) + 1)
+
+    def test_element_reads(self):
+        self.assertEqual(self.result.get_data([]), self.value)
+        self.assertEqual(self.result.get_size([]), len(self.value))
+        for i, element in enumerate(self.value):
+            self.assertEqual(self.result.get_data([i]), element)
+        self.assertEqual(self.result.get_data([1, 2]), 3)
+        self.assertEqual(self.result.get_size([1]), 3)
+        self.assertIsNone(self.result.get_data([len(self.value)]))
+
+    def test_split_reads_elements(self):
+        workflow = self.save_block_workflow({'a': self.value}, parallel_by='a')
+        task = workflow.tasks['A']
+        source = self.backend.session.query(models.InputSource).filter_by(
+                destination_task=task, destination_property='a').one()
+        self.assertEqual(source.get_size([0], [0]), len(self.value))
+        for i, element in enumerate(self.value):
+            self.assertEqual(models.InputSource.get_all_data(
+                self.backend.session, [source], [0, 10 + i], [0, 10]),
+                {'a': element})
+
+    def test_split_reads_elements_through_aliases(self):
+        # A passes the array on to B, which is parallel by it.
+        workflow = self.save_workflow(chain_workflow_data({'a': self.value},
+            [('A', block_task()), ('B', block_task(parallel_by='a'))]))
+        task = workflow.tasks['A']
+        task.set_outputs(task.get_input_references([0], [0]), 0, None)
+        self.backend.session.commit()
+
+        source = self.backend.session.query(models.InputSource).filter_by(
+                destination_task=workflow.tasks['B'],
+                destination_property='a').one()
+        self.assertEqual(source.get_size([0], [0]), len(self.value))
+        for i, element in enumerate(self.value):
+            self.assertEqual(models.InputSource.get_all_data(
+                self.backend.session, [source], [0, 10 + i], [0, 10]),
+                {'a': element})
+
+    def test_get_outputs(self):
+        self.backend.session.add(models.Result(task_id=self.task.id,
+            name='element', color=100, data=models.ResultReference(
+                self.result.id, (1,))))
+        self.backend.session.add(models.Result(task_id=self.task.id,
+            name='all', color=100, data=models.ResultReference(
+                self.result.id, ())))
+        self.backend.session.commit()
+
+        self.assertEqual(self.task.get_outputs(100),
+                {'element': self.value[1], 'all': self.value})
+
+    def test_create_array(self):
+        elements = [
+            models.ResultReference(self.result.id, (0,)),
+            {'id': str(uuid.uuid4())},
+            'x',
+            models.ResultReference(self.result.id, ()),
+            models.ResultReference(self.result.id, (1, 2)),
+            None,
+        ]
+        expected = [self.value[0], elements[1], 'x', self.value, 3, None]
+        for i, element in enumerate(elements):
+            self.backend.session.add(models.Result(task_id=self.task.id,
+                name='out', color=200 + i, parent_color=100, data=element))
+        self.backend.session.commit()
+
+        models.Result.create_array(self.backend.session, self.task.id, 'out',
+                100, None)
+        self.backend.session.commit()
+        array = self.backend.session.query(models.Result).filter_by(
+                task_id=self.task.id, name='out', color=100).one()
+
+        self.assertIsNotNone(array.blob_key)
+        self.assertEqual(array.element_count, len(expected))
+        self.assertEqual(array.get_data([]), expected)
+        for i, element in enumerate(expected):
+            self.assertEqual(array.get_data([i]), element)
+        self.assertEqual(len(self.element_offsets(array.blob_key)),
+                len(expected) + 1)
+
+
+    def test_create_large_array_without_blob_elements(self):
+        # each element is kept in the database, but not the array
+        elements = ['a', 'b', 'c', 'd', 'e']
+        for i, element in enumerate(elements):
+            self.backend.session.add(models.Result(task_id=self.task.id,
+                name='small', color=200 + i, parent_color=100, data=element))
+        self.backend.session.commit()
+
+        models.Result.create_array(self.backend.session, self.task.id,
+                'small', 100, None)
+        self.backend.session.commit()
+        array = self.backend.session.query(models.Result).filter_by(
+                task_id=self.task.id, name='small', color=100).one()
+
+        self.assertIsNotNone(array.blob_key)
+        self.assertEqual(array.element_count, len(elements))
+        self.assertEqual(array.get_data([]), elements)
+        self.assertEqual(array.get_data([3]), 'd')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from ptero_workflow.implementation import backend as backend_module
+from tests.util import (BackendTestCase, dag_task, job_task, link,
+        workflow_data)
+import unittest
+
+
+class TestBulkPersistence(BackendTestCase):
+    def tearDown(self):
+        backend_module._BULK_SAVE = True
+        BackendTestCase.tearDown(self)
+
+    @property
+    def workflow_data(self):
+        tasks = {
+            'A': job_task('http://example.com/v1'),
+            'B': dag_task({'C': job_task('http://example.com/v1')}, [
+                link('input connector', 'C', {'param': 'param'}),
+                link('C', 'output connector', {'result': 'result'}),
+            ], parallel_by='param'),
+        }
+        tasks['A']['webhooks'] = {'ended': 'http://example.com/ended'}
+        return workflow_data(tasks, [
+            link('input connector', 'A', {'in_a': 'param'}),
+            link('A', 'B', {'result': 'param'}),
+            link('B', 'output connector', {'result': 'out_b'}),
+        ], {'in_a': ['kittens']})
+
+    def save_and_describe(self, bulk):
+        backend_module._BULK_SAVE = bulk
+        workflow = self.save_workflow(self.workflow_data)
+        self.backend.session.expire_all()
+
+        workflow_dict = workflow.as_dict(detailed=False)
+        del workflow_dict['name']
+
+        description = {
+            'tasks': sorted((t.name, t.type, t.parent and t.parent.name,
+                t.topological_index) for t in workflow.all_tasks),
+            'input_sources': sorted((s.destination_task.name,
+                s.destination_property, s.source_task.name,
+                s.source_property, tuple(s.parallel_depths))
+                for s in workflow.all_input_sources),
+            'root_task': workflow.root_task.name,
+            'workflow': workflow_dict,
+        }
+        self.delete_workflow(workflow)
+        return description
+
+    def test_bulk_save_matches_unit_of_work(self):
+        self.assertEqual(self.save_and_describe(bulk=True),
+                self.save_and_describe(bulk=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
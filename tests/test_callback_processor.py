@@ -0,0 +1,181 @@
+import datetime
+import os
+import random
+import unittest
+from ptero_workflow.implementation import callback_processor, models
+from ptero_workflow.implementation.callback_processor import CallbackProcessor
+from ptero_workflow.implementation.exceptions import InvalidCallbackError
+from ptero_workflow.implementation.factory import Factory
+from ptero_workflow.implementation.models import callback_queue
+from sqlalchemy import create_engine
+from tests.util import BackendTestCase, block_workflow_data
+
+
+class RecordingProcessor(CallbackProcessor):
+    """
+    Records the callbacks it claims instead of handling them, failing those
+    in <failing>.
+    """
+    def __init__(self, engine, factory):
+        CallbackProcessor.__init__(self, engine, factory, concurrency=2)
+        self.handled = []
+        self.failing = set()
+
+    def _handle(self, callback):
+        self.handled.append(callback.id)
+        return callback.id not in self.failing
+
+
+class TestCallbackProcessor(unittest.TestCase):
+    def setUp(self):
+        db_string = os.environ['PTERO_WORKFLOW_DB_STRING']
+        self.engine = create_engine(db_string)
+        self.backend = Factory(db_string).create_backend()
+        self.processor = RecordingProcessor(self.engine, Factory(db_string))
+        # keeps the callbacks queued by different tests apart
+        self.target_id = random.randint(10 ** 8, 10 ** 9)
+        self.enqueued = []
+
+    def tearDown(self):
+        self.backend.session.rollback()
+        self.backend.session.query(models.QueuedCallback).filter_by(
+                target_id=self.target_id).delete()
+        self.backend.session.commit()
+        self.processor.pool.close()
+
+    def enqueue(self, color):
+        callback_queue.enqueue(self.backend.session, 'method', self.target_id,
+                'running', {'color': color}, {})
+        self.backend.session.commit()
+        self.enqueued.append(self.backend.session.query(
+            models.QueuedCallback.id).filter_by(target_id=self.target_id
+                ).order_by(models.QueuedCallback.id.desc()).first()[0])
+        return self.enqueued[-1]
+
+    def process_batch(self):
+        self.processor.handled = []
+        self.processor.process_batch()
+        return [callback_id for callback_id in self.processor.handled
+                if callback_id in self.enqueued]
+
+    def queued(self):
+        self.backend.session.expire_all()
+        return {callback.id: callback for callback in
+                self.backend.session.query(models.QueuedCallback).filter_by(
+                    target_id=self.target_id)}
+
+    def test_callbacks_for_one_key_are_handled_in_order(self):
+        first = self.enqueue(1)
+        second = self.enqueue(1)
+        other = self.enqueue(2)
+
+        self.assertEqual(sorted(self.process_batch()), [first, other])
+        self.assertEqual(self.queued().keys(), [second])
+        self.assertEqual(self.process_batch(), [second])
+        self.assertEqual(self.queued(), {})
+
+    def test_locked_callbacks_are_skipped(self):
+        locked = self.enqueue(1)
+        unlocked = self.enqueue(2)
+
+        with self.engine.connect() as connection:
+            transaction = connection.begin()
+            connection.execute("""
+                SELECT id FROM queued_callback WHERE id = %s FOR UPDATE
+            """, locked)
+            self.assertEqual(self.process_batch(), [unlocked])
+            transaction.rollback()
+
+        self.assertEqual(self.process_batch(), [locked])
+        self.assertEqual(self.queued(), {})
+
+    def test_failed_callbacks_hold_back_later_ones(self):
+        first = self.enqueue(1)
+        second = self.enqueue(1)
+        self.processor.failing.add(first)
+
+        self.assertEqual(self.process_batch(), [first])
+        queued = self.queued()
+        self.assertEqual(sorted(queued), [first, second])
+        self.assertEqual(queued[first].attempts, 1)
+
+        # backing off, and holding back the callback queued after it
+        self.assertEqual(self.process_batch(), [])
+
+        self.backend.session.query(models.QueuedCallback).filter_by(
+                id=first).update({'available_at':
+                    models.QueuedCallback.available_at - datetime.timedelta(
+                        seconds=callback_processor._RETRY_DELAY * 2)},
+                synchronize_session=False)
+        self.backend.session.commit()
+        self.processor.failing.clear()
+        self.assertEqual(self.process_batch(), [first])
+        self.assertEqual(self.process_batch(), [second])
+
+    def test_failing_callbacks_are_abandoned(self):
+        saved_max_attempts = callback_processor._MAX_ATTEMPTS
+        callback_processor._MAX_ATTEMPTS = 1
+        try:
+            first = self.enqueue(1)
+            second = self.enqueue(1)
+            self.processor.failing.add(first)
+            self.process_batch()
+            self.assertEqual(self.queued().keys(), [second])
+        finally:
+            callback_processor._MAX_ATTEMPTS = saved_max_attempts
+
+
+class TestQueuedCallbackValidation(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        self.workflow = self.save_workflow(block_workflow_data({'a': 1}))
+        self.task = self.workflow.tasks['A']
+        self.method = self.task.method_list[0]
+
+    def tearDown(self):
+        self.backend.session.rollback()
+        self.backend.session.query(models.QueuedCallback).filter(
+                models.QueuedCallback.target_id.in_(
+                    [self.task.id, self.method.id])).delete(
+                        synchronize_session=False)
+        self.backend.session.commit()
+        BackendTestCase.tearDown(self)
+
+    def queued(self, target_id):
+        return self.backend.session.query(models.QueuedCallback).filter_by(
+                target_id=target_id).count()
+
+    def test_invalid_callback_types_are_not_queued(self):
+        with self.assertRaises(InvalidCallbackError):
+            self.backend.queue_method_callback(self.method.id, 'bogus',
+                    {'color': 0}, {})
+        with self.assertRaises(InvalidCallbackError):
+            self.backend.queue_task_callback(self.task.id, 'bogus',
+                    {'color': 0}, {})
+        self.backend.session.rollback()
+        self.assertEqual(self.queued(self.method.id), 0)
+        self.assertEqual(self.queued(self.task.id), 0)
+
+    def test_invalid_bodies_are_not_queued(self):
+        with self.assertRaises(InvalidCallbackError):
+            self.backend.queue_method_callback(self.method.id, 'execute',
+                    [{'color': 0}], {})
+        self.backend.session.rollback()
+        self.assertEqual(self.queued(self.method.id), 0)
+
+    def test_valid_callbacks_are_queued(self):
+        self.backend.queue_method_callback(self.method.id, 'execute',
+                {'color': 0}, {})
+        self.assertEqual(self.queued(self.method.id), 1)
+
+    def test_invalid_batches_are_rejected(self):
+        with self.assertRaises(InvalidCallbackError):
+            self.backend.handle_method_callbacks(self.method.id, 'bogus',
+                    [{'color': 0}], {})
+        with self.assertRaises(InvalidCallbackError):
+            self.backend.handle_method_callbacks(self.method.id, 'execute',
+                    [{'color': 0}, 7], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+from ptero_workflow.implementation.models.callback_queue import ordering_key
+
+
+class TestOrderingKey(unittest.TestCase):
+    def test_petri_callbacks_are_ordered_by_color(self):
+        self.assertEqual(ordering_key('method', 7, {'color': 3}, {}),
+                ordering_key('method', 7, {'color': 3}, {'status': 'x'}))
+        self.assertNotEqual(ordering_key('method', 7, {'color': 3}, {}),
+                ordering_key('method', 7, {'color': 4}, {}))
+        self.assertNotEqual(ordering_key('method', 7, {'color': 3}, {}),
+                ordering_key('task', 7, {'color': 3}, {}))
+
+    def test_job_callbacks_are_ordered_by_execution(self):
+        self.assertEqual(
+                ordering_key('method', 7, {'status': 'running'},
+                    {'execution_id': '12'}),
+                ordering_key('method', 7, {'status': 'succeeded'},
+                    {'execution_id': '12'}))
+
+    def test_missing_body(self):
+        self.assertEqual(ordering_key('task', 7, None, {}), 'task-7-None')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from networkx.exception import NetworkXUnfeasible
+from ptero_workflow.implementation.exceptions import (DAGCycleError,
+        UnreachableTaskError)
 from ptero_workflow.utils import\
         deterministic_topological_ordering
 
@@ -34,5 +35,33 @@ class TestTopologicalOrdering(unittest.TestCase):
     def test_cyclic(self):
         nodes = (0,1,2,3,4,999)
         links = ((0,1), (0,2), (1,3), (1,4), (2, 4), (3, 999), (4, 999), (999, 0))
-        with self.assertRaises(NetworkXUnfeasible):
+        with self.assertRaises(DAGCycleError) as context:
             deterministic_topological_ordering(nodes, links, 0)
+        self.assertEqual(context.exception.members, [0, 1, 2, 3, 4, 999])
+
+    def test_cycle_members_exclude_other_nodes(self):
+        nodes = ('a', 'b', 'c', 'd', 'e')
+        links = (('s', 'a'), ('a', 'b'), ('b', 'c'), ('c', 'b'), ('c', 'd'),
+                ('s', 'e'))
+        with self.assertRaises(DAGCycleError) as context:
+            deterministic_topological_ordering(nodes, links, 's')
+        self.assertEqual(context.exception.members, ['b', 'c'])
+
+    def test_self_link(self):
+        with self.assertRaises(DAGCycleError) as context:
+            deterministic_topological_ordering(['a'], [('s', 'a'), ('a', 'a')],
+                    's')
+        self.assertEqual(context.exception.members, ['a'])
+
+    def test_unreachable_nodes(self):
+        nodes = ('a', 'b', 'c', 'd')
+        links = (('s', 'a'), ('c', 'b'), ('a', 'b'))
+        with self.assertRaises(UnreachableTaskError) as context:
+            deterministic_topological_ordering(nodes, links, 's')
+        self.assertEqual(context.exception.members, ['c', 'd'])
+
+    def test_link_to_start_node(self):
+        with self.assertRaises(UnreachableTaskError) as context:
+            deterministic_topological_ordering(['a', 'b'],
+                    [('s', 'a'), ('b', 's')], 's')
+        self.assertEqual(context.exception.members, ['b'])
@@ -0,0 +1,47 @@
+from ptero_workflow.implementation import models
+from sqlalchemy import inspect
+from tests.util import BackendTestCase, block_workflow_data
+import unittest
+
+
+class TestSetData(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        workflow = self.save_workflow(block_workflow_data({'a': 1}))
+        self.execution, created = models.MethodExecution.get_or_create(
+                self.backend.session, 'method_id',
+                workflow.tasks['A'].method_list[0].id, 100, {'begin': 0},
+                workflow.id)
+        self.backend.session.commit()
+
+    def reload(self):
+        execution_id = self.execution.id
+        self.backend.session.expunge_all()
+        return self.backend.session.query(models.Execution).get(execution_id)
+
+    def test_set_data_twice(self):
+        self.execution.set_data({'jobId': 'a', 'jobUrl': 'http://a'})
+        self.execution.set_data({'jobId': 'b'})
+
+        expected = {'jobId': 'b', 'jobUrl': 'http://a'}
+        self.assertEqual(self.execution.data, expected)
+        self.assertFalse(inspect(self.execution).modified)
+
+        self.backend.session.commit()
+        self.assertEqual(self.reload().data, expected)
+
+    def test_changed_data_is_flushed_with_the_new_keys(self):
+        self.execution.data['error'] = 'oops'
+        self.execution.set_data({'jobId': 'a'})
+        self.backend.session.commit()
+
+        self.assertEqual(self.reload().data, {'error': 'oops', 'jobId': 'a'})
+
+    def test_unloaded_data_is_read_with_the_new_keys(self):
+        self.backend.session.expire(self.execution, ['data'])
+        self.execution.set_data({'jobId': 'a'})
+        self.assertEqual(self.execution.data, {'jobId': 'a'})
+
+
+if __name__ == '__main__':
+    unittest.main()
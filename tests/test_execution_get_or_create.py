@@ -0,0 +1,81 @@
+from ptero_workflow.implementation import models
+from ptero_workflow.implementation.models.execution import (
+        RUNNING_STATUS_PATH)
+from sqlalchemy import event
+from tests.util import BackendTestCase, block_workflow_data
+import threading
+import unittest
+
+
+class TestGetOrCreate(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        self.workflow = self.save_workflow(block_workflow_data({'a': 1}))
+        self.method_id = self.workflow.tasks['A'].method_list[0].id
+        self.group = {'begin': 0, 'color_lineage': [0],
+                'begin_lineage': [0]}
+        self.color = 100
+
+    def get_or_create(self, backend):
+        return models.MethodExecution.get_or_create(backend.session,
+                'method_id', self.method_id, self.color, self.group,
+                self.workflow.id, status_path=RUNNING_STATUS_PATH)
+
+    def history(self):
+        return [h.status for h in self.backend.session.query(
+            models.ExecutionStatusHistory).join(models.Execution).filter(
+                models.Execution.method_id == self.method_id,
+                models.Execution.color == self.color).order_by(
+                    models.ExecutionStatusHistory.id)]
+
+    def test_one_statement(self):
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        engine = self.backend.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            execution, created = self.get_or_create(self.backend)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        self.assertTrue(created)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(execution.status, RUNNING_STATUS_PATH[-1])
+        self.assertEqual(execution.colors, [0, self.color])
+
+    def test_repeated_calls(self):
+        first, first_created = self.get_or_create(self.backend)
+        self.backend.session.commit()
+        self.backend.session.expunge_all()
+        second, second_created = self.get_or_create(self.backend)
+
+        self.assertTrue(first_created)
+        self.assertFalse(second_created)
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(self.history(), list(RUNNING_STATUS_PATH))
+
+    def test_concurrent_calls(self):
+        other_backend = self.factory.create_backend()
+        first, first_created = self.get_or_create(self.backend)
+
+        # blocks on the first backend's uncommitted row until it commits
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            self.get_or_create(other_backend)))
+        thread.start()
+        self.backend.session.commit()
+        thread.join(10)
+        other_backend.session.rollback()
+
+        ((second, second_created),) = results
+        self.assertTrue(first_created)
+        self.assertFalse(second_created)
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(self.history(), list(RUNNING_STATUS_PATH))
+
+
+if __name__ == '__main__':
+    unittest.main()
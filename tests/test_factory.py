@@ -0,0 +1,17 @@
+from ptero_workflow.implementation.factory import Factory
+import os
+import unittest
+
+
+class TestFactory(unittest.TestCase):
+    def test_pool_size(self):
+        backend = Factory(os.environ['PTERO_WORKFLOW_DB_STRING'],
+                pool_size=7).create_backend()
+        engine = backend.session.get_bind()
+        self.assertEqual(engine.pool.size(), 7)
+        self.assertNotIn('pool_size', engine.url.query)
+        self.assertEqual(backend.session.execute('SELECT 1').scalar(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+from sqlalchemy import event
+from tests.util import (BackendTestCase, block_task, block_workflow_data,
+        chain_workflow_data)
+import unittest
+
+
+class TestInputQueries(BackendTestCase):
+    def inputs(self, size):
+        return {'in_%03d' % i: {'value': i} for i in range(size)}
+
+    def count_statements(self, workflow, task_name):
+        """
+        Returns the inputs of task <task_name> in <workflow>, and the number
+        of statements it took to read them.
+        """
+        workflow_id = workflow.id
+        self.backend.session.expunge_all()
+
+        workflow = self.backend._get_workflow(workflow_id)
+        if task_name is None:
+            task = workflow.root_task
+        else:
+            task = workflow.tasks[task_name]
+        # load what get_inputs is handed, so only the reads are counted
+        task.input_sources
+
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        engine = self.backend.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            inputs = task.get_inputs(colors=[0], begins=[0])
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+        return inputs, len(statements)
+
+    def get_inputs(self, size):
+        inputs = self.inputs(size)
+        workflow = self.save_workflow(block_workflow_data(inputs))
+        data, statements = self.count_statements(workflow, None)
+        self.assertEqual(data, inputs)
+        return statements
+
+    def get_passed_inputs(self, size):
+        """
+        Like get_inputs, but for the inputs of B, which A has passed on as
+        aliases of the workflow's inputs.
+        """
+        inputs = self.inputs(size)
+        workflow = self.save_workflow(chain_workflow_data(inputs,
+            [('A', block_task()), ('B', block_task())]))
+        task = workflow.tasks['A']
+        task.set_outputs(task.get_input_references([0], [0]), 0, None)
+        self.backend.session.commit()
+
+        data, statements = self.count_statements(workflow, 'B')
+        self.assertEqual(data, inputs)
+        return statements
+
+    def test_query_count_does_not_grow_with_inputs(self):
+        self.assertEqual(self.get_inputs(2), 1)
+        self.assertEqual(self.get_inputs(30), 1)
+
+    def test_query_count_does_not_grow_with_aliased_inputs(self):
+        self.assertEqual(self.get_passed_inputs(2), 1)
+        self.assertEqual(self.get_passed_inputs(30), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
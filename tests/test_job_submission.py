@@ -0,0 +1,118 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from ptero_workflow.implementation import job_submission
+from ptero_workflow.implementation.job_submission import (_get_session,
+        submit_job)
+import json
+import socket
+import threading
+import unittest
+
+
+class JobServiceHandler(BaseHTTPRequestHandler):
+    # keeps connections alive, so that their reuse can be seen
+    protocol_version = 'HTTP/1.1'
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, json.loads(body),
+            self.client_address))
+
+        status_code = self.server.status_codes.pop(0)
+        self.send_response(status_code)
+        if status_code in (200, 201):
+            self.send_header('Location', 'http://jobs.example.com%s'
+                    % self.path)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSubmitJob(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), JobServiceHandler)
+        self.server.requests = []
+        self.server.status_codes = []
+        self.server_thread = threading.Thread(
+                target=self.server.serve_forever)
+        self.server_thread.start()
+        self.service_url = 'http://%s:%s/v1' % self.server.server_address
+
+        self.saved_retry_delay = job_submission._RETRY_DELAY
+        job_submission._RETRY_DELAY = 0
+
+    def tearDown(self):
+        job_submission._RETRY_DELAY = self.saved_retry_delay
+        _get_session(self.service_url).close()
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.server_close()
+
+    def submit(self, job_id='job-1'):
+        return submit_job(self.service_url,
+                '%s/jobs/%s' % (self.service_url, job_id), {'x': 1})
+
+    def test_submitted(self):
+        self.server.status_codes = [201]
+        self.assertEqual(self.submit(),
+                'http://jobs.example.com/v1/jobs/job-1')
+        self.assertEqual([(path, data) for path, data, client
+            in self.server.requests], [('/v1/jobs/job-1', {'x': 1})])
+
+    def test_server_errors_are_retried(self):
+        self.server.status_codes = [503, 500, 201]
+        self.assertEqual(self.submit(),
+                'http://jobs.example.com/v1/jobs/job-1')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_retries_are_bounded(self):
+        self.server.status_codes = [503] * (job_submission._RETRIES + 1)
+        self.assertIsNone(self.submit())
+        self.assertEqual(len(self.server.requests),
+                job_submission._RETRIES + 1)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.status_codes = [400]
+        self.assertIsNone(self.submit())
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_missing_location(self):
+        self.server.status_codes = [202]
+        self.assertIsNone(self.submit())
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_errors_are_retried(self):
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        service_url = 'http://%s:%s/v1' % closed.getsockname()
+        closed.close()
+
+        self.assertIsNone(submit_job(service_url,
+            '%s/jobs/job-1' % service_url, {'x': 1}))
+
+    def test_connections_are_reused(self):
+        self.server.status_codes = [201, 201]
+        self.submit('job-1')
+        self.submit('job-2')
+        (first, second) = [client for path, data, client
+                in self.server.requests]
+        self.assertEqual(first, second)
+
+
+class TestGetSession(unittest.TestCase):
+    def test_one_session_per_service(self):
+        self.assertIs(_get_session('http://a.example.com/v1'),
+                _get_session('http://a.example.com/v1'))
+        self.assertIsNot(_get_session('http://a.example.com/v1'),
+                _get_session('http://b.example.com/v1'))
+
+    def test_pool_size(self):
+        session = _get_session('http://a.example.com/v1')
+        for url in ['http://a.example.com/v1', 'https://a.example.com/v1']:
+            self.assertEqual(session.get_adapter(url)._pool_maxsize,
+                    job_submission._POOL_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
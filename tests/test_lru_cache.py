@@ -0,0 +1,48 @@
+import unittest
+from ptero_workflow.implementation.lru_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_pop(self):
+        cache = LRUCache(max_entries=2)
+        cache.put('a', 1)
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_evicts_to_stay_under_max_bytes(self):
+        cache = LRUCache(max_entries=10, max_bytes=10)
+        cache.put('a', 'aaaa', size=4)
+        cache.put('b', 'bbbb', size=4)
+        cache.put('c', 'cccc', size=4)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.size, 8)
+
+        cache.pop('b')
+        self.assertEqual(cache.size, 4)
+
+    def test_does_not_store_entries_over_max_bytes(self):
+        cache = LRUCache(max_entries=10, max_bytes=10)
+        cache.put('a', 'a' * 11, size=11)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.size, 0)
+
+    def test_discard_if(self):
+        cache = LRUCache(max_entries=10, max_bytes=10)
+        cache.put((1, 'a'), 'x', size=1)
+        cache.put((2, 'a'), 'y', size=1)
+        cache.discard_if(lambda key: key[0] == 1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 1)
+        self.assertEqual(cache.get((2, 'a')), 'y')
@@ -0,0 +1,199 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from ptero_workflow.implementation import models
+from ptero_workflow.implementation.factory import Factory
+from ptero_workflow.implementation.models import outbox
+from ptero_workflow.implementation.outbox_dispatcher import OutboxDispatcher
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+import json
+import os
+import threading
+import unittest
+import uuid
+
+
+class RecordingServer(HTTPServer):
+    """
+    Answers every request with the status code at the end of its path (or
+    503 if its data has 'fail' set), and records them along with whether
+    their message was locked meanwhile.
+    """
+    def __init__(self, engine):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), RecordingHandler)
+        self.engine = engine
+        self.requests = []
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    def do_PUT(self):
+        data = json.loads(self.rfile.read(
+            int(self.headers['Content-Length'])))
+        self.server.requests.append((self.command, self.path, data,
+            self._message_locked()))
+        if data.get('fail'):
+            self.send_response(503)
+        else:
+            self.send_response(int(self.path.rsplit('/', 1)[-1]))
+        self.end_headers()
+
+    do_POST = do_PUT
+
+    def _message_locked(self):
+        url = 'http://%s:%s%s' % (self.server.server_address + (self.path,))
+        with self.server.engine.begin() as connection:
+            try:
+                connection.execute(text("""
+                    SELECT id FROM outbox_message WHERE url = :url
+                    FOR UPDATE NOWAIT
+                """), url=url)
+            except OperationalError:
+                return True
+        return False
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOutboxDispatcher(unittest.TestCase):
+    def setUp(self):
+        db_string = os.environ['PTERO_WORKFLOW_DB_STRING']
+        self.engine = create_engine(db_string)
+        self.backend = Factory(db_string).create_backend()
+
+        self.server = RecordingServer(self.engine)
+        self.server_thread = threading.Thread(
+                target=self.server.serve_forever)
+        self.server_thread.start()
+        self.base_url = 'http://%s:%s/%s' % (self.server.server_address +
+                (uuid.uuid4(),))
+
+        # large enough to claim messages left behind by other tests too
+        self.dispatcher = OutboxDispatcher(self.engine, batch_size=10000,
+                concurrency=2)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.server_close()
+        self.dispatcher.pool.close()
+
+        self.backend.session.rollback()
+        self.backend.session.query(models.OutboxMessage).filter(
+                models.OutboxMessage.url.like(self.base_url + '%')).delete(
+                        synchronize_session=False)
+        self.backend.session.commit()
+
+    def url(self, status_code):
+        return '%s/%s' % (self.base_url, status_code)
+
+    def queued(self, url):
+        self.backend.session.expire_all()
+        return self.backend.session.query(models.OutboxMessage).filter_by(
+                url=url).all()
+
+    def test_delivery(self):
+        outbox.send(self.backend.session, 'PUT', self.url(200),
+                color_group_size=3)
+        outbox.send(self.backend.session, 'POST', self.url(201))
+        self.backend.session.commit()
+
+        self.dispatcher.dispatch_batch()
+        self.assertEqual(sorted((method, data) for method, path, data, locked
+            in self.server.requests),
+            [('POST', {}), ('PUT', {'color_group_size': 3})])
+
+    def test_delivered_messages_are_deleted(self):
+        for status_code in [200, 404]:
+            outbox.send(self.backend.session, 'PUT', self.url(status_code))
+        self.backend.session.commit()
+
+        self.dispatcher.dispatch_batch()
+        self.assertEqual(self.queued(self.url(200)), [])
+        # client errors aren't retried
+        self.assertEqual(self.queued(self.url(404)), [])
+
+    def test_failed_messages_are_rescheduled(self):
+        outbox.send(self.backend.session, 'PUT', self.url(503))
+        self.backend.session.commit()
+
+        self.dispatcher.dispatch_batch()
+        (message,) = self.queued(self.url(503))
+        self.assertEqual(message.attempts, 1)
+        now = self.backend.session.execute('SELECT now()').scalar()
+        self.assertGreater(message.available_at, now)
+
+        # not sent again before its retry delay has passed
+        self.dispatcher.dispatch_batch()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_sent_only_after_commit(self):
+        outbox.send(self.backend.session, 'PUT', self.url(200))
+        self.backend.session.flush()
+        self.dispatcher.dispatch_batch()
+        self.assertEqual(self.server.requests, [])
+
+        self.backend.session.rollback()
+        self.dispatcher.dispatch_batch()
+        self.assertEqual(self.server.requests, [])
+
+        outbox.send(self.backend.session, 'PUT', self.url(200))
+        self.backend.session.commit()
+        self.dispatcher.dispatch_batch()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_messages_are_not_locked_during_delivery(self):
+        outbox.send(self.backend.session, 'PUT', self.url(200))
+        self.backend.session.commit()
+
+        self.dispatcher.dispatch_batch()
+        ((method, path, data, locked),) = self.server.requests
+        self.assertFalse(locked)
+
+    def test_messages_to_a_url_are_delivered_in_order(self):
+        for n in range(10):
+            outbox.send(self.backend.session, 'PUT', self.url(200), n=n)
+            outbox.send(self.backend.session, 'PUT', self.url(201), n=n)
+        self.backend.session.commit()
+
+        self.dispatcher.dispatch_batch()
+        for status_code in [200, 201]:
+            self.assertEqual([data['n'] for method, path, data, locked
+                in self.server.requests if path.endswith(str(status_code))],
+                range(10))
+
+    def test_failed_messages_hold_back_later_ones(self):
+        outbox.send(self.backend.session, 'PUT', self.url(200), n=0,
+                fail=True)
+        outbox.send(self.backend.session, 'PUT', self.url(200), n=1)
+        self.backend.session.commit()
+
+        self.dispatcher.dispatch_batch()
+        self.assertEqual([data['n'] for method, path, data, locked
+            in self.server.requests], [0])
+
+        (failed, held) = sorted(self.queued(self.url(200)),
+                key=lambda m: m.id)
+        self.assertEqual((failed.attempts, held.attempts), (1, 0))
+        self.assertEqual(held.available_at, failed.available_at)
+
+    def test_one_notify_per_transaction(self):
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        engine = self.backend.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            for status_code in [200, 201, 202]:
+                outbox.send(self.backend.session, 'PUT', self.url(status_code))
+            self.backend.session.commit()
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        self.assertEqual(len([s for s in statements
+            if s.startswith('NOTIFY')]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+from ptero_workflow.implementation.workflow_graph import evict_workflow_graph
+from sqlalchemy import event
+from tests.util import BackendTestCase, block_task, chain_workflow_data
+import unittest
+
+
+class TestPetriNetQueries(BackendTestCase):
+    def workflow_data(self, size):
+        return chain_workflow_data({'value': 'kittens'},
+                [('task_%03d' % i, block_task()) for i in range(size)])
+
+    def count_net_queries(self, size):
+        workflow = self.save_workflow(self.workflow_data(size))
+        workflow_id = workflow.id
+        evict_workflow_graph(workflow_id)
+        self.backend.session.expunge_all()
+
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        engine = self.backend.session.get_bind()
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            workflow = self.backend._get_workflow_eagerly(workflow_id)
+            workflow.build_petri_net_from_models()
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+        self.delete_workflow(workflow)
+        return len(statements)
+
+    def test_query_count_does_not_grow_with_dag_size(self):
+        self.assertEqual(self.count_net_queries(2),
+                self.count_net_queries(40))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import unittest
+from ptero_workflow.implementation.petri_optimizer import optimize_net
+
+
+def _notify(inputs, outputs, url, **response_places):
+    return {
+        'inputs': inputs,
+        'outputs': outputs,
+        'action': {
+            'type': 'notify',
+            'url': url,
+            'response_places': response_places,
+        },
+    }
+
+
+def _notifies(net):
+    return [t for t in net['transitions']
+            if (t.get('action') or {}).get('type') == 'notify']
+
+
+class TestPetriOptimizer(unittest.TestCase):
+    def test_chain_is_collapsed(self):
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [
+                {'inputs': ['start'], 'outputs': ['a']},
+                {'inputs': ['a'], 'outputs': ['b']},
+                _notify(['b'], ['wait'], 'http://x', success='done'),
+                {'inputs': ['wait', 'done'], 'outputs': ['c']},
+                {'inputs': ['c'], 'outputs': ['end']},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+
+        self.assertEqual(optimized, {
+            'initialMarking': ['b'],
+            'transitions': [
+                _notify(['b'], ['wait'], 'http://x', success='done'),
+                {'inputs': ['wait', 'done'], 'outputs': ['end']},
+            ],
+        })
+        self.assertEqual(removed, {'transitions': 3, 'places': 3})
+
+    def test_or_join_is_folded(self):
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [
+                _notify(['start'], ['wait'], 'http://x',
+                    success='s', failure='f'),
+                {'inputs': ['s'], 'outputs': ['or']},
+                {'inputs': ['f'], 'outputs': ['or']},
+                _notify(['or', 'wait'], ['end'], 'http://y'),
+            ],
+        }
+        optimized, removed = optimize_net(net)
+
+        self.assertEqual(optimized['transitions'], [
+            _notify(['start'], ['wait'], 'http://x',
+                success='or', failure='or'),
+            _notify(['or', 'wait'], ['end'], 'http://y'),
+        ])
+        self.assertEqual(removed, {'transitions': 2, 'places': 2})
+
+    def test_shared_input_is_kept(self):
+        net = {
+            'initialMarking': ['start', 'other'],
+            'transitions': [
+                {'inputs': ['start'], 'outputs': ['a']},
+                {'inputs': ['start', 'other'], 'outputs': ['b']},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+
+        self.assertEqual(optimized, net)
+        self.assertEqual(removed, {'transitions': 0, 'places': 0})
+
+    def test_actions_and_barriers_are_kept(self):
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [
+                {'inputs': ['start'], 'outputs': ['a'],
+                    'action': {'type': 'split'}},
+                {'inputs': ['a'], 'outputs': ['b'], 'type': 'barrier',
+                    'action': {'type': 'join'}},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+        self.assertEqual(optimized, net)
+
+    def test_dead_transitions_are_removed(self):
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [
+                _notify(['start'], ['end'], 'http://x'),
+                {'inputs': ['never'], 'outputs': ['also_never']},
+                _notify(['also_never', 'end'], ['done'], 'http://y'),
+            ],
+        }
+        optimized, removed = optimize_net(net)
+
+        self.assertEqual(optimized['transitions'],
+                [_notify(['start'], ['end'], 'http://x')])
+        self.assertEqual(removed, {'transitions': 2, 'places': 3})
+
+    def test_loops_are_not_merged_into_themselves(self):
+        net = {
+            'initialMarking': ['a'],
+            'transitions': [
+                {'inputs': ['a'], 'outputs': ['b']},
+                {'inputs': ['b'], 'outputs': ['a']},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+        self.assertEqual(len(optimized['transitions']), 1)
+
+    def test_internal_steps_are_fused(self):
+        block = 'http://w/v1/callbacks/methods/3/callbacks/execute?fused=1'
+        connector = ('http://w/v1/callbacks/tasks/4/callbacks/'
+                'copy_outputs_to_parent?fused=1&derive_status=1')
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [
+                _notify(['start'], ['block_wait'], block,
+                    success='block_success', failure='block_failure'),
+                {'inputs': ['block_wait', 'block_success'],
+                    'outputs': ['connector_start']},
+                {'inputs': ['block_wait', 'block_failure'],
+                    'outputs': ['failed']},
+                _notify(['connector_start'], ['connector_wait'], connector,
+                    **{'continue': 'connector_response'}),
+                {'inputs': ['connector_wait', 'connector_response'],
+                    'outputs': ['succeeded']},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+
+        self.assertEqual(optimized['transitions'], [
+            _notify(['start'], ['block_wait'], block + '&derive_status=1'
+                '&then=success.task.4.copy_outputs_to_parent',
+                failure='block_failure',
+                **{'1-continue': 'connector_response'}),
+            {'inputs': ['block_wait', 'block_failure'],
+                'outputs': ['failed']},
+            {'inputs': ['block_wait', 'connector_response'],
+                'outputs': ['succeeded']},
+        ])
+        self.assertEqual(removed, {'transitions': 2, 'places': 3})
+
+    def test_steps_reached_another_way_are_not_fused(self):
+        block = 'http://w/v1/callbacks/methods/3/callbacks/execute?fused=1'
+        net = {
+            'initialMarking': ['start', 'other', 'more'],
+            'transitions': [
+                _notify(['start'], ['wait'], block, success='success'),
+                {'inputs': ['wait', 'success'], 'outputs': ['next']},
+                {'inputs': ['other', 'more'], 'outputs': ['next']},
+                _notify(['next'], ['next_wait'], block, success='done'),
+                {'inputs': ['next_wait', 'done'], 'outputs': ['end']},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+        self.assertEqual(len(_notifies(optimized)), 2)
+
+    def test_external_steps_are_not_fused(self):
+        block = 'http://w/v1/callbacks/methods/3/callbacks/execute?fused=1'
+        job = 'http://w/v1/callbacks/methods/5/callbacks/execute'
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [
+                _notify(['start'], ['wait'], block, success='success'),
+                {'inputs': ['wait', 'success'], 'outputs': ['next']},
+                _notify(['next'], ['next_wait'], job, success='done'),
+                {'inputs': ['next_wait', 'done'], 'outputs': ['end']},
+            ],
+        }
+        optimized, removed = optimize_net(net)
+        self.assertEqual(len(_notifies(optimized)), 2)
+
+    def test_does_not_modify_argument(self):
+        net = {
+            'initialMarking': ['start'],
+            'transitions': [{'inputs': ['start'], 'outputs': ['a']}],
+        }
+        optimize_net(net)
+        self.assertEqual(net['transitions'],
+                [{'inputs': ['start'], 'outputs': ['a']}])
+
+
+if __name__ == '__main__':
+    unittest.main()
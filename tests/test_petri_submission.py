@@ -0,0 +1,61 @@
+import json
+import unittest
+import zlib
+from ptero_workflow.implementation.petri_submission import (compact_net,
+        decode_net, encode_net)
+
+
+class TestCompactNet(unittest.TestCase):
+    def test_places_are_renamed_consistently(self):
+        net = {
+            'initialMarking': ['workflow-start-place'],
+            'transitions': [
+                {
+                    'inputs': ['workflow-start-place'],
+                    'outputs': ['task-1-A-wait'],
+                    'action': {
+                        'type': 'notify',
+                        'url': 'http://example.com/callback',
+                        'response_places': {
+                            'success': 'task-1-A-success',
+                            'failure': 'task-1-A-failure',
+                        },
+                    },
+                },
+                {
+                    'inputs': ['task-1-A-wait', 'task-1-A-success'],
+                    'outputs': ['workflow-start-place'],
+                    'type': 'barrier',
+                },
+            ],
+        }
+        compacted = compact_net(net)
+
+        self.assertEqual(compacted['initialMarking'], ['p0'])
+        first, second = compacted['transitions']
+        self.assertEqual(first['inputs'], ['p0'])
+        self.assertEqual(first['outputs'], ['p1'])
+        self.assertEqual(sorted(first['action']['response_places'].values()),
+                ['p2', 'p3'])
+        self.assertEqual(first['action']['url'],
+                'http://example.com/callback')
+        self.assertEqual(second['inputs'],
+                ['p1', first['action']['response_places']['success']])
+        self.assertEqual(second['outputs'], ['p0'])
+        self.assertEqual(second['type'], 'barrier')
+
+        # the original is left alone
+        self.assertEqual(net['initialMarking'], ['workflow-start-place'])
+
+    def test_encoding_round_trip(self):
+        net = {'initialMarking': ['p0'], 'transitions': []}
+        encoded = encode_net(net)
+
+        self.assertEqual(decode_net(encoded), net)
+        # what our API (and petri) accept as Content-Encoding: gzip
+        self.assertEqual(json.loads(zlib.decompress(encoded,
+            zlib.MAX_WBITS | 32)), net)
+
+
+if __name__ == '__main__':
+    unittest.main()
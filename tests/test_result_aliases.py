@@ -0,0 +1,36 @@
+from ptero_workflow.implementation import models
+from tests.util import BackendTestCase, block_workflow_data
+import unittest
+
+
+class TestResultAliases(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        self.inputs = {'a': {'kittens': [1, 2, 3]}, 'b': 'puppies'}
+        self.workflow = self.save_workflow(block_workflow_data(self.inputs))
+
+    def test_pass_through_outputs_are_aliases(self):
+        task = self.workflow.tasks['A']
+        task.set_outputs(task.get_input_references([0], [0]), 0, None)
+        self.backend.session.commit()
+
+        self.assertEqual(task.get_outputs(0), self.inputs)
+        for r in self.backend.session.query(models.Result).filter_by(
+                task_id=task.id):
+            self.assertIsNotNone(r.alias_id)
+            self.assertIsNone(r.blob_key)
+
+    def test_aliases_of_aliases_refer_to_the_data(self):
+        task = self.workflow.tasks['A']
+        references = task.get_input_references([0], [0])
+        task.set_outputs(references, 0, None)
+        self.backend.session.commit()
+
+        output_connector = self.workflow.tasks['output connector']
+        self.assertEqual(
+                output_connector.get_input_references([0], [0]), references)
+        self.assertEqual(output_connector.get_inputs([0], [0]), self.inputs)
+
+
+if __name__ == '__main__':
+    unittest.main()
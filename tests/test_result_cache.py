@@ -0,0 +1,88 @@
+from ptero_workflow.implementation import result_cache
+from tests.util import BackendTestCase, block_workflow_data
+import json
+import unittest
+
+
+class LocalBackendMixin(object):
+    """
+    Swaps in a fresh local cache, whatever the environment configured.
+    """
+    def setUp(self):
+        self.saved_backend = result_cache._BACKEND
+        result_cache._BACKEND = result_cache._LocalBackend()
+
+    def tearDown(self):
+        result_cache._BACKEND = self.saved_backend
+
+
+class TestLocalBackend(unittest.TestCase):
+    def put(self, backend, key, data):
+        backend.put(key, data, json.dumps(data))
+
+    def test_decoded_data_is_cached(self):
+        backend = result_cache._LocalBackend()
+        data = {'a': [1, 2]}
+        self.put(backend, (1, 'a', 0, ()), data)
+        self.assertIs(backend.get_many([(1, 'a', 0, ())])[(1, 'a', 0, ())],
+                data)
+
+    def test_evicts_at_max_bytes(self):
+        # each value is 10 bytes of JSON text
+        backend = result_cache._LocalBackend(max_bytes=25)
+        for i in range(3):
+            self.put(backend, (1, 'a', i, ()), '%08d' % i)
+
+        self.assertEqual(backend.get_many([(1, 'a', i, ()) for i in range(3)]),
+                {(1, 'a', 1, ()): '00000001', (1, 'a', 2, ()): '00000002'})
+
+    def test_results_larger_than_max_bytes_are_not_cached(self):
+        backend = result_cache._LocalBackend(max_bytes=5)
+        self.put(backend, (1, 'a', 0, ()), 'kittens')
+        self.assertEqual(backend.get_many([(1, 'a', 0, ())]), {})
+
+
+class TestResultCache(LocalBackendMixin, unittest.TestCase):
+    def test_keys_are_isolated(self):
+        keys = [(1, 'a', 0, ()), (1, 'a', 1, ()), (1, 'a', 0, (0,)),
+                (1, 'a', 0, (1,)), (1, 'b', 0, ()), (2, 'a', 0, ())]
+        for i, key in enumerate(keys):
+            self.assertEqual(result_cache.load_result(key, json.dumps(i)), i)
+
+        self.assertEqual(result_cache.get_results(keys),
+                {key: i for i, key in enumerate(keys)})
+
+    def test_null_results_are_cached(self):
+        self.assertIsNone(result_cache.load_result((1, 'a', 0, ()), 'null'))
+        self.assertEqual(result_cache.get_results([(1, 'a', 0, ())]),
+                {(1, 'a', 0, ()): None})
+
+    def test_missing_results_are_not_cached(self):
+        self.assertIsNone(result_cache.load_result((1, 'a', 0, ()), None))
+        self.assertEqual(result_cache.get_results([(1, 'a', 0, ())]), {})
+
+
+class TestWorkflowDeletion(LocalBackendMixin, BackendTestCase):
+    def setUp(self):
+        LocalBackendMixin.setUp(self)
+        BackendTestCase.setUp(self)
+
+    def tearDown(self):
+        BackendTestCase.tearDown(self)
+        LocalBackendMixin.tearDown(self)
+
+    def test_results_are_evicted(self):
+        workflow = self.save_workflow(block_workflow_data({'a': 1}))
+        other = self.save_workflow(block_workflow_data({'a': 1}))
+        key = (workflow.tasks['A'].id, 'a', 0, ())
+        other_key = (other.tasks['A'].id, 'a', 0, ())
+        result_cache.put_result(key, '1')
+        result_cache.put_result(other_key, '1')
+
+        self.delete_workflow(workflow)
+        self.assertEqual(result_cache.get_results([key, other_key]),
+                {other_key: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
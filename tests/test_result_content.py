@@ -0,0 +1,45 @@
+from ptero_workflow.implementation import models
+from ptero_workflow.implementation.models.result import (canonical_json,
+        content_hash)
+from tests.util import BackendTestCase, block_workflow_data
+import unittest
+import uuid
+
+
+class TestContentHash(unittest.TestCase):
+    def test_ignores_key_order_and_whitespace(self):
+        self.assertEqual(canonical_json({'b': [1, 2], 'a': {'y': 1, 'x': 2}}),
+                '{"a":{"x":2,"y":1},"b":[1,2]}')
+
+    def test_depends_on_content(self):
+        self.assertEqual(content_hash(canonical_json({'a': 1, 'b': 2})),
+                content_hash(canonical_json({'b': 2, 'a': 1})))
+        self.assertNotEqual(content_hash(canonical_json([1, 2])),
+                content_hash(canonical_json([2, 1])))
+
+
+class TestResultContent(BackendTestCase):
+    def test_identical_results_are_stored_once(self):
+        value = {'id': str(uuid.uuid4()),
+                'paths': ['/some/long/path/%d' % i for i in range(100)]}
+        workflows = [self.save_workflow(block_workflow_data(
+            {'a': value, 'b': value})) for i in range(2)]
+
+        task_ids = [task.id for w in workflows for task in w.all_tasks]
+        hashes = set(h for (h,) in self.backend.session.query(
+            models.Result.content_hash).filter(
+                models.Result.task_id.in_(task_ids)))
+        self.assertEqual(hashes, set([content_hash(canonical_json(value))]))
+
+        for workflow in workflows:
+            self.assertEqual(workflow.root_task.get_inputs([0], [0]),
+                    {'a': value, 'b': value})
+
+        for workflow in workflows:
+            self.delete_workflow(workflow)
+        self.assertEqual(self.backend.session.query(models.ResultContent
+                ).filter(models.ResultContent.hash.in_(hashes)).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
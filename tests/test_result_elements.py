@@ -0,0 +1,102 @@
+from ptero_workflow.implementation import models
+from sqlalchemy.exc import DataError
+from tests.util import (BackendTestCase, block_task, block_workflow_data,
+        chain_workflow_data)
+import unittest
+
+
+class TestResultElements(BackendTestCase):
+    def setUp(self):
+        BackendTestCase.setUp(self)
+        self.inputs = {
+            'list': [[1, 2], [3, 4, 5], {'a': 1}],
+            # long enough to be stored in result_content
+            'long_list': ['/some/long/path/%d' % i for i in range(50)],
+            'object': {'x': [1, 2]},
+        }
+        self.workflow = self.save_workflow(block_workflow_data(self.inputs,
+            parallel_by='list', names=['list']))
+
+    def get_result(self, name, backend=None):
+        return BackendTestCase.get_result(self, self.workflow, name, backend)
+
+    def stored_elements(self, result):
+        return self.backend.session.query(models.ResultElement).filter_by(
+                result_id=result.id).count()
+
+    def test_element_count(self):
+        for name in ['list', 'long_list']:
+            result = self.get_result(name)
+            self.assertIsNone(result.element_count)
+            self.assertEqual(result.get_size([]), len(self.inputs[name]))
+            self.assertEqual(result.element_count, len(self.inputs[name]))
+            self.assertEqual(self.stored_elements(result),
+                    len(self.inputs[name]))
+
+    def test_element_reads(self):
+        result = self.get_result('list')
+        result.store_elements()
+        self.assertEqual(result.get_data([1]), [3, 4, 5])
+        self.assertEqual(result.get_data([1, 2]), 5)
+        self.assertEqual(result.get_data([2]), {'a': 1})
+        self.assertEqual(result.get_size([1]), 3)
+        self.assertIsNone(result.get_data([3]))
+        self.assertEqual(result.get_data([]), self.inputs['list'])
+
+        long_result = self.get_result('long_list')
+        long_result.store_elements()
+        self.assertEqual(long_result.get_data([7]), '/some/long/path/7')
+
+    def test_split_reads_elements(self):
+        task = self.workflow.tasks['A']
+        source = self.backend.session.query(models.InputSource).filter_by(
+                destination_task=task, destination_property='list').one()
+        self.assertEqual(source.get_size([0], [0]), 3)
+        for i, element in enumerate(self.inputs['list']):
+            self.assertEqual(source.get_data([0, 10 + i], [0, 10]), element)
+
+    def test_split_reads_elements_through_aliases(self):
+        # A passes the list on to B, which is parallel by it.
+        workflow = self.save_workflow(chain_workflow_data(self.inputs,
+            [('A', block_task()), ('B', block_task(parallel_by='list'))],
+            names=['list']))
+        task = workflow.tasks['A']
+        task.set_outputs(task.get_input_references([0], [0]), 0, None)
+        self.backend.session.commit()
+
+        source = self.backend.session.query(models.InputSource).filter_by(
+                destination_task=workflow.tasks['B'],
+                destination_property='list').one()
+        self.assertEqual(source.get_size([0], [0]), 3)
+        for i, element in enumerate(self.inputs['list']):
+            self.assertEqual(source.get_data([0, 10 + i], [0, 10]), element)
+
+    def test_repeated_store_elements(self):
+        other_backend = self.factory.create_backend()
+        result = self.get_result('list')
+        other_result = self.get_result('list', backend=other_backend)
+
+        result.store_elements()
+        self.backend.session.commit()
+
+        # stale, so its elements are inserted again and conflict
+        self.assertIsNone(other_result.element_count)
+        other_result.store_elements()
+        other_backend.session.commit()
+
+        self.assertEqual(other_result.element_count, 3)
+        self.assertEqual(self.stored_elements(result), 3)
+        other_backend.session.close()
+
+    def test_splitting_a_non_array_fails(self):
+        result = self.get_result('object')
+        with self.assertRaises(DataError):
+            result.get_size([])
+        self.backend.session.rollback()
+
+        self.assertIsNone(self.get_result('object').element_count)
+        self.assertEqual(self.stored_elements(result), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from ptero_workflow.implementation import step_chains
+
+
+_BLOCK = 'http://w/v1/callbacks/methods/3/callbacks/execute?fused=1'
+_CONNECTOR = ('http://w/v1/callbacks/tasks/4/callbacks/'
+        'copy_outputs_to_parent?fused=1&derive_status=1')
+
+
+class TestAppendStep(unittest.TestCase):
+    def test_append_step(self):
+        url = step_chains.append_step(_BLOCK, 'success', _CONNECTOR)
+        self.assertEqual(url, _BLOCK + '&derive_status=1'
+                '&then=success.task.4.copy_outputs_to_parent')
+        self.assertTrue(step_chains.is_internal_step(url))
+        self.assertEqual(step_chains.step_count(url), 2)
+
+    def test_append_chain(self):
+        chain = step_chains.append_step(_CONNECTOR, 'continue', _BLOCK)
+        url = step_chains.append_step(_BLOCK, 'success', chain)
+        self.assertEqual(url, _BLOCK + '&derive_status=1'
+                '&then=success.task.4.copy_outputs_to_parent,'
+                'continue.method.3.execute')
+        self.assertEqual(step_chains.step_count(url), 3)
+
+    def test_internal_steps(self):
+        self.assertTrue(step_chains.is_internal_step(_BLOCK))
+        self.assertFalse(step_chains.is_internal_step(
+            'http://w/v1/callbacks/methods/3/callbacks/execute'))
+
+    def test_response_keys(self):
+        for index, response in [(0, 'success'), (2, 'continue')]:
+            self.assertEqual(step_chains.split_response_key(
+                step_chains.response_key(index, response)),
+                (index, response))
+
+
+class TestNextStep(unittest.TestCase):
+    def setUp(self):
+        self.body_data = {
+            'color': 3,
+            'group': {'begin': 0},
+            'response_links': {
+                'success': 'http://petri/s',
+                'failure': 'http://petri/f',
+                '1-continue': 'http://petri/c',
+                '2-success': 'http://petri/s2',
+            },
+        }
+        self.query_string_data = {
+            'fused': '1',
+            'then': 'success.task.4.copy_outputs_to_parent,'
+                'continue.method.3.execute',
+        }
+
+    def test_next_step(self):
+        step = step_chains.next_step(self.body_data, self.query_string_data,
+                'success')
+        self.assertEqual(step.kind, 'task')
+        self.assertEqual(step.id, 4)
+        self.assertEqual(step.callback_type, 'copy_outputs_to_parent')
+        self.assertEqual(step.body_data, {
+            'color': 3,
+            'group': {'begin': 0},
+            'response_links': {
+                'continue': 'http://petri/c',
+                '1-success': 'http://petri/s2',
+            },
+        })
+        self.assertEqual(step.query_string_data, {
+            'fused': '1',
+            'then': 'continue.method.3.execute',
+        })
+
+        last_step = step_chains.next_step(step.body_data,
+                step.query_string_data, 'continue')
+        self.assertEqual(last_step.body_data['response_links'],
+                {'success': 'http://petri/s2'})
+        self.assertEqual(last_step.query_string_data, {'fused': '1'})
+        self.assertIsNone(step_chains.next_step(last_step.body_data,
+            last_step.query_string_data, 'success'))
+
+    def test_other_responses_go_to_petri(self):
+        self.assertIsNone(step_chains.next_step(self.body_data,
+            self.query_string_data, 'failure'))
+
+    def test_unfused(self):
+        self.assertIsNone(step_chains.next_step(self.body_data,
+            {'fused': '1'}, 'success'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from ptero_workflow.implementation.workflow_graph import build_workflow_graph
+
+
+class TestWorkflowGraph(unittest.TestCase):
+    def setUp(self):
+        # root task (1) runs DAG method (10) containing a parallel task (2)
+        # whose DAG method (20) contains a parallel task (3)
+        task_rows = [
+            (1, 'root', 'MethodList', None, None, -1),
+            (2, 'outer', 'MethodList', 10, 'x', 0),
+            (3, 'inner', 'MethodList', 20, 'y', 0),
+            (4, 'input connector', 'InputConnector', 20, None, -1),
+        ]
+        method_rows = [
+            (10, 'root', 'DAG', 1, 0),
+            (20, 'some_dag', 'DAG', 2, 0),
+        ]
+        link_rows = [
+            (4, 3, 'y', 'y'),
+            (4, 3, 'z', 'z'),
+        ]
+        webhook_rows = [
+            (3, None, 'ended', 'http://a'),
+            (None, 20, 'running', 'http://b'),
+            (None, 20, 'running', 'http://c'),
+        ]
+        input_source_rows = [
+            (3, 'y', 1, 'x', [1, 2]),
+        ]
+        self.graph = build_workflow_graph(7, 'wf', task_rows, method_rows,
+                link_rows, webhook_rows, input_source_rows)
+
+    def test_parallel_depth(self):
+        self.assertEqual(self.graph.task(1).parallel_depth, 0)
+        self.assertEqual(self.graph.task(2).parallel_depth, 1)
+        self.assertEqual(self.graph.task(3).parallel_depth, 2)
+        self.assertEqual(self.graph.task(4).parallel_depth, 1)
+
+    def test_link_names(self):
+        self.assertEqual(self.graph.task(3).input_names, set(['y', 'z']))
+        self.assertEqual(self.graph.task(4).output_names, set(['y', 'z']))
+        self.assertEqual(self.graph.task(3).input_task_ids, (4,))
+
+    def test_webhooks(self):
+        self.assertEqual(self.graph.task(3).webhooks, {'ended': ('http://a',)})
+        self.assertEqual(self.graph.method(20).webhooks,
+                {'running': ('http://b', 'http://c')})
+
+    def test_input_sources(self):
+        source, = self.graph.task_input_sources(3)
+        self.assertEqual(source.source_id, 1)
+        self.assertEqual(source.parallel_depths, (1, 2))
+        self.assertEqual(self.graph.task_input_sources(2), ())
+
+    def test_webhook_routes(self):
+        routes = self.graph.task(3).webhook_routes
+        self.assertEqual(routes['succeeded'], (('ended', 'http://a'),))
+        self.assertEqual(routes['errored'], (('ended', 'http://a'),))
+        self.assertNotIn('running', routes)
+        self.assertEqual(self.graph.method(20).webhook_routes['running'],
+                (('running', 'http://b'), ('running', 'http://c')))
+        self.assertEqual(self.graph.task(2).webhook_routes, {})
@@ -2,6 +2,8 @@ import os
 import unittest
 import tests.util
 from ptero_workflow.implementation.factory import Factory
+from ptero_workflow.implementation.models.petri_mixin import (
+        DERIVE_TASK_STATUS, FUSE_INTERNAL_STEPS)
 import uuid
 
 
@@ -72,6 +74,24 @@ class TestWorkflowPetriTranslation(unittest.TestCase):
             }
         }
 
+    @property
+    def notify_urls(self):
+        return [i['action']['url'] for i in self.petri_data['transitions']
+            if i.get('action') and i['action']['type'] == 'notify']
+
+    @unittest.skipUnless(FUSE_INTERNAL_STEPS and DERIVE_TASK_STATUS,
+            'statuses are notified')
+    def test_no_success_status_notifies(self):
+        success_urls = [u for u in self.notify_urls
+            if u.endswith('/succeeded') or 'status=succeeded' in u]
+        self.assertEqual(success_urls, [])
+
+    @unittest.skipUnless(DERIVE_TASK_STATUS, 'task statuses are notified')
+    def test_no_task_failure_notifies(self):
+        # only the input connector's, which has no methods
+        failure_urls = [u for u in self.notify_urls if u.endswith('/failed')]
+        self.assertEqual(len(failure_urls), 1)
+
     def set_expire(self, type, ttl):
         os.environ['PTERO_WORKFLOW_%s_EXPIRE_SECONDS' % type] = str(ttl)
 
@@ -0,0 +1,127 @@
+import copy
+import unittest
+from ptero_workflow.implementation.workflow_graph import build_workflow_graph
+from ptero_workflow.implementation.workflow_template import (
+        PetriNetTemplate, entity_paths, net_id, structure_hash)
+
+
+WORKFLOW_DATA = {
+    'name': 'some workflow',
+    'tasks': {
+        'A': {
+            'methods': [
+                {
+                    'name': 'execute',
+                    'service': 'job',
+                    'serviceUrl': 'http://example.com/v1',
+                    'parameters': {'commandLine': ['echo', 'hi']},
+                },
+            ],
+            'webhooks': {'ended': 'http://example.com/ended'},
+        },
+    },
+    'links': [
+        {
+            'source': 'input connector',
+            'destination': 'A',
+            'dataFlow': {'in_a': 'param'},
+        },
+        {
+            'source': 'A',
+            'destination': 'output connector',
+            'dataFlow': {'result': 'out_a'},
+        },
+    ],
+    'inputs': {'in_a': 'kittens'},
+}
+
+
+class TestStructureHash(unittest.TestCase):
+    def modified(self, modify):
+        data = copy.deepcopy(WORKFLOW_DATA)
+        modify(data)
+        return structure_hash(data)
+
+    def test_ignores_instance_data(self):
+        def modify(data):
+            data['name'] = 'another workflow'
+            data['inputs']['in_a'] = 'puppies'
+            data['webhooks'] = {'running': 'http://example.com/running'}
+            method = data['tasks']['A']['methods'][0]
+            method['parameters']['commandLine'] = ['echo', 'bye']
+            method['serviceUrl'] = 'http://example.org/v1'
+            del data['tasks']['A']['webhooks']
+            data['links'].reverse()
+
+        self.assertEqual(structure_hash(WORKFLOW_DATA), self.modified(modify))
+
+    def test_depends_on_structure(self):
+        def rename_task(data):
+            data['tasks']['B'] = data['tasks'].pop('A')
+            for link in data['links']:
+                for key in ['source', 'destination']:
+                    if link[key] == 'A':
+                        link[key] = 'B'
+
+        def parallelize(data):
+            data['tasks']['A']['parallelBy'] = 'param'
+
+        def change_data_flow(data):
+            data['links'][1]['dataFlow'] = {'result': 'other'}
+
+        def add_input(data):
+            data['inputs']['in_b'] = 'unused'
+
+        hashes = set([structure_hash(WORKFLOW_DATA)] + [self.modified(m)
+            for m in [rename_task, parallelize, change_data_flow, add_input]])
+        self.assertEqual(len(hashes), 5)
+
+
+class TestPetriNetTemplate(unittest.TestCase):
+    def graph(self, offset):
+        # root task runs DAG method 'root' containing task 'A' with a
+        # 'execute' method
+        task_rows = [
+            (offset + 1, 'root', 'MethodList', None, None, -1),
+            (offset + 2, 'A', 'MethodList', offset + 10, None, 0),
+        ]
+        method_rows = [
+            (offset + 10, 'root', 'DAG', offset + 1, 0),
+            (offset + 20, 'execute', 'Job', offset + 2, 0),
+        ]
+        return build_workflow_graph(offset, 'wf', task_rows, method_rows,
+                [], [], [])
+
+    def build_net(self, offset):
+        def build():
+            return {'transitions': [{
+                'inputs': ['task-%s-A-start' % net_id('task', offset + 2)],
+                'action': {'url': '/callbacks/methods/%s/callbacks/x'
+                    % net_id('method', offset + 20)},
+            }]}
+        return build
+
+    def test_entity_paths(self):
+        paths = entity_paths(self.graph(0))
+        self.assertEqual(paths, {
+            ('task', 1): ('root',),
+            ('task', 2): ('root', 'root', 'A'),
+            ('method', 10): ('root', 'root'),
+            ('method', 20): ('root', 'root', 'A', 'execute'),
+        })
+
+    def test_stamp_matches_direct_build(self):
+        template = PetriNetTemplate.compile(entity_paths(self.graph(0)),
+                self.build_net(0))
+
+        self.assertEqual(template.stamp(entity_paths(self.graph(100))),
+                self.build_net(100)())
+        self.assertEqual(template.stamp(entity_paths(self.graph(0))),
+                self.build_net(0)())
+
+    def test_net_id_outside_compile(self):
+        self.assertEqual(net_id('task', 7), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
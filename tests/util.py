@@ -1,5 +1,9 @@
-import os
+from ptero_workflow.implementation import models
+from ptero_workflow.implementation.factory import Factory
 import json
+import os
+import unittest
+import uuid
 
 
 def environment():
@@ -30,3 +34,118 @@ def shell_command_url():
             os.environ['PTERO_SHELL_COMMAND_HOST'],
             int(os.environ['PTERO_SHELL_COMMAND_PORT']),
             )
+
+
+def block_task(parallel_by=None):
+    """
+    A task with a single workflow-block method, which passes its inputs
+    through as outputs.
+    """
+    return _task({
+        'name': 'execute',
+        'service': 'workflow-block',
+        'parameters': {},
+    }, parallel_by)
+
+
+def job_task(service_url='http://localhost:1/v1', parameters=None,
+        parallel_by=None, name='execute'):
+    return _task({
+        'name': name,
+        'service': 'job',
+        'serviceUrl': service_url,
+        'parameters': {} if parameters is None else parameters,
+    }, parallel_by)
+
+
+def dag_task(tasks, links, parallel_by=None, name='inner'):
+    return _task({
+        'name': name,
+        'service': 'workflow',
+        'parameters': {'tasks': tasks, 'links': links},
+    }, parallel_by)
+
+
+def _task(method, parallel_by):
+    task = {'methods': [method]}
+    if parallel_by is not None:
+        task['parallelBy'] = parallel_by
+    return task
+
+
+def link(source, destination, data_flow):
+    return {
+        'source': source,
+        'destination': destination,
+        'dataFlow': data_flow,
+    }
+
+
+def workflow_data(tasks, links, inputs):
+    return {
+        'name': str(uuid.uuid4()),
+        'tasks': tasks,
+        'links': links,
+        'inputs': inputs,
+    }
+
+
+def chain_workflow_data(inputs, tasks, names=None):
+    """
+    A workflow that passes its <inputs> (or just those in <names>) through
+    <tasks>, a list of (name, task) pairs, one after the other.
+    """
+    if names is None:
+        names = inputs.keys()
+    chain = (['input connector'] + [name for name, task in tasks] +
+            ['output connector'])
+    return workflow_data(dict(tasks),
+            [link(source, destination, {name: name for name in names})
+                for source, destination in zip(chain[:-1], chain[1:])],
+            inputs)
+
+
+def block_workflow_data(inputs, parallel_by=None, names=None):
+    """
+    A workflow that passes its <inputs> through a single block, 'A'.
+    """
+    return chain_workflow_data(inputs, [('A', block_task(parallel_by))],
+            names)
+
+
+class BackendTestCase(unittest.TestCase):
+    """
+    Gives each test a backend, and deletes the workflows saved with
+    save_workflow afterwards.
+    """
+    def setUp(self):
+        self.factory = Factory(os.environ['PTERO_WORKFLOW_DB_STRING'])
+        self.backend = self.factory.create_backend()
+        self.workflow_ids = []
+
+    def tearDown(self):
+        self.backend.session.rollback()
+        for workflow_id in self.workflow_ids:
+            self.backend._delete_workflow(
+                    self.backend._get_workflow(workflow_id))
+
+    def save_workflow(self, data):
+        workflow = self.backend._save_workflow(data)
+        self.workflow_ids.append(workflow.id)
+        return workflow
+
+    def delete_workflow(self, workflow):
+        self.workflow_ids.remove(workflow.id)
+        self.backend._delete_workflow(workflow)
+
+    def get_result(self, workflow, name, backend=None):
+        """
+        The result named <name> in <workflow> that holds its data, rather
+        than being an alias.
+        """
+        backend = backend or self.backend
+        task_ids = [task.id for task in workflow.all_tasks]
+        return backend.session.query(models.Result).filter(
+                models.Result.task_id.in_(task_ids),
+                models.Result.name == name,
+                models.Result.alias_id.is_(None)).one()